@@ -1,18 +1,74 @@
 import os
 import json
-from flask import Flask, render_template_string, request, jsonify
-import openai
+import hashlib
+import time
+from functools import partial
+import jinja2
+from flask import Blueprint, Flask, Response, g, request, jsonify
 
-# Initialize Flask
-app = Flask(__name__)
+from assets import ASSET_CACHE_CONTROL, AssetRegistry, compress_dynamic, compress_variants, negotiate
+from batch import BATCH_DEADLINE, BATCH_ITEM_TIMEOUT, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS, run_batch
+from cache import cache_from_env, cache_key
+from catalog import catalog
+from discussion import (DISCUSSION_DEFAULT_ROUNDS, DISCUSSION_MAX_PERSONAS, DISCUSSION_MAX_ROUNDS,
+                        DISCUSSION_ROUND_BUDGET, TURN_MAX_TOKENS, canned_reaction, compact_transcript,
+                        discussion_insight_messages, moderator_question, turn_messages)
+from export import EXPORT_COLUMNS, EXPORT_FORMATS, export_stream, parse_time
+from classifier import classify_product, classify_role, semantic_matcher
+from jobs import JOB_STREAM_INTERVAL, JOB_STREAM_TIMEOUT, queue_from_env
+from jsonstream import JSONArrayStreamParser
+from llm import backend_from_env
+from metrics import (DISCUSSION_ROUND_LATENCY, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, JOB_LATENCY,
+                     JOB_QUEUE_DEPTH, JOB_WAIT, JOBS, OPENAI_COST, OPENAI_LATENCY, OPENAI_TOKENS, PERSONA_CACHE_BYTES, PERSONA_CACHE_LOOKUPS, PERSONA_CALLS_SAVED,
+                     PERSONA_DEDUPLICATED, PERSONA_FALLBACKS, PERSONA_PARSE_FAILURES, PERSONA_SALVAGED,
+                     PERSONA_SECONDS_SAVED, PERSONA_TOPUPS, PROMPT_COMPACTIONS, PROMPT_TOKENS_TRIMMED,
+                     REQUESTS_REJECTED, SIMULATION_RESPONSES, TEMPLATE_RENDER, UPSTREAM_CALLS, UPSTREAM_CIRCUIT_OPEN,
+                     UPSTREAM_QUEUE_DEPTH, registry)
+from panel import PANEL_DEFAULT_SIZE, PANEL_MAX_SIZE, simulate_panel
+from prompts import (PROMPT_DESCRIPTION_TOKENS, PROMPT_TARGET_MARKET_TOKENS, compact_description,
+                     estimate_prompt_tokens, estimate_tokens, persona_max_tokens, usage_cost)
+from ratelimit import api_keys_from_env, client_key, rate_limiter_from_env
+from resilience import CircuitOpenError, Overloaded, UpstreamTimeout, upstream_from_env
+from simulation import (INSIGHT_MAX_TOKENS, RESPONSE_MAX_TOKENS, SIMULATION_INSIGHT_BUDGET, SIMULATION_MODES,
+                        SIMULATION_PERSONA_BUDGET, SIMULATION_TEMPERATURE, completed_within, fan_out,
+                        insight_messages, response_messages)
+from singleflight import singleflight_from_env
+from store import HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT, store_from_env
 
-# Get API key from environment variable
+# Routes live on a blueprint so create_app() can build the Flask app
+bp = Blueprint("focusgroup", __name__)
+
+# Every model call goes through this backend, see backend_from_env; without an
+# API key the openai backend is None and personas come from the contextual fallback
 api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable not set. Please set it before running the app.")
+llm = backend_from_env("LLM", api_key)
+
+PERSONA_MODEL = "gpt-3.5-turbo"
+PERSONA_TEMPERATURE = 0.7
+
+# Cache of successful persona completions, see cache_from_env for settings
+persona_cache = cache_from_env("PERSONA_CACHE")
+
+# Latency budget, circuit breaker and hedging around OpenAI, see upstream_from_env
+upstream = upstream_from_env()
+
+# Per-client token buckets on the upstream-bound routes, see rate_limiter_from_env
+rate_limiter = rate_limiter_from_env("RATE_LIMIT")
+RATE_LIMIT_TRUST_PROXY = os.environ.get("RATE_LIMIT_TRUST_PROXY", "0").lower() in ("1", "true", "yes")
+RATE_LIMIT_API_KEYS = api_keys_from_env("RATE_LIMIT")
+
+# Identical persona requests in flight share one upstream call, see singleflight_from_env;
+# a leader may spend a full budget on the call and another on a top-up
+persona_flights = singleflight_from_env("PERSONA_SINGLEFLIGHT", 2 * upstream.budget + 1)
+
+# Every simulation is kept for permalinks and history, see store_from_env
+simulation_store = store_from_env("SIMULATION")
 
-os.environ["OPENAI_API_KEY"] = api_key
-openai.api_key = api_key
+# Simulations submitted to /api/jobs run in the background, see queue_from_env
+simulation_jobs = queue_from_env("SIMULATION_JOBS")
+
+# CSS and JS are served from content-hashed URLs, precompressed once per process
+assets = AssetRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
 
 # Complete HTML Template
 HTML_TEMPLATE = """
@@ -23,306 +79,7 @@ HTML_TEMPLATE = """
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>FocusGroupAI — AI-Powered User Research</title>
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: 'Inter', sans-serif;
-            background: #0a0a0f;
-            color: #ffffff;
-            line-height: 1.6;
-            min-height: 100vh;
-        }
-        .gradient-bg {
-            position: fixed;
-            top: 0; left: 0; width: 100%; height: 100%;
-            z-index: -1;
-            background: 
-                radial-gradient(ellipse at 20% 20%, rgba(120, 119, 198, 0.3) 0%, transparent 50%),
-                radial-gradient(ellipse at 80% 80%, rgba(255, 119, 198, 0.15) 0%, transparent 50%);
-        }
-        .container {
-            max-width: 1000px;
-            margin: 0 auto;
-            padding: 40px 20px;
-        }
-        .header {
-            text-align: center;
-            margin-bottom: 40px;
-        }
-        .badge {
-            display: inline-flex;
-            align-items: center;
-            gap: 8px;
-            background: rgba(99, 102, 241, 0.1);
-            border: 1px solid rgba(99, 102, 241, 0.3);
-            padding: 8px 16px;
-            border-radius: 100px;
-            font-size: 13px;
-            font-weight: 500;
-            color: #818cf8;
-            margin-bottom: 20px;
-        }
-        .badge::before {
-            content: '';
-            width: 8px;
-            height: 8px;
-            background: #22c55e;
-            border-radius: 50%;
-            animation: pulse 2s infinite;
-        }
-        @keyframes pulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.5; }
-        }
-        h1 {
-            font-size: 56px;
-            font-weight: 700;
-            margin-bottom: 16px;
-            background: linear-gradient(180deg, #fff 0%, #94a3b8 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            letter-spacing: -2px;
-        }
-        .subtitle {
-            color: #64748b;
-            font-size: 20px;
-            max-width: 600px;
-            margin: 0 auto;
-        }
-        .card {
-            background: rgba(255, 255, 255, 0.03);
-            border: 1px solid rgba(255, 255, 255, 0.08);
-            border-radius: 20px;
-            padding: 32px;
-            margin-bottom: 24px;
-            backdrop-filter: blur(10px);
-        }
-        .section-title {
-            font-size: 14px;
-            font-weight: 600;
-            color: #818cf8;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            margin-bottom: 20px;
-        }
-        .form-group {
-            margin-bottom: 20px;
-        }
-        label {
-            display: block;
-            font-size: 14px;
-            font-weight: 500;
-            color: #cbd5e1;
-            margin-bottom: 8px;
-        }
-        input, textarea, select {
-            width: 100%;
-            background: rgba(255, 255, 255, 0.05);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            border-radius: 10px;
-            padding: 14px 16px;
-            color: #fff;
-            font-size: 15px;
-            font-family: inherit;
-            transition: all 0.3s;
-        }
-        input:focus, textarea:focus, select:focus {
-            outline: none;
-            border-color: rgba(99, 102, 241, 0.5);
-            background: rgba(255, 255, 255, 0.08);
-        }
-        textarea {
-            min-height: 120px;
-            resize: vertical;
-        }
-        .btn {
-            background: linear-gradient(135deg, #6366f1 0%, #8b5cf6 100%);
-            color: white;
-            padding: 16px 32px;
-            border-radius: 12px;
-            font-size: 16px;
-            font-weight: 600;
-            border: none;
-            cursor: pointer;
-            transition: all 0.3s;
-            box-shadow: 0 4px 20px rgba(99, 102, 241, 0.3);
-        }
-        .btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 8px 30px rgba(99, 102, 241, 0.4);
-        }
-        .btn-secondary {
-            background: rgba(255, 255, 255, 0.1);
-            margin-left: 12px;
-            box-shadow: none;
-        }
-        .btn-secondary:hover {
-            background: rgba(255, 255, 255, 0.15);
-        }
-        .btn-full {
-            width: 100%;
-            padding: 18px;
-            font-size: 18px;
-        }
-        .persona-form {
-            background: rgba(255, 255, 255, 0.02);
-            border: 1px solid rgba(255, 255, 255, 0.06);
-            border-radius: 16px;
-            padding: 28px;
-            margin-bottom: 20px;
-            transition: all 0.3s;
-        }
-        .persona-form:hover {
-            border-color: rgba(255, 255, 255, 0.1);
-        }
-        .persona-form h3 {
-            font-size: 20px;
-            margin-bottom: 20px;
-            color: #fff;
-            display: flex;
-            align-items: center;
-            gap: 12px;
-        }
-        .grid-2 {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 16px;
-        }
-        .generated-badge {
-            display: inline-flex;
-            align-items: center;
-            background: rgba(34, 197, 94, 0.2);
-            color: #22c55e;
-            padding: 6px 14px;
-            border-radius: 20px;
-            font-size: 12px;
-            font-weight: 600;
-            border: 1px solid rgba(34, 197, 94, 0.3);
-        }
-        .response-box {
-            background: rgba(0, 0, 0, 0.3);
-            border-radius: 16px;
-            padding: 24px;
-            margin-top: 20px;
-            border-left: 4px solid #6366f1;
-        }
-        .message-author {
-            font-size: 14px;
-            font-weight: 600;
-            color: #818cf8;
-            margin-bottom: 10px;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        }
-        .message-author::before {
-            content: '';
-            width: 8px;
-            height: 8px;
-            background: #818cf8;
-            border-radius: 50%;
-        }
-        .message-text {
-            font-size: 15px;
-            color: #cbd5e1;
-            line-height: 1.7;
-        }
-        .insight-box {
-            background: linear-gradient(135deg, rgba(34, 197, 94, 0.15) 0%, rgba(34, 197, 94, 0.05) 100%);
-            border: 1px solid rgba(34, 197, 94, 0.3);
-            border-radius: 16px;
-            padding: 28px;
-            margin-top: 28px;
-        }
-        .insight-title {
-            font-size: 13px;
-            font-weight: 700;
-            color: #22c55e;
-            text-transform: uppercase;
-            letter-spacing: 1.5px;
-            margin-bottom: 16px;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        }
-        .insight-title::before {
-            content: '→';
-            font-size: 16px;
-        }
-        .loading {
-            display: none;
-            text-align: center;
-            padding: 40px;
-            color: #64748b;
-        }
-        .spinner {
-            width: 48px;
-            height: 48px;
-            border: 4px solid rgba(255,255,255,0.1);
-            border-top-color: #6366f1;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 20px;
-        }
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-        .features {
-            display: grid;
-            grid-template-columns: repeat(3, 1fr);
-            gap: 20px;
-            margin: 40px 0;
-        }
-        .feature {
-            text-align: center;
-            padding: 24px;
-            background: rgba(255,255,255,0.02);
-            border-radius: 16px;
-            border: 1px solid rgba(255,255,255,0.05);
-        }
-        .feature-icon {
-            font-size: 32px;
-            margin-bottom: 12px;
-        }
-        .feature h4 {
-            font-size: 16px;
-            font-weight: 600;
-            margin-bottom: 8px;
-        }
-        .feature p {
-            font-size: 14px;
-            color: #64748b;
-        }
-        .pricing {
-            text-align: center;
-            margin: 40px 0;
-        }
-        .price {
-            font-size: 64px;
-            font-weight: 700;
-            background: linear-gradient(135deg, #fff 0%, #a5b4fc 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-        }
-        .price-period {
-            color: #64748b;
-            font-size: 18px;
-        }
-        footer {
-            text-align: center;
-            padding: 40px;
-            color: #64748b;
-            font-size: 14px;
-            border-top: 1px solid rgba(255,255,255,0.05);
-            margin-top: 60px;
-        }
-        @media (max-width: 768px) {
-            h1 { font-size: 40px; }
-            .features { grid-template-columns: 1fr; }
-            .grid-2 { grid-template-columns: 1fr; }
-            .btn-secondary { margin-left: 0; margin-top: 12px; display: block; width: 100%; }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
 </head>
 <body>
     <div class="gradient-bg"></div>
@@ -351,7 +108,7 @@ HTML_TEMPLATE = """
             </div>
         </div>
         
-        <form id="mainForm" method="POST" action="/run-simulation">
+        <form id="mainForm" method="POST" action="/run-simulation"{% if model_jobs %} data-model-jobs{% endif %}>
             <!-- STEP 1: Product Description -->
             <div class="card">
                 <div class="section-title">Step 1: Describe Your Product</div>
@@ -455,9 +212,19 @@ HTML_TEMPLATE = """
             <!-- STEP 3: Run Simulation -->
             <div class="card">
                 <div class="section-title">Step 3: Run Your AI Focus Group</div>
+                <label class="checkbox">
+                    <input type="checkbox" name="mode" id="modelMode" value="model">
+                    Have the AI write each persona's answer (slower; canned answers fill in for any that time out)
+                </label>
                 <button type="submit" class="btn btn-full">
                     🚀 Generate Focus Group Insights
                 </button>
+                <button type="button" class="btn btn-secondary btn-full" style="margin-top: 12px;" onclick="runDiscussion()">
+                    💬 Run a 3-Round Moderated Discussion
+                </button>
+                <button type="button" class="btn btn-secondary btn-full" style="margin-top: 12px;" onclick="runPanel()">
+                    📊 Simulate a 1,000-Person Panel
+                </button>
                 <p style="text-align: center; color: #64748b; margin-top: 16px; font-size: 14px;">
                     Takes 10-15 seconds • No credit card required
                 </p>
@@ -465,13 +232,13 @@ HTML_TEMPLATE = """
         </form>
 
         {% if result %}
-        <div class="card">
+        <div class="card" id="results">
             <div class="section-title">Focus Group Results</div>
             <p style="color: #64748b; margin-bottom: 24px; font-size: 15px;">Product tested: {{ result.product }}</p>
             
             {% for response in result.responses %}
             <div class="response-box">
-                <div class="message-author">{{ response.name }} — {{ response.role }}</div>
+                <div class="message-author">{{ response.name }} — {{ response.role }}{% if response.round %} · Round {{ response.round }}{% endif %}</div>
                 <div class="message-text">{{ response.text }}</div>
             </div>
             {% endfor %}
@@ -483,6 +250,12 @@ HTML_TEMPLATE = """
                 </div>
             </div>
             
+            {% if result.permalink %}
+            <p style="color: #64748b; margin-top: 24px; font-size: 14px; text-align: center;">
+                Permalink: <a href="{{ result.permalink }}">{{ result.permalink }}</a>
+            </p>
+            {% endif %}
+            
             <div style="text-align: center; margin-top: 32px;">
                 <a href="/" class="btn" style="text-decoration: none;">Run Another Focus Group</a>
             </div>
@@ -500,134 +273,492 @@ HTML_TEMPLATE = """
         </footer>
     </div>
 
-    <script>
-        async function generatePersonas() {
-            const productDesc = document.getElementById('productDesc').value;
-            const targetMarket = document.getElementById('targetMarket').value;
-            
-            if (!productDesc) {
-                alert('Please describe your product first');
-                document.getElementById('productDesc').focus();
-                return;
-            }
-            
-            document.getElementById('loading').style.display = 'block';
-            
-            try {
-                const response = await fetch('/generate-personas', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        product_description: productDesc,
-                        target_market: targetMarket
-                    })
-                });
-                
-                const data = await response.json();
-                
-                if (data.personas && data.personas.length === 3) {
-                    for (let i = 0; i < 3; i++) {
-                        const p = data.personas[i];
-                        document.getElementById('name' + (i+1)).value = p.name || '';
-                        document.getElementById('age' + (i+1)).value = p.age || '';
-                        document.getElementById('job' + (i+1)).value = p.occupation || '';
-                        document.getElementById('traits' + (i+1)).value = p.traits || '';
-                        document.getElementById('badge' + (i+1)).style.display = 'inline-flex';
-                    }
-                    
-                    document.getElementById('personasCard').scrollIntoView({ behavior: 'smooth', block: 'start' });
-                } else {
-                    alert('Error generating personas. Please try again or enter manually.');
-                }
-            } catch (error) {
-                console.error('Error:', error);
-                alert('Connection error. Please check your internet and try again.');
-            } finally {
-                document.getElementById('loading').style.display = 'none';
-            }
-        }
-        
-        function fillExample() {
-            document.getElementById('productDesc').value = "An AI recipe app that suggests meals based on ingredients you already have in your kitchen. Reduces food waste and saves money. $9.99/month with a 14-day free trial. Includes meal planning and grocery list features.";
-            document.getElementById('targetMarket').value = "Home cooks aged 25-45 who want to reduce food waste and save time on meal planning";
-            
-            document.getElementById('name1').value = "Marco Rossi";
-            document.getElementById('age1').value = "38";
-            document.getElementById('job1').value = "Professional Chef";
-            document.getElementById('traits1').value = "Perfectionist, values technique, skeptical of shortcuts, judges apps by recipe authenticity";
-            
-            document.getElementById('name2').value = "Jennifer Walsh";
-            document.getElementById('age2').value = "34";
-            document.getElementById('job2').value = "Working Mother of Two";
-            document.getElementById('traits2').value = "Time-starved, needs family-friendly meals, values convenience but wants healthy options";
-            
-            document.getElementById('name3').value = "David Chen";
-            document.getElementById('age3').value = "28";
-            document.getElementById('job3').value = "Food Blogger";
-            document.getElementById('traits3').value = "Trend-focused, loves experimenting, visual presentation matters, shares on social media";
-            
-            document.getElementById('badge1').style.display = 'inline-flex';
-            document.getElementById('badge2').style.display = 'inline-flex';
-            document.getElementById('badge3').style.display = 'inline-flex';
-        }
-    </script>
+    <script src="{{ asset_url('app.js') }}"></script>
 </body>
 </html>
 """
 
+def _split_results_block(source):
+    """Split the page into static head, dynamic results block and static tail"""
+    head, start, rest = source.partition("{% if result %}")
+    block, end, tail = rest.rpartition("{% endif %}")
+    return head, start + block + end, tail
+
+# Compile the template once per process (or once per master with --preload).
+# Everything outside the results block is static, so it is rendered here and
+# only the results block is rendered per request. Autoescaping matches Flask's
+# for templates built from strings. The form queues model-written simulations
+# as jobs only when there is a backend to write them and a queue to run them;
+# otherwise they are quick and run inline.
+templates = jinja2.Environment(autoescape=True)
+_head_source, _results_source, _tail_source = _split_results_block(HTML_TEMPLATE)
+PAGE_HEAD = templates.from_string(_head_source).render(
+    asset_url=assets.url, model_jobs=llm is not None and simulation_jobs is not None)
+PAGE_TAIL = templates.from_string(_tail_source).render(asset_url=assets.url)
+RESULTS_TEMPLATE = templates.from_string(_results_source)
+
+HOME_PAGE = (PAGE_HEAD + PAGE_TAIL).encode("utf-8")
+HOME_ETAG = hashlib.sha256(HOME_PAGE).hexdigest()[:32]
+HOME_VARIANTS = compress_variants(HOME_PAGE)
+
+def render_page(result):
+    """Render the full page with a results block"""
+    started = time.perf_counter()
+    results_block = RESULTS_TEMPLATE.render(result=result)
+    TEMPLATE_RENDER.observe(time.perf_counter() - started)
+    return PAGE_HEAD + results_block + PAGE_TAIL
+
 def get_contextual_personas(product_description):
-    """Generate contextual fallback personas based on product type"""
-    product_lower = product_description.lower()
-    
-    if any(word in product_lower for word in ['recipe', 'cook', 'food', 'meal', 'kitchen', 'chef', 'baking', 'ingredient']):
-        return [
-            {"name": "Marco Rossi", "age": 38, "occupation": "Professional Chef", "traits": "Perfectionist, values technique, skeptical of shortcuts, judges apps by recipe authenticity, high culinary standards"},
-            {"name": "Jennifer Walsh", "age": 34, "occupation": "Working Mother of Two", "traits": "Time-starved, needs family-friendly meals, values convenience but wants healthy options, budget-conscious for groceries"},
-            {"name": "David Chen", "age": 28, "occupation": "Food Blogger & Content Creator", "traits": "Trend-focused, loves experimenting with new cuisines, visual presentation matters, shares everything on social media, needs Instagram-worthy results"}
-        ]
-    elif any(word in product_lower for word in ['fitness', 'workout', 'gym', 'health', 'exercise', 'training', 'yoga', 'running']):
-        return [
-            {"name": "Alex Rivera", "age": 29, "occupation": "Personal Trainer & Nutrition Coach", "traits": "Data-obsessed, needs measurable results, skeptical of fitness fads, science-based approach, wants client progress tracking"},
-            {"name": "Sarah Mitchell", "age": 42, "occupation": "Corporate Executive", "traits": "Time-poor, stress management focus, willing to pay for convenience, needs flexibility for travel schedule, beginner-friendly workouts"},
-            {"name": "Jordan Park", "age": 24, "occupation": "College Student & Part-time Barista", "traits": "Budget-conscious, social motivation from friends, beginner-friendly needs, influenced by fitness influencers on TikTok, wants quick dorm-room workouts"}
-        ]
-    elif any(word in product_lower for word in ['finance', 'money', 'budget', 'invest', 'stock', 'crypto', 'trading', 'saving']):
-        return [
-            {"name": "Robert Chen", "age": 45, "occupation": "Certified Financial Planner", "traits": "Risk-averse with client money, needs regulatory compliance, skeptical of robo-advisors, values personal relationships over algorithms"},
-            {"name": "Emily Rodriguez", "age": 31, "occupation": "Tech Startup Employee", "traits": "High disposable income, wants automated investing, interested in crypto, values time over micromanagement, willing to pay for premium features"},
-            {"name": "Michael Thompson", "age": 58, "occupation": "High School Principal", "traits": "Conservative approach, nearing retirement, needs simplicity, distrusts new fintech, wants guaranteed returns over speculation, needs educational resources"}
-        ]
-    elif any(word in product_lower for word in ['education', 'learn', 'course', 'student', 'study', 'school', 'teaching', 'tutor']):
-        return [
-            {"name": "Dr. Amanda Foster", "age": 52, "occupation": "University Professor", "traits": "Academic rigor, skeptical of ed-tech trends, values accreditation, needs administrative tools, wants measurable learning outcomes for students"},
-            {"name": "Tyler Johnson", "age": 20, "occupation": "Computer Science Student", "traits": "Self-taught learner, prefers video content, wants industry-relevant skills, price-sensitive as a student, values community and peer feedback"},
-            {"name": "Lisa Park", "age": 36, "occupation": "Homeschooling Parent", "traits": "Curriculum control is crucial, needs progress tracking for multiple children, values safety and age-appropriate content, willing to invest in quality education tools"}
-        ]
-    elif any(word in product_lower for word in ['travel', 'trip', 'vacation', 'hotel', 'flight', 'booking', 'destination']):
-        return [
-            {"name": "James Morrison", "age": 41, "occupation": "Management Consultant", "traits": "Frequent business traveler, loyalty program obsessed, needs seamless booking, values time over money, wants automatic itinerary management"},
-            {"name": "Sofia Patel", "age": 27, "occupation": "Remote Software Developer", "traits": "Digital nomad lifestyle, budget backpacker turned comfortable traveler, values authentic local experiences, plans trips around coworking spaces"},
-            {"name": "The Williams Family", "age": 45, "occupation": "Parents of Three", "traits": "Safety-first for kids, needs all-inclusive convenience, plans around school schedules, values memories over luxury, overwhelmed by planning logistics"}
-        ]
-    elif any(word in product_lower for word in ['shopping', 'ecommerce', 'buy', 'store', 'retail', 'fashion', 'clothes']):
-        return [
-            {"name": "Victoria Chang", "age": 33, "occupation": "Fashion Buyer for Department Store", "traits": "Trend forecaster, quality over quantity, skeptical of fast fashion, wants exclusive access, values sustainability credentials, early adopter of new brands"},
-            {"name": "Marcus Johnson", "age": 29, "occupation": "Warehouse Supervisor", "traits": "Deal hunter, compares prices across multiple sites, reads reviews religiously, budget-conscious but splurges on hobbies, wants fast shipping"},
-            {"name": "Betty Thompson", "age": 68, "occupation": "Retired Nurse", "traits": "Needs simplicity, distrusts online payments, wants phone support available, values familiar brands, frustrated by complicated return processes, shops for grandchildren"}
-        ]
+    """Fresh copies of the catalog's fallback personas for the product's category"""
+    return [persona._asdict() for persona in catalog.lookup(classify_product(product_description)).personas]
+
+def build_persona_prompt(product_description, target_market, existing=()):
+    """Prompt asking the model for 3 personas, or only the ones missing from `existing`"""
+    if existing:
+        taken = "\n".join(f"- {p['name']}, {p['age']}, {p['occupation']}: {p['traits']}" for p in existing)
+        count = 3 - len(existing)
+        task = f"""We already have these focus group participants:
+{taken}
+
+Create {count} more realistic user {'persona' if count == 1 else 'personas'} for this product, distinct from the ones above."""
     else:
-        return [
-            {"name": "Alex Thompson", "age": 32, "occupation": "Product Manager at Tech Company", "traits": "Analytical decision-maker, skeptical of marketing claims, needs data-driven proof, compares multiple alternatives before committing, values integration with existing tools"},
-            {"name": "Jordan Lee", "age": 28, "occupation": "Marketing Specialist", "traits": "Early adopter of new tools, enthusiastic about innovation, values convenience and user experience over price, influenced by peer recommendations, willing to pay premium for time savings"},
-            {"name": "Casey Martinez", "age": 35, "occupation": "Operations Director", "traits": "Risk-averse, budget-conscious with clear ROI requirements, needs simplicity and minimal training, worried about team adoption, prefers proven solutions over bleeding edge"}
-        ]
+        task = "Analyze this product and create 3 realistic user personas who would actually use it."
+    return f"""{task}
+
+Product: "{product_description}"
+Target: {target_market or 'General consumers'}
+
+Create personas that are SPECIFIC to this product type. Consider:
+- What jobs/roles would actually use this?
+- What ages make sense for this product?
+- What personality traits relate to HOW they'd use it?
+
+Make them DISTINCT, covering whichever of these types are still missing:
+- One expert/skeptical type who demands proof
+- One enthusiastic early adopter who sees potential
+- One practical user who needs clear value
+
+Submit them with the submit_personas function."""
+
+# JSON schema for structured output; the model fills it in as function call arguments
+PERSONA_FUNCTION = {
+    "name": "submit_personas",
+    "description": "Submit focus group personas for the product",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "personas": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string", "description": "Full name"},
+                        "age": {"type": "integer"},
+                        "occupation": {"type": "string", "description": "Job title"},
+                        "traits": {"type": "string", "description": "3-4 specific traits, comma-separated"}
+                    },
+                    "required": ["name", "age", "occupation", "traits"]
+                }
+            }
+        },
+        "required": ["personas"]
+    }
+}
+
+def is_valid_persona(persona):
+    """Check a generated persona has every field the form needs"""
+    return isinstance(persona, dict) and all(field in persona for field in ('name', 'age', 'occupation', 'traits'))
+
+def parse_personas(personas):
+    """Validate client-supplied personas and normalize their ages, raising ValueError if unusable"""
+    if not isinstance(personas, list) or not personas or not all(is_valid_persona(p) for p in personas):
+        raise ValueError("Each persona needs name, age, occupation and traits")
+    if not all(isinstance(p[field], str) for p in personas for field in ('name', 'occupation', 'traits')):
+        raise ValueError("Persona name, occupation and traits must be strings")
+    try:
+        return [dict(p, age=int(p['age'])) for p in personas]
+    except (TypeError, ValueError):
+        raise ValueError("Persona age must be a number")
+
+def get_cache_mode(data):
+    """Per-request cache control: "use", "bypass" (no read or write) or "refresh" (invalidate, then refetch)"""
+    mode = data.get('cache', True)
+    if mode is False or mode == 'bypass':
+        return 'bypass'
+    if mode == 'refresh':
+        return 'refresh'
+    cache_control = request.cache_control
+    if cache_control.no_store:
+        return 'bypass'
+    if cache_control.no_cache:
+        return 'refresh'
+    return 'use'
+
+def check_persona_cache(key, cache_mode):
+    """Apply a cache mode; returns (cache_status, cached personas or None)"""
+    if cache_mode == 'bypass':
+        persona_cache.bypasses += 1
+        return "BYPASS", None
+    if cache_mode == 'refresh':
+        persona_cache.invalidate(key)
+        return "REFRESH", None
+    personas, tier = persona_cache.get(key)
+    if personas is not None:
+        return f"HIT-{tier.upper()}", personas
+    return "MISS", None
+
+def prompt_description(text, budget=PROMPT_DESCRIPTION_TOKENS):
+    """Text as it goes into prompts: compacted to `budget` estimated tokens, counting what was trimmed"""
+    compacted = compact_description(text, budget)
+    if compacted != text:
+        PROMPT_COMPACTIONS.inc()
+        PROMPT_TOKENS_TRIMMED.inc(estimate_tokens(text) - estimate_tokens(compacted))
+    return compacted
+
+def persona_completion_params(product_description, target_market, existing=()):
+    """Keyword arguments for the persona ChatCompletion call, forcing the persona function"""
+    prompt = build_persona_prompt(prompt_description(product_description),
+                                  prompt_description(target_market, PROMPT_TARGET_MARKET_TOKENS), existing)
+    return dict(
+        model=PERSONA_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        functions=[PERSONA_FUNCTION],
+        function_call={"name": PERSONA_FUNCTION["name"]},
+        temperature=PERSONA_TEMPERATURE,
+        max_tokens=persona_max_tokens(3 - len(existing)),
+        request_timeout=upstream.budget
+    )
+
+def completion_text(message):
+    """Function call arguments if the model used the persona function, else the message content"""
+    function_call = message.get("function_call")
+    if function_call:
+        return function_call.get("arguments") or ""
+    return message.get("content") or ""
 
-@app.route('/')
+def parse_persona_completion(content, count=3):
+    """Salvage up to `count` valid personas; returns (personas, clean).
+
+    Accepts a bare array, a {"personas": [...]} object and markdown fences.
+    Complete objects survive truncation and malformed neighbours; `clean`
+    says whether the output was a well-formed array of valid personas.
+    """
+    parser = JSONArrayStreamParser()
+    objects = parser.feed(content)
+    personas = [p for p in objects if is_valid_persona(p)]
+    clean = parser.closed and not parser.errors and len(personas) == len(objects)
+    return personas[:count], clean
+
+def read_persona_completion(response, count=3):
+    """Parse a persona completion, counting output that needed salvaging"""
+    try:
+        personas, clean = parse_persona_completion(completion_text(response.choices[0].message), count)
+    except Exception as e:
+        print(f"OpenAI error: {e}")
+        personas, clean = [], False
+    if not clean:
+        PERSONA_PARSE_FAILURES.inc()
+        PERSONA_SALVAGED.inc(len(personas))
+    return personas, clean
+
+def upstream_failure_reason(error):
+    """Metric label for why an upstream call produced no completion"""
+    if isinstance(error, Overloaded):
+        return "overloaded"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, UpstreamTimeout):
+        return "timeout"
+    return "upstream_error"
+
+def record_openai_call(started, outcome, response=None, call="personas", usage=None):
+    """Observe OpenAI latency, token usage and cost, logging the call's; returns its duration in seconds.
+
+    `usage` stands in for response.usage where there is none, e.g. estimated
+    for a streamed completion. Short-circuited and shed calls never left the
+    process, so their latency is not observed.
+    """
+    elapsed = time.perf_counter() - started
+    if outcome not in ("circuit_open", "overloaded"):
+        OPENAI_LATENCY.observe(elapsed, outcome=outcome)
+    usage = usage or getattr(response, "usage", None)
+    if usage:
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        cost = usage_cost(prompt_tokens, completion_tokens)
+        OPENAI_TOKENS.inc(prompt_tokens, type="prompt")
+        OPENAI_TOKENS.inc(completion_tokens, type="completion")
+        OPENAI_COST.inc(cost, call=call)
+        print(f"OpenAI usage: call={call} prompt_tokens={prompt_tokens} completion_tokens={completion_tokens} "
+              f"cost_usd={cost:.6f} seconds={elapsed:.3f}")
+    return elapsed
+
+def needs_topup(personas):
+    """Whether a salvaged set is worth a follow-up call for the missing personas"""
+    return 0 < len(personas) < 3
+
+def record_salvage(personas, clean, first_seconds, topup_seconds=None):
+    """Count what salvaging saved compared with regenerating every persona.
+
+    A full regeneration would cost about as long as the first call did: a
+    complete set salvaged from imperfect output saves that call outright, and
+    a top-up saves the difference between it and the smaller follow-up.
+    """
+    if len(personas) < 3:
+        return
+    if topup_seconds is not None:
+        PERSONA_SECONDS_SAVED.inc(max(0.0, first_seconds - topup_seconds))
+    elif not clean:
+        PERSONA_CALLS_SAVED.inc()
+        PERSONA_SECONDS_SAVED.inc(first_seconds)
+
+def topup_personas(product_description, target_market, personas):
+    """Ask the model for only the personas missing from a salvaged set; returns (personas, seconds)"""
+    params = persona_completion_params(product_description, target_market, personas)
+    started = time.perf_counter()
+    try:
+        response = upstream.call(lambda: llm.create(**params))
+    except Exception as e:
+        print(f"OpenAI top-up error: {e}")
+        reason = upstream_failure_reason(e)
+        PERSONA_TOPUPS.inc(outcome=reason)
+        return personas, record_openai_call(started, reason, call="topup")
+    seconds = record_openai_call(started, "ok", response, call="topup")
+    return merge_topup(personas, response), seconds
+
+def merge_topup(personas, response):
+    """Add a top-up completion's personas to a salvaged set, skipping repeated names"""
+    extra, _ = read_persona_completion(response)
+    taken = {str(p['name']) for p in personas}
+    merged = personas + [p for p in extra if str(p['name']) not in taken][:3 - len(personas)]
+    PERSONA_TOPUPS.inc(outcome="complete" if len(merged) == 3 else "partial")
+    return merged
+
+def settle_persona_set(key, cache_mode, cache_status, personas, product_description, reason="invalid_output"):
+    """Cache a full generated set, or fill the gaps from contextual personas; returns (personas, source, cache_status)"""
+    personas = personas or []
+    upstream.record_request(fell_back=len(personas) < 3)
+    if len(personas) < 3:
+        PERSONA_FALLBACKS.inc(reason=reason)
+        filled = personas + get_contextual_personas(product_description)[len(personas):]
+        return filled, "partial-fallback" if personas else "fallback", cache_status
+    if cache_mode != 'bypass':
+        persona_cache.set(key, personas)
+    return personas, "openai", cache_status
+
+def request_persona_set(key, cache_mode, cache_status, product_description, target_market):
+    """Personas from OpenAI, salvaged and topped up, or the contextual fallback"""
+    if llm is None:
+        return settle_persona_set(key, cache_mode, cache_status, None, product_description, "not_configured")
+    # Try OpenAI first, falling back to contextual personas on any error
+    params = persona_completion_params(product_description, target_market)
+    started = time.perf_counter()
+    try:
+        response = upstream.call(lambda: llm.create(**params))
+    except Overloaded:
+        # Shed the request rather than serve canned personas to everyone during a surge
+        raise
+    except Exception as e:
+        print(f"OpenAI error: {e}")
+        reason = upstream_failure_reason(e)
+        record_openai_call(started, reason)
+        return settle_persona_set(key, cache_mode, cache_status, None, product_description, reason)
+    first_seconds = record_openai_call(started, "ok", response)
+    personas, clean = read_persona_completion(response)
+    
+    # Keep what was salvaged and request only the missing personas
+    topup_seconds = None
+    if needs_topup(personas):
+        personas, topup_seconds = topup_personas(product_description, target_market, personas)
+    record_salvage(personas, clean, first_seconds, topup_seconds)
+    return settle_persona_set(key, cache_mode, cache_status, personas, product_description)
+
+def generate_persona_set(product_description, target_market, cache_mode='use'):
+    """Personas from the cache, OpenAI or the contextual fallback; returns (personas, source, cache_status)"""
+    key = cache_key(product_description, target_market, PERSONA_MODEL, PERSONA_TEMPERATURE)
+    cache_status, cached = check_persona_cache(key, cache_mode)
+    if cached is not None:
+        return cached, "cache", cache_status
+    
+    # Concurrent identical requests wait for one upstream call
+    with persona_flights.acquire(key) as flight:
+        if flight.shared:
+            personas, source = flight.result
+            return personas, source, cache_status
+        personas, source, cache_status = request_persona_set(
+            key, cache_mode, cache_status, product_description, target_market
+        )
+        flight.publish([personas, source])
+    return personas, source, cache_status
+
+def personas_response(personas, cache_status):
+    """JSON personas response tagged with how the cache was used"""
+    response = jsonify({"personas": personas})
+    response.headers["X-Cache"] = cache_status
+    return response
+
+def fallback_personas_response(product_description, cache_status):
+    """The category's pre-encoded fallback personas in the best encoding the client accepts"""
+    variants = catalog.lookup(classify_product(product_description)).variants
+    encoding = negotiate(request.headers.get('Accept-Encoding'), variants)
+    response = Response(variants[encoding], mimetype="application/json")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.headers["X-Cache"] = cache_status
+    return response
+
+@bp.route('/')
 def home():
-    """Render the main page"""
-    return render_template_string(HTML_TEMPLATE, result=None)
+    """Serve the pre-rendered main page in the best encoding the client accepts"""
+    encoding = negotiate(request.headers.get('Accept-Encoding'), HOME_VARIANTS)
+    response = Response(HOME_VARIANTS[encoding], mimetype="text/html")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(HOME_ETAG if encoding == "identity" else f"{HOME_ETAG}-{encoding}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@bp.route('/assets/<filename>')
+def asset(filename):
+    """Serve a fingerprinted static asset, precompressed, cacheable forever"""
+    found = assets.lookup(filename, request.headers.get('Accept-Encoding'))
+    if found is None:
+        return jsonify({"error": "Not found"}), 404
+    item, encoding, body = found
+    response = Response(body, content_type=item.content_type)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(item.etag if encoding == "identity" else f"{item.etag}-{encoding}")
+    response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    return response.make_conditional(request)
+
+@registry.add_collector
+def collect_component_stats():
+    """Mirror the upstream guard, rate limiter, persona cache, single-flight and job queue counters into the metrics registry"""
+    stats = upstream.stats()
+    for outcome, field in (("success", "successes"), ("failure", "failures"), ("timeout", "timeouts"),
+                           ("short_circuit", "short_circuits"), ("hedge", "hedges")):
+        UPSTREAM_CALLS.set_total(stats[field], outcome=outcome)
+    UPSTREAM_CIRCUIT_OPEN.set(0 if stats["breaker_state"] == "closed" else 1)
+    cache_stats = persona_cache.stats()
+    for result, field in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"),
+                          ("miss", "misses"), ("bypass", "bypasses")):
+        PERSONA_CACHE_LOOKUPS.set_total(cache_stats[field], result=result)
+    PERSONA_CACHE_BYTES.set(cache_stats["memory_bytes"])
+    admission = stats["admission"]
+    if admission is not None:
+        REQUESTS_REJECTED.set_total(admission["rejected_queue_full"], reason="queue_full")
+        REQUESTS_REJECTED.set_total(admission["rejected_timeout"], reason="queue_timeout")
+        UPSTREAM_QUEUE_DEPTH.set(admission["queued"])
+    REQUESTS_REJECTED.set_total(rate_limiter.rejected, reason="rate_limited")
+    flight_stats = persona_flights.stats()
+    PERSONA_DEDUPLICATED.set_total(flight_stats["deduplicated"] - flight_stats["shared_across_workers"], scope="worker")
+    PERSONA_DEDUPLICATED.set_total(flight_stats["shared_across_workers"], scope="host")
+    if simulation_jobs is not None:
+        for status, count in simulation_jobs.depth().items():
+            JOB_QUEUE_DEPTH.set(count, status=status)
+        job_stats = simulation_jobs.stats()
+        for outcome, field in (("done", "completed"), ("failed", "failed"), ("reclaimed", "reclaimed"),
+                               ("abandoned", "abandoned"), ("superseded", "superseded")):
+            JOBS.set_total(job_stats[field], outcome=outcome)
+
+@bp.before_app_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(route=g.metrics_route)
 
-@app.route('/generate-personas', methods=['POST'])
+def rate_limit_cost():
+    """Tokens a request to a rate-limited endpoint costs, or None if the endpoint is not limited"""
+    if request.endpoint in ('focusgroup.generate_personas', 'focusgroup.generate_personas_stream'):
+        return 1
+    if request.endpoint == 'focusgroup.batch':
+        # Each item that needs personas generated is an upstream call
+        items = (request.get_json(silent=True) or {}).get('items')
+        if isinstance(items, list):
+            return max(1, sum(1 for item in items if not (isinstance(item, dict) and item.get('personas'))))
+        return 1
+    if request.endpoint in ('focusgroup.api_simulate', 'focusgroup.api_submit_job'):
+        return simulation_cost(request.get_json(silent=True))
+    if request.endpoint == 'focusgroup.run_simulation':
+        return simulation_cost(request.form)
+    if request.endpoint == 'focusgroup.discussion_stream':
+        return discussion_cost(request.get_json(silent=True))
+    return None
+
+def simulation_cost(data):
+    """Tokens a simulation request costs: None for canned answers, else a call per persona plus the insight"""
+    # Without a backend, model mode answers canned too
+    if llm is None or not isinstance(data, dict) or data.get('mode') != "model":
+        return None
+    personas = data.get('personas')
+    return (len(personas) if isinstance(personas, list) else 3) + 1
+
+def discussion_cost(data):
+    """Tokens a discussion costs: a call per persona per round plus the insight, or 1 if it will be refused.
+
+    None without a backend, when every turn is canned.
+    """
+    if llm is None:
+        return None
+    try:
+        _, personas, rounds = discussion_request(data)
+    except ValueError:
+        return 1
+    return rounds * len(personas) + 1
+
+def too_many_requests(message, retry_after):
+    """429 response telling the client when to retry"""
+    response = jsonify({"error": message, "retry_after": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+@bp.before_app_request
+def enforce_rate_limit():
+    """Reject clients that exceed their token bucket before any work is done"""
+    cost = rate_limit_cost()
+    if cost is None:
+        return None
+    client = client_key(request.headers.get('X-API-Key'), request.headers.get('X-Forwarded-For'),
+                        request.remote_addr, RATE_LIMIT_TRUST_PROXY, RATE_LIMIT_API_KEYS)
+    allowed, retry_after = rate_limiter.acquire(client, cost)
+    if not allowed:
+        return too_many_requests("Rate limit exceeded", retry_after)
+    return None
+
+@bp.after_app_request
+def record_request_metrics(response):
+    route = g.get("metrics_route", "unmatched")
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    HTTP_LATENCY.observe(time.perf_counter() - g.get("metrics_started", time.perf_counter()), route=route)
+    return response
+
+@bp.teardown_app_request
+def finish_request_metrics(error=None):
+    if "metrics_route" in g:
+        HTTP_IN_FLIGHT.dec(route=g.metrics_route)
+    registry.ensure_flusher()
+    start_job_workers()
+
+@bp.after_app_request
+def compress_response(response):
+    """Gzip dynamic HTML and JSON responses"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or "Accept-Encoding" in response.vary
+            or response.mimetype not in ("text/html", "application/json")):
+        return response
+    body, encoding = compress_dynamic(response.get_data(), request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+@bp.route('/generate-personas', methods=['POST'])
 def generate_personas():
     """Generate personas using OpenAI or fallback"""
     try:
@@ -638,66 +769,377 @@ def generate_personas():
         if not product_description:
             return jsonify({"error": "No product description provided"}), 400
         
-        # Try OpenAI first
-        try:
-            prompt = f"""Analyze this product and create 3 realistic user personas who would actually use it.
-
-Product: "{product_description}"
-Target: {target_market or 'General consumers'}
-
-Create personas that are SPECIFIC to this product type. Consider:
-- What jobs/roles would actually use this?
-- What ages make sense for this product?
-- What personality traits relate to HOW they'd use it?
+        personas, source, cache_status = generate_persona_set(product_description, target_market, get_cache_mode(data))
+        if source == "fallback":
+            return fallback_personas_response(product_description, cache_status)
+        return personas_response(personas, cache_status)
+        
+    except Overloaded as e:
+        return too_many_requests(str(e), e.retry_after)
+    except Exception as e:
+        print(f"Error in generate_personas: {e}")
+        return jsonify({"error": "Failed to generate personas"}), 500
 
-Make them DISTINCT:
-- One expert/skeptical type who demands proof
-- One enthusiastic early adopter who sees potential
-- One practical user who needs clear value
+def sse_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-Return valid JSON only:
-[
-  {{"name": "Full Name", "age": 32, "occupation": "Job Title", "traits": "3-4 specific traits"}},
-  {{"name": "Full Name", "age": 28, "occupation": "Job Title", "traits": "3-4 specific traits"}},
-  {{"name": "Full Name", "age": 35, "occupation": "Job Title", "traits": "3-4 specific traits"}}
-]"""
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=800
-            )
-            
-            content = response.choices[0].message.content
+@bp.route('/generate-personas/stream', methods=['POST'])
+def generate_personas_stream():
+    """Stream personas as Server-Sent Events, each as soon as its JSON object is complete"""
+    data = request.get_json(silent=True) or {}
+    product_description = data.get('product_description', '')
+    target_market = data.get('target_market', '')
+    
+    if not product_description:
+        return jsonify({"error": "No product description provided"}), 400
+    
+    key = cache_key(product_description, target_market, PERSONA_MODEL, PERSONA_TEMPERATURE)
+    cache_mode = get_cache_mode(data)
+    cache_status, cached = check_persona_cache(key, cache_mode)
+    # Once the stream starts the status is committed, so shed load before it does
+    if cached is None and upstream.gate is not None and upstream.gate.saturated():
+        upstream.gate.rejected_queue_full += 1
+        return too_many_requests("Upstream queue is full", upstream.retry_after())
+    started = time.perf_counter()
+    
+    def events():
+        sent = []
+        first_persona_ms = None
+        
+        def emit(persona):
+            nonlocal first_persona_ms
+            if first_persona_ms is None:
+                first_persona_ms = round((time.perf_counter() - started) * 1000, 1)
+            sent.append(persona)
+            return sse_event("persona", {"index": len(sent) - 1, "persona": persona})
+        
+        if cached is not None:
+            source = "cache"
+            for persona in cached:
+                yield emit(persona)
+        else:
+            # Concurrent identical requests wait for one upstream call
+            with persona_flights.acquire(key) as flight:
+                if flight.shared:
+                    personas, source = flight.result
+                    for persona in personas:
+                        yield emit(persona)
+                else:
+                    source = yield from stream_from_upstream(emit, sent)
+                    flight.publish([sent, source])
+        
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        print(f"Persona stream: source={source} first_persona_ms={first_persona_ms} total_ms={total_ms}")
+        yield sse_event("done", {"source": source, "first_persona_ms": first_persona_ms, "total_ms": total_ms})
+    
+    def stream_from_upstream(emit, sent):
+        """Emit personas as OpenAI streams them, then top up or fill any gaps; returns the source"""
+        source = "openai"
+        reason = "invalid_output"
+        clean = False
+        first_seconds = None
+        # Streams are consumed incrementally, so only admission, the breaker and the network timeout apply
+        try:
+            with upstream.admit():
+                if llm is None:
+                    reason = "not_configured"
+                elif not upstream.breaker.allow():
+                    upstream.short_circuits += 1
+                    reason = "circuit_open"
+                else:
+                    params = persona_completion_params(product_description, target_market)
+                    call_started = time.perf_counter()
+                    try:
+                        chunks = llm.create(stream=True, **params)
+                        parser = JSONArrayStreamParser()
+                        streamed = 0
+                        for chunk in chunks:
+                            delta = completion_text(chunk.choices[0].delta)
+                            streamed += len(delta)
+                            for persona in parser.feed(delta):
+                                if is_valid_persona(persona) and len(sent) < 3:
+                                    yield emit(persona)
+                            if parser.closed:
+                                break
+                        upstream.breaker.record_success()
+                        # Streamed completions carry no usage, so it is estimated
+                        usage = {"prompt_tokens": estimate_prompt_tokens(params["messages"], params["functions"]),
+                                 "completion_tokens": (streamed + 3) // 4}
+                        first_seconds = record_openai_call(call_started, "ok", call="persona_stream", usage=usage)
+                        clean = parser.closed and not parser.errors
+                    except GeneratorExit:
+                        # The client disconnected mid-stream, which says nothing about the upstream
+                        upstream.breaker.release_probe()
+                        raise
+                    except Exception as e:
+                        upstream.breaker.record_failure()
+                        reason = "upstream_error"
+                        record_openai_call(call_started, reason, call="persona_stream")
+                        print(f"OpenAI stream error: {e}")
+        except Overloaded:
+            reason = "overloaded"
+        
+        if first_seconds is not None:
+            if len(sent) < 3 or not clean:
+                PERSONA_PARSE_FAILURES.inc()
+                PERSONA_SALVAGED.inc(len(sent))
             
-            # Extract JSON if wrapped in markdown
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
+            # Request only the personas the stream did not deliver
+            topup_seconds = None
+            if needs_topup(sent):
+                streamed = len(sent)
+                completed, topup_seconds = topup_personas(product_description, target_market, list(sent))
+                for persona in completed[streamed:]:
+                    yield emit(persona)
+            record_salvage(sent, clean, first_seconds, topup_seconds)
+            if len(sent) == 3 and cache_mode != 'bypass':
+                persona_cache.set(key, list(sent))
+        
+        # Fill whatever slots the model did not deliver
+        upstream.record_request(fell_back=len(sent) < 3)
+        if len(sent) < 3:
+            PERSONA_FALLBACKS.inc(reason=reason)
+            source = "fallback" if not sent else "partial-fallback"
+            for persona in get_contextual_personas(product_description)[len(sent):]:
+                yield emit(persona)
+        return source
+    
+    response = Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.headers["X-Cache"] = cache_status
+    return response
+
+def simulate_focus_group(product_description, personas_data):
+    """Responses from each persona plus a strategic insight for the product"""
+    # Generate responses based on persona traits
+    responses = []
+    
+    for p in personas_data:
+        # Determine role and response based on traits
+        role = classify_role(p['traits'])
+        
+        if role == "The Expert/Skeptic":
+            text = f"As a {p['occupation']}, I approach this with professional skepticism. Being {p['traits'].split(',')[0].lower()}, I've seen too many products overpromise and underdeliver. I need to see third-party validation, user reviews, and ideally a free trial period to evaluate whether this actually works as claimed. My main concern is reliability - if I commit to this, it needs to work flawlessly. I'd also want to know about data privacy and what happens if I want to cancel. The concept has merit, but I'm not convinced yet."
             
-            personas = json.loads(content.strip())
+        elif role == "The Early Adopter":
+            text = f"I'm genuinely excited about this! As someone who's {p['traits'].split(',')[0].lower()}, I can see the potential immediately. This addresses a real pain point I've experienced personally. I'd definitely try it out - the value proposition is clear to me, and I'm willing to be among the first users. My main question is about the roadmap - what features are coming next? I want to know I'm investing in a product that will keep improving. I'm also likely to share this with my network if it delivers."
             
-            # Validate structure
-            if len(personas) == 3 and all('name' in p and 'age' in p and 'occupation' in p and 'traits' in p for p in personas):
-                return jsonify({"personas": personas})
-            else:
-                # Fall back to contextual if validation fails
-                personas = get_contextual_personas(product_description)
-                return jsonify({"personas": personas})
-                
-        except Exception as e:
-            print(f"OpenAI error: {e}")
-            # Fall back to contextual personas
-            personas = get_contextual_personas(product_description)
-            return jsonify({"personas": personas})
+        else:
+            text = f"I'm interested but need to be practical about this decision. As a {p['occupation']}, {p['traits'].split(',')[0].lower()}, so I need to carefully evaluate whether this justifies the cost and time investment. I'd start with whatever free option is available, but I'd need to see clear value within the first week to continue. My biggest concern is adoption - will I actually use this consistently, or will it become another forgotten subscription? I also worry about customer support if something goes wrong. Show me how this makes my life easier, and I'm in."
         
+        responses.append({
+            'name': p['name'],
+            'role': role,
+            'text': text
+        })
+    
+    # Contextual insight for the product's category
+    insight = catalog.lookup(classify_product(product_description)).insight
+    
+    return {
+        'product': product_description[:100] + '...' if len(product_description) > 100 else product_description,
+        'responses': responses,
+        'insight': insight
+    }
+
+def chat_completion(messages, max_tokens, deadline, call="simulation"):
+    """A chat completion finished by `deadline` (time.monotonic()), or None if it failed or ran late"""
+    budget = deadline - time.monotonic()
+    if budget <= 0:
+        return None
+    started = time.perf_counter()
+    try:
+        response = upstream.call(lambda: llm.create(
+            model=PERSONA_MODEL, messages=messages, temperature=SIMULATION_TEMPERATURE,
+            max_tokens=max_tokens, request_timeout=budget,
+        ), budget=budget)
     except Exception as e:
-        print(f"Error in generate_personas: {e}")
-        return jsonify({"error": "Failed to generate personas"}), 500
+        print(f"OpenAI simulation error: {e}")
+        record_openai_call(started, upstream_failure_reason(e), call=call)
+        return None
+    record_openai_call(started, "ok", response, call=call)
+    return response
+
+def complete_text(messages, max_tokens, deadline, call="simulation"):
+    """Text of chat_completion(), or None if there is none"""
+    response = chat_completion(messages, max_tokens, deadline, call)
+    if response is None:
+        return None
+    return completion_text(response.choices[0].message).strip() or None
 
-@app.route('/run-simulation', methods=['POST'])
+def apply_model_responses(responses, texts):
+    """Swap in the model's text where a call succeeded; the rest keep their canned text"""
+    for response, text in zip(responses, texts):
+        response['source'] = "model" if text else "canned"
+        if text:
+            response['text'] = text
+        SIMULATION_RESPONSES.inc(source=response['source'])
+
+def simulate_with_model(product_description, personas_data, timings):
+    """simulate_focus_group with each response and the insight written by the model.
+
+    Persona calls run concurrently and share one deadline, then the insight is
+    synthesized from whatever came back. A call that fails or misses the
+    deadline keeps its canned text, so the page never waits past the budgets.
+    """
+    result = simulate_focus_group(product_description, personas_data)
+    responses = result['responses']
+    if llm is None:
+        apply_model_responses(responses, [None] * len(responses))
+        return result
+
+    description = prompt_description(product_description)
+    started = time.monotonic()
+    deadline = started + SIMULATION_PERSONA_BUDGET
+    texts = fan_out([
+        partial(complete_text, response_messages(description, p, response['role']), RESPONSE_MAX_TOKENS, deadline)
+        for p, response in zip(personas_data, responses)
+    ], SIMULATION_PERSONA_BUDGET)
+    apply_model_responses(responses, texts)
+    insight_started = time.monotonic()
+    timings['persona_ms'] = round((insight_started - started) * 1000, 3)
+
+    # With no model response at all the upstream is struggling; don't spend the insight budget on it
+    if any(texts):
+        insight = complete_text(insight_messages(description, responses), INSIGHT_MAX_TOKENS,
+                                insight_started + SIMULATION_INSIGHT_BUDGET, call="insight")
+        if insight:
+            result['insight'] = insight
+        timings['insight_ms'] = round((time.monotonic() - insight_started) * 1000, 3)
+    return result
+
+def discussion_turn(messages, deadline):
+    """(text, usage) of a model-written discussion turn, or None to fall back to canned text"""
+    response = chat_completion(messages, TURN_MAX_TOKENS, deadline, call="discussion")
+    if response is None:
+        return None
+    text = completion_text(response.choices[0].message).strip()
+    return (text, getattr(response, "usage", None) or {}) if text else None
+
+def run_discussion(product_description, personas, rounds, timings, emit):
+    """Yield emit(event, data) for each step of a moderated discussion as it happens; returns the result.
+
+    Every round the moderator asks a question and all personas answer it
+    concurrently, each seeing the earlier turns only as compact_transcript().
+    Turns are emitted in the order they complete; one that fails or misses
+    the round's deadline gets canned text. A final call turns the discussion
+    into the insight. Each round's latency and tokens go into `timings`.
+    """
+    canned = simulate_focus_group(product_description, personas)
+    roles = [response['role'] for response in canned['responses']]
+    description = prompt_description(product_description)
+    turns = []
+    timings['rounds'] = []
+    for round_number in range(1, rounds + 1):
+        question = moderator_question(round_number, rounds)
+        summary = compact_transcript(turns)
+        yield emit("moderator", {"round": round_number, "question": question})
+
+        started = time.monotonic()
+        deadline = started + DISCUSSION_ROUND_BUDGET
+        calls = [
+            partial(discussion_turn,
+                    turn_messages(description, personas, index, roles[index], summary, question), deadline)
+            for index in range(len(personas))
+        ] if llm is not None else []
+        completed = completed_within(calls, DISCUSSION_ROUND_BUDGET) if llm is not None else \
+            ((index, None) for index in range(len(personas)))
+
+        stats = {"round": round_number, "prompt_tokens": 0, "completion_tokens": 0,
+                 "summary_tokens": estimate_tokens(summary), "model_turns": 0}
+        round_turns = []
+        for index, turn_result in completed:
+            if turn_result is not None:
+                text, usage = turn_result
+                stats["model_turns"] += 1
+                stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+                stats["completion_tokens"] += usage.get("completion_tokens", 0)
+            elif round_number == 1:
+                text = canned['responses'][index]['text']
+            else:
+                text = canned_reaction(personas, index, roles[index])
+            turn = {"round": round_number, "name": personas[index]['name'], "role": roles[index], "text": text,
+                    "source": "model" if turn_result is not None else "canned"}
+            round_turns.append((index, turn))
+            yield emit("turn", dict(turn, index=index, ms=round((time.monotonic() - started) * 1000, 1)))
+
+        seconds = time.monotonic() - started
+        DISCUSSION_ROUND_LATENCY.observe(seconds)
+        stats["ms"] = round(seconds * 1000, 1)
+        timings['rounds'].append(stats)
+        # Later rounds see the turns in persona order, whichever finished first
+        turns.extend(turn for _, turn in sorted(round_turns, key=lambda item: item[0]))
+        yield emit("round", stats)
+
+    insight, source = canned['insight'], "canned"
+    if any(turn['source'] == "model" for turn in turns):
+        started = time.monotonic()
+        text = complete_text(discussion_insight_messages(description, compact_transcript(turns)),
+                             INSIGHT_MAX_TOKENS, started + SIMULATION_INSIGHT_BUDGET, call="insight")
+        timings['insight_ms'] = round((time.monotonic() - started) * 1000, 3)
+        if text:
+            insight, source = text, "model"
+    yield emit("insight", {"text": insight, "source": source})
+    return {'product': canned['product'], 'responses': turns, 'insight': insight}
+
+def discussion_request(data):
+    """(product_description, personas, rounds) of a discussion request, raising ValueError if unusable"""
+    if not isinstance(data, dict):
+        raise ValueError("No product description provided")
+    product_description = data.get('product_description', '')
+    if not product_description:
+        raise ValueError("No product description provided")
+    personas = parse_personas(data.get('personas'))
+    if len(personas) > DISCUSSION_MAX_PERSONAS:
+        raise ValueError(f"A discussion takes at most {DISCUSSION_MAX_PERSONAS} personas")
+    try:
+        rounds = int(data.get('rounds', DISCUSSION_DEFAULT_ROUNDS))
+    except (TypeError, ValueError):
+        raise ValueError("rounds must be a number")
+    if not 1 <= rounds <= DISCUSSION_MAX_ROUNDS:
+        raise ValueError(f"rounds must be between 1 and {DISCUSSION_MAX_ROUNDS}")
+    return product_description, personas, rounds
+
+@bp.route('/api/discussion/stream', methods=['POST'])
+def discussion_stream():
+    """Run a moderated discussion, streaming each turn as a Server-Sent Event as soon as it completes"""
+    try:
+        product_description, personas, rounds = discussion_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Once the stream starts the status is committed, so shed load before it does
+    if llm is not None and upstream.gate is not None and upstream.gate.saturated():
+        upstream.gate.rejected_queue_full += 1
+        return too_many_requests("Upstream queue is full", upstream.retry_after())
+    started = time.perf_counter()
+
+    def events():
+        timings = {}
+        result = yield from run_discussion(product_description, personas, rounds, timings, sse_event)
+        result = store_simulation(product_description, personas, result, timings, started)
+        yield sse_event("done", {
+            "rounds": rounds,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "prompt_tokens": sum(stats["prompt_tokens"] for stats in timings['rounds']),
+            "completion_tokens": sum(stats["completion_tokens"] for stats in timings['rounds']),
+            "permalink": result.get('permalink'),
+        })
+
+    response = Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+def simulation_mode(data):
+    """The requested simulation mode, raising ValueError for an unknown one"""
+    mode = data.get('mode') or "canned"
+    if mode not in SIMULATION_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(SIMULATION_MODES)}")
+    return mode
+
+@bp.route('/run-simulation', methods=['POST'])
 def run_simulation():
     """Run the focus group simulation"""
     try:
@@ -715,54 +1157,13 @@ def run_simulation():
             }
             personas_data.append(persona)
         
-        # Generate responses based on persona traits
-        responses = []
-        
-        for p in personas_data:
-            traits_lower = p['traits'].lower()
-            
-            # Determine role and response based on traits
-            if any(word in traits_lower for word in ['skeptic', 'analytical', 'data', 'perfectionist', 'scientific', 'rigid']):
-                role = "The Expert/Skeptic"
-                text = f"As a {p['occupation']}, I approach this with professional skepticism. Being {p['traits'].split(',')[0].lower()}, I've seen too many products overpromise and underdeliver. I need to see third-party validation, user reviews, and ideally a free trial period to evaluate whether this actually works as claimed. My main concern is reliability - if I commit to this, it needs to work flawlessly. I'd also want to know about data privacy and what happens if I want to cancel. The concept has merit, but I'm not convinced yet."
-                
-            elif any(word in traits_lower for word in ['enthusiast', 'early adopter', 'optimistic', 'trend', 'experimental', 'influencer']):
-                role = "The Early Adopter"
-                text = f"I'm genuinely excited about this! As someone who's {p['traits'].split(',')[0].lower()}, I can see the potential immediately. This addresses a real pain point I've experienced personally. I'd definitely try it out - the value proposition is clear to me, and I'm willing to be among the first users. My main question is about the roadmap - what features are coming next? I want to know I'm investing in a product that will keep improving. I'm also likely to share this with my network if it delivers."
-                
-            else:
-                role = "The Practical User"
-                text = f"I'm interested but need to be practical about this decision. As a {p['occupation']}, {p['traits'].split(',')[0].lower()}, so I need to carefully evaluate whether this justifies the cost and time investment. I'd start with whatever free option is available, but I'd need to see clear value within the first week to continue. My biggest concern is adoption - will I actually use this consistently, or will it become another forgotten subscription? I also worry about customer support if something goes wrong. Show me how this makes my life easier, and I'm in."
-            
-            responses.append({
-                'name': p['name'],
-                'role': role,
-                'text': text
-            })
-        
-        # Generate contextual insight based on product type
-        product_lower = product_description.lower()
-        
-        if any(word in product_lower for word in ['recipe', 'cook', 'food']):
-            insight = "Your expert persona (chef) needs authenticity - emphasize recipe testing and professional credibility. Your busy parent needs convenience without sacrificing nutrition - highlight meal planning and grocery list features. Your content creator needs visual appeal - focus on presentation and social features. Price sensitivity varies: professionals pay for quality, families watch budgets, creators want growth tools."
-        elif any(word in product_lower for word in ['fitness', 'workout', 'gym']):
-            insight = "The trainer needs data and progress tracking features. The executive needs time efficiency and flexibility - emphasize quick workouts and travel-friendly options. The student needs affordability and social motivation - consider a free tier and community features. All segments care about results, but measure them differently: professionals want performance data, executives want stress relief, students want visible changes."
-        elif any(word in product_lower for word in ['finance', 'money', 'invest']):
-            insight = "The financial planner needs compliance and security assurances - emphasize regulation and data protection. The tech worker wants automation and modern features - highlight AI and mobile experience. The near-retiree needs stability and education - focus on guaranteed returns and learning resources. Trust is the key barrier: professionals need credentials, tech workers want innovation, retirees want safety."
-        else:
-            insight = "Your skeptical persona needs social proof - add testimonials, case studies, and metrics. Your enthusiast is your ideal early adopter - target them for beta programs and referrals. Your practical user represents your retention risk - focus on onboarding simplicity and quick wins. Consider tiered pricing: premium for enthusiasts, standard for skeptics (once convinced), and basic for practical users testing the waters."
-        
-        result = {
-            'product': product_description[:100] + '...' if len(product_description) > 100 else product_description,
-            'responses': responses,
-            'insight': insight
-        }
+        result = simulate_and_store(product_description, personas_data, simulation_mode(request.form))
         
-        return render_template_string(HTML_TEMPLATE, result=result)
+        return render_page(result)
         
     except Exception as e:
         print(f"Error in run_simulation: {e}")
-        return render_template_string(HTML_TEMPLATE, result={
+        return render_page({
             'product': "Error running simulation",
             'responses': [
                 {'name': 'System', 'role': 'Error', 'text': f'An error occurred: {str(e)}. Please try again.'}
@@ -770,10 +1171,369 @@ def run_simulation():
             'insight': 'Make sure all persona fields are filled out correctly.'
         })
 
-@app.route('/health')
+def simulation_request(data):
+    """Validate a simulation request; returns (product_description, personas, mode) or raises ValueError"""
+    product_description = data.get('product_description', '')
+    if not product_description:
+        raise ValueError("No product description provided")
+    return product_description, parse_personas(data.get('personas')), simulation_mode(data)
+
+@bp.route('/api/simulate', methods=['POST'])
+def api_simulate():
+    """Run the focus group simulation and return the results as JSON"""
+    try:
+        product_description, personas, mode = simulation_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(simulate_and_store(product_description, personas, mode))
+
+def start_job_workers():
+    """Start this process's job threads if they are not running; called after fork, like the metrics flusher"""
+    if simulation_jobs is not None:
+        simulation_jobs.ensure_workers(run_job)
+
+def run_job(job):
+    """Run a claimed simulation job and return its result, recording queue wait and end-to-end latency"""
+    params = job['request']
+    mode = params['mode']
+    JOB_WAIT.observe(job['started_at'] - job['created_at'], mode=mode)
+    result = simulate_and_store(params['product_description'], params['personas'], mode)
+    JOB_LATENCY.observe(time.time() - job['created_at'], mode=mode)
+    return result
+
+def job_status(job):
+    """The public view of a job: its state, queue position or result, and where to follow it"""
+    status = {
+        "id": job['id'],
+        "status": job['status'],
+        "mode": job['request']['mode'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "attempts": job['attempts'],
+        "status_url": f"/api/jobs/{job['id']}",
+        "events_url": f"/api/jobs/{job['id']}/events",
+    }
+    if 'position' in job:
+        status['position'] = job['position']
+    if job['result'] is not None:
+        status['result'] = job['result']
+    if job['error'] is not None:
+        status['error'] = job['error']
+    return status
+
+@bp.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """Queue a simulation and return its job id at once; the result is collected by polling or SSE"""
+    if simulation_jobs is None:
+        return jsonify({"error": "Simulation jobs are disabled"}), 404
+    try:
+        product_description, personas, mode = simulation_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if simulation_jobs.full():
+        return too_many_requests("Job queue is full", upstream.retry_after())
+    
+    start_job_workers()
+    job_id = simulation_jobs.submit(
+        {"product_description": product_description, "personas": personas, "mode": mode})
+    status = job_status(simulation_jobs.get(job_id))
+    return jsonify(status), 202, {"Location": status['status_url']}
+
+@bp.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """A job's status, with its result once it is done"""
+    if simulation_jobs is None:
+        return jsonify({"error": "Simulation jobs are disabled"}), 404
+    job = simulation_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Not found"}), 404
+    response = jsonify(job_status(job))
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+@bp.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's status changes as Server-Sent Events, ending with `done` or `failed`"""
+    if simulation_jobs is None:
+        return jsonify({"error": "Simulation jobs are disabled"}), 404
+    if simulation_jobs.get(job_id) is None:
+        return jsonify({"error": "Not found"}), 404
+    
+    def events():
+        last = None
+        deadline = time.monotonic() + JOB_STREAM_TIMEOUT
+        while True:
+            job = simulation_jobs.get(job_id)
+            if job is None:
+                return
+            status = job_status(job)
+            if status['status'] in ("done", "failed"):
+                yield sse_event(status['status'], status)
+                return
+            # Only changes are sent: queued with a new position, or running
+            state = (status['status'], status.get('position'))
+            if state != last:
+                yield sse_event("status", status)
+                last = state
+            if time.monotonic() > deadline:
+                return
+            time.sleep(JOB_STREAM_INTERVAL)
+    
+    response = Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+def simulate_and_store(product_description, personas, mode="canned"):
+    """Run the simulation in the given mode and persist it; a stored result carries its id and permalink"""
+    started = time.perf_counter()
+    timings = {}
+    if mode == "model":
+        result = simulate_with_model(product_description, personas, timings)
+    else:
+        result = simulate_focus_group(product_description, personas)
+    return store_simulation(product_description, personas, result, timings, started)
+
+def store_simulation(product_description, personas, result, timings, started):
+    """Persist a finished simulation that began at `started` (time.perf_counter())"""
+    if simulation_store is None:
+        return result
+    timings["simulate_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    simulation_id = simulation_store.save(product_description, personas, result, timings)
+    if simulation_id is None:
+        return result
+    return dict(result, id=simulation_id, permalink=f"/results/{simulation_id}")
+
+def stored_result(simulation_id):
+    """A stored simulation with its permalink, or None if unknown or the store is disabled"""
+    if simulation_store is None:
+        return None
+    result = simulation_store.get(simulation_id)
+    if result is None:
+        return None
+    result['permalink'] = f"/results/{simulation_id}"
+    return result
+
+def history_request(args):
+    """Validate history query parameters; returns (limit, cursor, product) or raises ValueError"""
+    try:
+        limit = int(args.get('limit', HISTORY_DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= HISTORY_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
+    return limit, args.get('cursor') or None, args.get('product') or None
+
+def history_page(limit, cursor, product):
+    """One page of the simulation history as a JSON-serializable dict"""
+    items, next_cursor = simulation_store.history(limit, cursor, product)
+    for item in items:
+        item['permalink'] = f"/results/{item['id']}"
+    return {"items": items, "next_cursor": next_cursor}
+
+@bp.route('/results/<simulation_id>')
+def result_page(simulation_id):
+    """Render a stored simulation without recomputing it"""
+    result = stored_result(simulation_id)
+    if result is None:
+        return Response("Not Found", status=404, mimetype="text/plain")
+    # Stored simulations never change, so the id is a strong validator; the gzipped body gets its own
+    body, encoding = compress_dynamic(render_page(result).encode("utf-8"), request.headers.get('Accept-Encoding'))
+    response = Response(body, mimetype="text/html")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(f"{simulation_id}-{encoding}" if encoding else simulation_id)
+    return response.make_conditional(request)
+
+@bp.route('/api/results/<simulation_id>')
+def api_result(simulation_id):
+    """A stored simulation as JSON"""
+    result = stored_result(simulation_id)
+    if result is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(result)
+
+def history_denied(key):
+    """(error, status) if a client sending X-API-Key `key` may not list or export stored simulations, else None.
+
+    Both reach every stored simulation, so they are off until RATE_LIMIT_API_KEYS
+    is set and then need one of those keys.
+    """
+    if simulation_store is None or not RATE_LIMIT_API_KEYS:
+        return "Simulation history is disabled", 404
+    if not key or key not in RATE_LIMIT_API_KEYS:
+        return "A valid X-API-Key is required", 401
+    return None
+
+@bp.route('/api/history')
+def api_history():
+    """Stored simulations, newest first, one keyset-paginated page at a time"""
+    denied = history_denied(request.headers.get('X-API-Key'))
+    if denied:
+        error, status = denied
+        return jsonify({"error": error}), status
+    try:
+        limit, cursor, product = history_request(request.args)
+        return jsonify(history_page(limit, cursor, product))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def export_request(args):
+    """Validate export query parameters; returns (kind, format, since, until, keyword) or raises ValueError"""
+    kind = args.get('kind', 'simulations')
+    if kind not in EXPORT_COLUMNS:
+        raise ValueError(f"kind must be one of: {', '.join(EXPORT_COLUMNS)}")
+    fmt = args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    since = parse_time(args['since']) if args.get('since') else None
+    until = parse_time(args['until']) if args.get('until') else None
+    return kind, fmt, since, until, args.get('product') or None
+
+@bp.route('/api/export')
+def api_export():
+    """Stream stored simulations, personas or responses as NDJSON or CSV, gzipped if the client accepts it"""
+    denied = history_denied(request.headers.get('X-API-Key'))
+    if denied:
+        error, status = denied
+        return jsonify({"error": error}), status
+    try:
+        kind, fmt, since, until, keyword = export_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # As in compress_dynamic, gzip stands in as the smaller variant so it wins whenever it is acceptable
+    compress = negotiate(request.headers.get('Accept-Encoding'), {"identity": b"-", "gzip": b""}) == "gzip"
+    simulations = simulation_store.iter_simulations(since, until, keyword)
+    response = Response(export_stream(simulations, kind, fmt, compress), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+def run_batch_item(job):
+    """Generate personas when none are given, then simulate one batch item"""
+    item, cache_mode = job
+    if not isinstance(item, dict):
+        raise ValueError("Item must be an object")
+    product_description = item.get('product_description', '')
+    if not product_description:
+        raise ValueError("No product description provided")
+    
+    personas = item.get('personas')
+    if personas:
+        personas = parse_personas(personas)
+        source = "provided"
+    else:
+        personas, source, _ = generate_persona_set(product_description, item.get('target_market', ''), cache_mode)
+    
+    result = simulate_focus_group(product_description, personas)
+    return {
+        "personas": personas,
+        "persona_source": source,
+        "responses": result['responses'],
+        "insight": result['insight']
+    }
+
+def panel_request(data):
+    """Validate a panel request; returns (archetypes, size, seed) or raises ValueError"""
+    product_description = data.get('product_description', '')
+    if not product_description:
+        raise ValueError("No product description provided")
+    try:
+        size = int(data.get('size', PANEL_DEFAULT_SIZE))
+        seed = data.get('seed')
+        seed = None if seed is None else int(seed)
+    except (TypeError, ValueError):
+        raise ValueError("size and seed must be integers")
+    if not 1 <= size <= PANEL_MAX_SIZE:
+        raise ValueError(f"size must be between 1 and {PANEL_MAX_SIZE}")
+    
+    # Sample around the caller's personas if given, else the contextual archetypes
+    personas = data.get('personas')
+    archetypes = parse_personas(personas) if personas else get_contextual_personas(product_description)
+    return archetypes, size, seed
+
+@bp.route('/api/panel', methods=['POST'])
+def api_panel():
+    """Simulate a large synthetic panel and return aggregate statistics"""
+    data = request.get_json(silent=True) or {}
+    try:
+        archetypes, size, seed = panel_request(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(simulate_panel(archetypes, size, seed))
+
+@bp.route('/batch', methods=['POST'])
+def batch():
+    """Run persona generation and simulation for a list of products in parallel"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "No items provided"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"A batch can contain at most {BATCH_MAX_ITEMS} items"}), 400
+    
+    # Requests may lower the server limits but never raise them
+    try:
+        concurrency = min(int(data.get('concurrency', BATCH_MAX_CONCURRENCY)), BATCH_MAX_CONCURRENCY)
+        item_timeout = min(float(data.get('item_timeout', BATCH_ITEM_TIMEOUT)), BATCH_ITEM_TIMEOUT)
+        deadline = min(float(data.get('deadline', BATCH_DEADLINE)), BATCH_DEADLINE)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid batch limits"}), 400
+    if concurrency < 1 or item_timeout <= 0 or deadline <= 0:
+        return jsonify({"error": "Invalid batch limits"}), 400
+    
+    jobs = [(item, get_cache_mode(item) if isinstance(item, dict) else 'use') for item in items]
+    results, total_ms = run_batch(jobs, run_batch_item, concurrency, item_timeout, deadline)
+    succeeded = sum(1 for r in results if r['ok'])
+    return jsonify({
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "total_ms": total_ms,
+        "limits": {"concurrency": concurrency, "item_timeout": item_timeout, "deadline": deadline}
+    })
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus metrics, aggregated across workers when METRICS_DIR is set"""
+    return Response(registry.exposition(), mimetype="text/plain; version=0.0.4")
+
+@bp.route('/health')
 def health():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "api_key_configured": bool(api_key)})
+    return jsonify({
+        "status": "healthy",
+        "api_key_configured": bool(api_key),
+        "llm": llm.stats() if llm is not None else None,
+        "persona_cache": persona_cache.stats(),
+        "persona_singleflight": persona_flights.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "semantic_match": semantic_matcher.stats() if semantic_matcher is not None else None,
+        "simulation_store": simulation_store.stats() if simulation_store is not None else None,
+        "simulation_jobs": simulation_jobs.stats() if simulation_jobs is not None else None,
+        "upstream": upstream.stats()
+    })
+
+def create_app():
+    """Build the Flask app around the focusgroup blueprint.
+
+    Shared state (template, persona tables, caches, upstream guard) is built
+    at import, so with gunicorn --preload it is built once in the master and
+    shared copy-on-write by the workers.
+    """
+    flask_app = Flask(__name__, static_folder=None)
+    flask_app.register_blueprint(bp)
+    return flask_app
+
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
@@ -0,0 +1,764 @@
+"""ASGI entry point serving the core routes on an event loop.
+
+Serves `/`, `/generate-personas`, `/run-simulation`, `/api/simulate`,
+`/api/panel`, the stored results and history, job submission, status and events, `/health` and `/metrics` with the same responses as the Flask
+app, but the model round trip is awaited with the backend's `acreate`
+instead of blocking a worker, so one worker can hold hundreds of upstream
+calls in flight. The streamed routes (`/generate-personas/stream`,
+`/api/discussion/stream`), `/batch` and `/api/export` are handed to the
+Flask app itself on a thread of their own, their body forwarded chunk by
+chunk as it is produced, so every route the page uses works here too. SQLite reads and writes (the persona cache's disk tier,
+stored simulations, the job queue) and the panel's NumPy work run on the
+loop's default thread pool instead, so they never stall other requests.
+Run it with:
+
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+The shared logic (template, cache, classifier, fallback personas, upstream
+guard) is imported from app.py, so both entry points behave identically.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import aiohttp
+
+import app as flask_app
+from assets import ASSET_CACHE_CONTROL, compress_dynamic, negotiate
+from cache import cache_key
+from jobs import JOB_STREAM_INTERVAL, JOB_STREAM_TIMEOUT
+from metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, JOB_LATENCY, JOB_WAIT, PERSONA_TOPUPS, registry
+from ratelimit import client_key
+from resilience import Overloaded
+
+# Upstream connections held open per worker
+ASGI_MAX_CONNECTIONS = int(os.environ.get("ASGI_MAX_CONNECTIONS", 500))
+# Threads per worker serving the routes handed to the Flask app
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 32))
+
+_session = None
+
+
+def get_session():
+    """Shared aiohttp session for OpenAI calls, created on the running loop"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=ASGI_MAX_CONNECTIONS))
+    return _session
+
+
+# The openai backend awaits its calls on the shared session
+if flask_app.llm is not None:
+    flask_app.llm.use_session(get_session)
+
+
+async def atopup_personas(product_description, target_market, personas):
+    """Async counterpart of app.topup_personas"""
+    params = flask_app.persona_completion_params(product_description, target_market, personas)
+    started = time.perf_counter()
+    try:
+        response = await flask_app.upstream.acall(lambda: flask_app.llm.acreate(**params))
+    except Exception as e:
+        print(f"OpenAI top-up error: {e}")
+        reason = flask_app.upstream_failure_reason(e)
+        PERSONA_TOPUPS.inc(outcome=reason)
+        return personas, flask_app.record_openai_call(started, reason, call="topup")
+    seconds = flask_app.record_openai_call(started, "ok", response, call="topup")
+    return flask_app.merge_topup(personas, response), seconds
+
+
+async def arequest_persona_set(key, cache_mode, cache_status, product_description, target_market):
+    """Async counterpart of app.request_persona_set"""
+    if flask_app.llm is None:
+        return await asyncio.to_thread(flask_app.settle_persona_set, key, cache_mode, cache_status, None,
+                                       product_description, "not_configured")
+    # Try OpenAI first, falling back to contextual personas on any error
+    params = flask_app.persona_completion_params(product_description, target_market)
+    started = time.perf_counter()
+    try:
+        response = await flask_app.upstream.acall(lambda: flask_app.llm.acreate(**params))
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"OpenAI error: {e}")
+        reason = flask_app.upstream_failure_reason(e)
+        flask_app.record_openai_call(started, reason)
+        return await asyncio.to_thread(flask_app.settle_persona_set, key, cache_mode, cache_status, None,
+                                       product_description, reason)
+    first_seconds = flask_app.record_openai_call(started, "ok", response)
+    personas, clean = flask_app.read_persona_completion(response)
+
+    topup_seconds = None
+    if flask_app.needs_topup(personas):
+        personas, topup_seconds = await atopup_personas(product_description, target_market, personas)
+    flask_app.record_salvage(personas, clean, first_seconds, topup_seconds)
+    return await asyncio.to_thread(flask_app.settle_persona_set, key, cache_mode, cache_status, personas,
+                                   product_description)
+
+
+async def agenerate_persona_set(product_description, target_market, cache_mode='use'):
+    """Async counterpart of app.generate_persona_set"""
+    key = cache_key(product_description, target_market, flask_app.PERSONA_MODEL, flask_app.PERSONA_TEMPERATURE)
+    cache_status, cached = await asyncio.to_thread(flask_app.check_persona_cache, key, cache_mode)
+    if cached is not None:
+        return cached, "cache", cache_status
+
+    async with flask_app.persona_flights.aacquire(key) as flight:
+        if flight.shared:
+            personas, source = flight.result
+            return personas, source, cache_status
+        personas, source, cache_status = await arequest_persona_set(
+            key, cache_mode, cache_status, product_description, target_market
+        )
+        flight.publish([personas, source])
+    return personas, source, cache_status
+
+
+async def acomplete_text(messages, max_tokens, deadline, call="simulation"):
+    """Async counterpart of app.complete_text"""
+    budget = deadline - time.monotonic()
+    if budget <= 0:
+        return None
+    started = time.perf_counter()
+    try:
+        response = await flask_app.upstream.acall(lambda: flask_app.llm.acreate(
+            model=flask_app.PERSONA_MODEL, messages=messages, temperature=flask_app.SIMULATION_TEMPERATURE,
+            max_tokens=max_tokens, request_timeout=budget,
+        ), budget=budget)
+    except Exception as e:
+        print(f"OpenAI simulation error: {e}")
+        flask_app.record_openai_call(started, flask_app.upstream_failure_reason(e), call=call)
+        return None
+    flask_app.record_openai_call(started, "ok", response, call=call)
+    return flask_app.completion_text(response.choices[0].message).strip() or None
+
+
+async def asimulate_with_model(product_description, personas_data, timings):
+    """Async counterpart of app.simulate_with_model; persona calls still queued at the deadline are cancelled"""
+    result = flask_app.simulate_focus_group(product_description, personas_data)
+    responses = result['responses']
+    if flask_app.llm is None:
+        flask_app.apply_model_responses(responses, [None] * len(responses))
+        return result
+
+    description = flask_app.prompt_description(product_description)
+    started = time.monotonic()
+    deadline = started + flask_app.SIMULATION_PERSONA_BUDGET
+    tasks = [
+        asyncio.ensure_future(acomplete_text(
+            flask_app.response_messages(description, p, response['role']),
+            flask_app.RESPONSE_MAX_TOKENS, deadline))
+        for p, response in zip(personas_data, responses)
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=flask_app.SIMULATION_PERSONA_BUDGET)
+    for task in pending:
+        task.cancel()
+    texts = [task.result() if task.done() and not task.cancelled() and task.exception() is None else None
+             for task in tasks]
+    flask_app.apply_model_responses(responses, texts)
+    insight_started = time.monotonic()
+    timings['persona_ms'] = round((insight_started - started) * 1000, 3)
+
+    if any(texts):
+        insight = await acomplete_text(flask_app.insight_messages(description, responses),
+                                       flask_app.INSIGHT_MAX_TOKENS,
+                                       insight_started + flask_app.SIMULATION_INSIGHT_BUDGET, call="insight")
+        if insight:
+            result['insight'] = insight
+        timings['insight_ms'] = round((time.monotonic() - insight_started) * 1000, 3)
+    return result
+
+
+async def asimulate_and_store(product_description, personas, mode):
+    """Async counterpart of app.simulate_and_store"""
+    started = time.perf_counter()
+    timings = {}
+    if mode == "model":
+        result = await asimulate_with_model(product_description, personas, timings)
+    else:
+        result = flask_app.simulate_focus_group(product_description, personas)
+    return await asyncio.to_thread(flask_app.store_simulation, product_description, personas, result, timings,
+                                   started)
+
+
+async def arun_job(job):
+    """Async counterpart of app.run_job"""
+    params = job['request']
+    mode = params['mode']
+    JOB_WAIT.observe(job['started_at'] - job['created_at'], mode=mode)
+    result = await asimulate_and_store(params['product_description'], params['personas'], mode)
+    JOB_LATENCY.observe(time.time() - job['created_at'], mode=mode)
+    return result
+
+
+def start_job_workers():
+    """Start this process's job threads, handing each job to the event loop to run.
+
+    The threads only claim jobs and wait; the simulation itself runs on the
+    loop like a request, so upstream admission uses the gate's async side
+    alone instead of threads and the loop sharing it through two locks.
+    """
+    jobs = flask_app.simulation_jobs
+    if jobs is not None:
+        loop = asyncio.get_running_loop()
+        jobs.ensure_workers(lambda job: asyncio.run_coroutine_threadsafe(arun_job(job), loop).result())
+
+
+def json_body(data):
+    """Encode like Flask's jsonify: sorted keys, compact, trailing newline"""
+    return (json.dumps(data, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def too_many_requests(message, retry_after):
+    """Same 429 response as app.too_many_requests"""
+    return 429, json_body({"error": message, "retry_after": retry_after}), "application/json", \
+        [("retry-after", str(retry_after))]
+
+
+def cache_mode_from(data, headers):
+    """Same rules as app.get_cache_mode, reading the raw Cache-Control header"""
+    mode = data.get('cache', True)
+    if mode is False or mode == 'bypass':
+        return 'bypass'
+    if mode == 'refresh':
+        return 'refresh'
+    cache_control = headers.get('cache-control', '').lower()
+    if 'no-store' in cache_control:
+        return 'bypass'
+    if 'no-cache' in cache_control:
+        return 'refresh'
+    return 'use'
+
+
+def json_payload(headers, body):
+    """Like Flask's get_json(silent=True): the decoded object, or None if the body is not JSON"""
+    mimetype = headers.get('content-type', '').split(';')[0].strip().lower()
+    if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def respond(send, status, body, content_type, headers=(), head=False):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            *[(name.encode(), value.encode()) for name, value in headers],
+        ],
+    })
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+
+def conditional(status, body, content_type, headers, etag, request_headers):
+    """Turn a response into a 304 when the client already has this ETag"""
+    if etag in [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]:
+        return 304, b"", content_type, headers
+    return status, body, content_type, headers
+
+
+async def home(headers, body):
+    encoding = negotiate(headers.get("accept-encoding"), flask_app.HOME_VARIANTS)
+    etag = f'"{flask_app.HOME_ETAG}"' if encoding == "identity" else f'"{flask_app.HOME_ETAG}-{encoding}"'
+    response_headers = [("etag", etag), ("cache-control", "no-cache"), ("vary", "Accept-Encoding")]
+    if encoding != "identity":
+        response_headers.append(("content-encoding", encoding))
+    return conditional(200, flask_app.HOME_VARIANTS[encoding], "text/html; charset=utf-8",
+                       response_headers, etag, headers)
+
+
+async def asset(path, headers):
+    found = flask_app.assets.lookup(path[len(flask_app.assets.url_prefix):], headers.get("accept-encoding"))
+    if found is None:
+        return 404, json_body({"error": "Not found"}), "application/json", []
+    item, encoding, body = found
+    etag = f'"{item.etag}"' if encoding == "identity" else f'"{item.etag}-{encoding}"'
+    response_headers = [("etag", etag), ("cache-control", ASSET_CACHE_CONTROL), ("vary", "Accept-Encoding")]
+    if encoding != "identity":
+        response_headers.append(("content-encoding", encoding))
+    return conditional(200, body, item.content_type, response_headers, etag, headers)
+
+
+def fallback_personas(product_description, cache_status, headers):
+    """Same pre-encoded response as app.fallback_personas_response"""
+    variants = flask_app.catalog.lookup(flask_app.classify_product(product_description)).variants
+    encoding = negotiate(headers.get("accept-encoding"), variants)
+    response_headers = [("vary", "Accept-Encoding"), ("x-cache", cache_status)]
+    if encoding != "identity":
+        response_headers.append(("content-encoding", encoding))
+    return 200, variants[encoding], "application/json", response_headers
+
+
+async def generate_personas(headers, body):
+    try:
+        mimetype = headers.get('content-type', '').split(';')[0].strip().lower()
+        if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+            raise ValueError("Request body is not JSON")
+        data = json.loads(body)
+        product_description = data.get('product_description', '')
+        target_market = data.get('target_market', '')
+
+        if not product_description:
+            return 400, json_body({"error": "No product description provided"}), "application/json", []
+
+        personas, source, cache_status = await agenerate_persona_set(
+            product_description, target_market, cache_mode_from(data, headers)
+        )
+        if source == "fallback":
+            return fallback_personas(product_description, cache_status, headers)
+        return 200, json_body({"personas": personas}), "application/json", [("x-cache", cache_status)]
+
+    except Overloaded as e:
+        return too_many_requests(str(e), e.retry_after)
+    except Exception as e:
+        print(f"Error in generate_personas: {e}")
+        return 500, json_body({"error": "Failed to generate personas"}), "application/json", []
+
+
+def form_fields(body):
+    """A urlencoded form body as a dict of first values, like Flask's request.form"""
+    return {name: values[0] for name, values in parse_qs(body.decode("utf-8"), keep_blank_values=True).items()}
+
+
+async def run_simulation(headers, body):
+    form = form_fields(body)
+    try:
+        product_description = form.get('product_description', 'New product')
+        personas_data = []
+        for i in range(1, 4):
+            personas_data.append({
+                'name': form.get(f'name{i}', f'Person {i}'),
+                'age': int(form.get(f'age{i}', 30)),
+                'occupation': form.get(f'job{i}', 'Professional'),
+                'traits': form.get(f'traits{i}', 'Average user')
+            })
+        result = await asimulate_and_store(product_description, personas_data, flask_app.simulation_mode(form))
+        page = flask_app.render_page(result)
+
+    except Exception as e:
+        print(f"Error in run_simulation: {e}")
+        page = flask_app.render_page({
+            'product': "Error running simulation",
+            'responses': [
+                {'name': 'System', 'role': 'Error', 'text': f'An error occurred: {str(e)}. Please try again.'}
+            ],
+            'insight': 'Make sure all persona fields are filled out correctly.'
+        })
+    return 200, page.encode("utf-8"), "text/html; charset=utf-8", []
+
+
+async def api_simulate(headers, body):
+    try:
+        product_description, personas, mode = flask_app.simulation_request(json_payload(headers, body) or {})
+    except ValueError as e:
+        return 400, json_body({"error": str(e)}), "application/json", []
+
+    result = await asimulate_and_store(product_description, personas, mode)
+    return 200, json_body(result), "application/json", []
+
+
+async def api_submit_job(headers, body):
+    jobs = flask_app.simulation_jobs
+    if jobs is None:
+        return 404, json_body({"error": "Simulation jobs are disabled"}), "application/json", []
+    try:
+        product_description, personas, mode = flask_app.simulation_request(json_payload(headers, body) or {})
+    except ValueError as e:
+        return 400, json_body({"error": str(e)}), "application/json", []
+    if await asyncio.to_thread(jobs.full):
+        return too_many_requests("Job queue is full", flask_app.upstream.retry_after())
+
+    start_job_workers()
+    job_id = await asyncio.to_thread(
+        jobs.submit, {"product_description": product_description, "personas": personas, "mode": mode}
+    )
+    status = flask_app.job_status(await asyncio.to_thread(jobs.get, job_id))
+    return 202, json_body(status), "application/json", [("location", status['status_url'])]
+
+
+async def api_job(headers, body, job_id):
+    jobs = flask_app.simulation_jobs
+    job = await asyncio.to_thread(jobs.get, job_id) if jobs is not None else None
+    if job is None:
+        return 404, json_body({"error": "Not found"}), "application/json", []
+    return 200, json_body(flask_app.job_status(job)), "application/json", [("cache-control", "no-store")]
+
+
+def job_events_id(path):
+    """The job id in an /api/jobs/<job_id>/events path, or None"""
+    prefix, suffix = "/api/jobs/", "/events"
+    job_id = path[len(prefix):-len(suffix)] if path.startswith(prefix) and path.endswith(suffix) else ""
+    return job_id if job_id and "/" not in job_id else None
+
+
+async def job_events(scope, receive, send, job_id):
+    """Async counterpart of app.job_events, returning the status sent.
+
+    The stream waits on the loop between checks, so an open stream holds no thread.
+    """
+    jobs = flask_app.simulation_jobs
+    if jobs is None:
+        await respond(send, 404, json_body({"error": "Simulation jobs are disabled"}), "application/json")
+        return 404
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        await respond(send, 404, json_body({"error": "Not found"}), "application/json")
+        return 404
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no")],
+    })
+    try:
+        last = None
+        deadline = time.monotonic() + JOB_STREAM_TIMEOUT
+        while job is not None:
+            status = flask_app.job_status(job)
+            if status['status'] in ("done", "failed"):
+                event = flask_app.sse_event(status['status'], status)
+                await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+                break
+            # Only changes are sent: queued with a new position, or running
+            state = (status['status'], status.get('position'))
+            if state != last:
+                event = flask_app.sse_event("status", status)
+                await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+                last = state
+            if time.monotonic() > deadline:
+                break
+            await asyncio.wait([watcher], timeout=JOB_STREAM_INTERVAL)
+            if watcher.done():
+                return 200
+            job = await asyncio.to_thread(jobs.get, job_id)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        watcher.cancel()
+    return 200
+
+
+async def result_page(headers, body, simulation_id):
+    result = await asyncio.to_thread(flask_app.stored_result, simulation_id)
+    if result is None:
+        return 404, b"Not Found", "text/plain", []
+    body, encoding = compress_dynamic(flask_app.render_page(result).encode("utf-8"), headers.get("accept-encoding"))
+    etag = f'"{simulation_id}-{encoding}"' if encoding else f'"{simulation_id}"'
+    response_headers = [("etag", etag), ("vary", "Accept-Encoding")]
+    if encoding:
+        response_headers.append(("content-encoding", encoding))
+    return conditional(200, body, "text/html; charset=utf-8", response_headers, etag, headers)
+
+
+async def api_result(headers, body, simulation_id):
+    result = await asyncio.to_thread(flask_app.stored_result, simulation_id)
+    if result is None:
+        return 404, json_body({"error": "Not found"}), "application/json", []
+    return 200, json_body(result), "application/json", []
+
+
+async def api_history(headers, body, query):
+    denied = flask_app.history_denied(headers.get("x-api-key"))
+    if denied:
+        error, status = denied
+        return status, json_body({"error": error}), "application/json", []
+    try:
+        limit, cursor, product = flask_app.history_request(query)
+        page = await asyncio.to_thread(flask_app.history_page, limit, cursor, product)
+        return 200, json_body(page), "application/json", []
+    except ValueError as e:
+        return 400, json_body({"error": str(e)}), "application/json", []
+
+
+async def api_panel(headers, body):
+    try:
+        archetypes, size, seed = flask_app.panel_request(json_payload(headers, body) or {})
+    except ValueError as e:
+        return 400, json_body({"error": str(e)}), "application/json", []
+
+    panel = await asyncio.to_thread(flask_app.simulate_panel, archetypes, size, seed)
+    return 200, json_body(panel), "application/json", []
+
+
+async def health(headers, body):
+    return 200, json_body({
+        "status": "healthy",
+        "api_key_configured": bool(flask_app.api_key),
+        "llm": flask_app.llm.stats() if flask_app.llm is not None else None,
+        "persona_cache": flask_app.persona_cache.stats(),
+        "persona_singleflight": flask_app.persona_flights.stats(),
+        "rate_limit": flask_app.rate_limiter.stats(),
+        "semantic_match": flask_app.semantic_matcher.stats() if flask_app.semantic_matcher is not None else None,
+        "simulation_store": flask_app.simulation_store.stats() if flask_app.simulation_store is not None else None,
+        "simulation_jobs": flask_app.simulation_jobs.stats() if flask_app.simulation_jobs is not None else None,
+        "upstream": flask_app.upstream.stats()
+    }), "application/json", []
+
+
+async def metrics(headers, body):
+    return 200, registry.exposition().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8", []
+
+
+ROUTES = {
+    ("GET", "/"): home,
+    ("POST", "/generate-personas"): generate_personas,
+    ("POST", "/run-simulation"): run_simulation,
+    ("POST", "/api/simulate"): api_simulate,
+    ("POST", "/api/panel"): api_panel,
+    ("POST", "/api/jobs"): api_submit_job,
+    ("GET", "/api/history"): api_history,
+    ("GET", "/health"): health,
+    ("GET", "/metrics"): metrics,
+}
+
+
+# GET routes with an id in the path: prefix -> (handler, route label as in the Flask url rule)
+ID_ROUTES = {
+    "/results/": (result_page, "/results/<simulation_id>"),
+    "/api/results/": (api_result, "/api/results/<simulation_id>"),
+    "/api/jobs/": (api_job, "/api/jobs/<job_id>"),
+}
+
+
+def resolve(method, path, query_string):
+    """(handler, route label, extra handler args) for a request, or (None, None, ()) if nothing matches"""
+    handler = ROUTES.get((method, path))
+    if handler is api_history:
+        query = {name: values[0] for name, values in parse_qs(query_string.decode("latin-1")).items()}
+        return handler, path, (query,)
+    if handler is not None:
+        return handler, path, ()
+    if method == "GET":
+        for prefix, (handler, route) in ID_ROUTES.items():
+            simulation_id = path[len(prefix):]
+            if path.startswith(prefix) and simulation_id and "/" not in simulation_id:
+                return handler, route, (simulation_id,)
+    return None, None, ()
+
+
+# Served by the Flask app on a thread, which also applies its rate limit and records its metrics
+WSGI_ROUTES = {
+    ("POST", "/generate-personas/stream"),
+    ("POST", "/api/discussion/stream"),
+    ("POST", "/batch"),
+    ("GET", "/api/export"),
+}
+
+_wsgi_pool = ThreadPoolExecutor(ASGI_WSGI_THREADS, thread_name_prefix="asgi-wsgi")
+
+
+def wsgi_environ(scope, body):
+    """A WSGI environ for an ASGI http scope and its body"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ[name] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def serve_wsgi(scope, receive, send, body):
+    """Serve the request with the Flask app on a pool thread, sending each body chunk as it is produced.
+
+    One thread runs the whole response, so Flask's request context stays on
+    it; a client that disconnects stops the iteration after the current chunk.
+    """
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+    disconnected = threading.Event()
+
+    def put(message):
+        loop.call_soon_threadsafe(messages.put_nowait, message)
+
+    def run():
+        def start_response(status, headers, exc_info=None):
+            put({"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                 "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]})
+
+        try:
+            chunks = flask_app.app(wsgi_environ(scope, body), start_response)
+            try:
+                for chunk in chunks:
+                    if disconnected.is_set():
+                        break
+                    if chunk:
+                        put({"type": "http.response.body", "body": chunk, "more_body": True})
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+        except Exception as e:
+            print(f"Error serving {scope['path']}: {e}")
+        finally:
+            put(None)
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    done = loop.run_in_executor(_wsgi_pool, run)
+    started = False
+    try:
+        while True:
+            message = await messages.get()
+            if message is None:
+                break
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+        if not started:
+            await respond(send, 500, b"Internal Server Error", "text/plain")
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        watcher.cancel()
+        disconnected.set()
+        await asyncio.shield(done)
+
+
+# Upstream-bound handlers, limited per client as in app.enforce_rate_limit
+def rate_limit_cost(handler, headers, body):
+    """Same costs as app.rate_limit_cost: tokens the request costs, or None if it is not limited"""
+    if handler is generate_personas:
+        return 1
+    if handler in (api_simulate, api_submit_job):
+        return flask_app.simulation_cost(json_payload(headers, body))
+    if handler is run_simulation:
+        return flask_app.simulation_cost(form_fields(body))
+    return None
+
+
+def rate_limited(scope, headers, cost):
+    """A 429 response if the client is over its rate limit, else None"""
+    remote_addr = scope["client"][0] if scope.get("client") else None
+    client = client_key(headers.get("x-api-key"), headers.get("x-forwarded-for"), remote_addr,
+                        flask_app.RATE_LIMIT_TRUST_PROXY, flask_app.RATE_LIMIT_API_KEYS)
+    allowed, retry_after = flask_app.rate_limiter.acquire(client, cost)
+    return None if allowed else too_many_requests("Rate limit exceeded", retry_after)
+
+
+async def lifespan(receive, send):
+    global _session
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start_job_workers()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _session is not None:
+                await _session.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    method = "GET" if scope["method"] == "HEAD" else scope["method"]
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+    if method == "GET" and scope["path"].startswith(flask_app.assets.url_prefix):
+        status, body, content_type, extra_headers = await asset(scope["path"], headers)
+        return await respond(send, status, body, content_type, extra_headers, head=scope["method"] == "HEAD")
+
+    if (method, scope["path"]) in WSGI_ROUTES:
+        registry.ensure_flusher()
+        start_job_workers()
+        return await serve_wsgi(scope, receive, send, await read_body(receive))
+
+    job_id = job_events_id(scope["path"]) if scope["method"] == "GET" else None
+    if job_id is not None:
+        started = time.perf_counter()
+        registry.ensure_flusher()
+        start_job_workers()
+        route = "/api/jobs/<job_id>/events"
+        HTTP_IN_FLIGHT.inc(route=route)
+        try:
+            status = await job_events(scope, receive, send, job_id)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+        HTTP_REQUESTS.inc(route=route, method="GET", status=status)
+        HTTP_LATENCY.observe(time.perf_counter() - started, route=route)
+        return
+
+    handler, route, args = resolve(method, scope["path"], scope.get("query_string", b""))
+    if handler is None:
+        allowed = any(path == scope["path"] for _, path in ROUTES) or \
+            (method != "GET" and any(scope["path"].startswith(prefix) for prefix in ID_ROUTES))
+        status = 405 if allowed else 404
+        return await respond(send, status, b"Method Not Allowed" if allowed else b"Not Found", "text/plain")
+
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(route=route)
+    try:
+        body = await read_body(receive)
+        cost = rate_limit_cost(handler, headers, body)
+        rejection = rate_limited(scope, headers, cost) if cost is not None else None
+        if rejection is not None:
+            status, body, content_type, extra_headers = rejection
+        else:
+            status, body, content_type, extra_headers = await handler(headers, body, *args)
+    finally:
+        HTTP_IN_FLIGHT.dec(route=route)
+
+    # Gzip dynamic HTML and JSON, as the Flask app does after each request
+    if status == 200 and not any(name in ("content-encoding", "vary") for name, _ in extra_headers) \
+            and content_type.split(";")[0] in ("text/html", "application/json"):
+        body, encoding = compress_dynamic(body, headers.get("accept-encoding"))
+        extra_headers = [*extra_headers, ("vary", "Accept-Encoding")]
+        if encoding:
+            extra_headers.append(("content-encoding", encoding))
+    HTTP_REQUESTS.inc(route=route, method=scope["method"], status=status)
+    HTTP_LATENCY.observe(time.perf_counter() - started, route=route)
+    registry.ensure_flusher()
+    start_job_workers()
+    await respond(send, status, body, content_type, extra_headers, head=scope["method"] == "HEAD")
@@ -0,0 +1,102 @@
+"""Fingerprinted, precompressed static assets and Accept-Encoding negotiation"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+Asset = namedtuple("Asset", ["name", "url", "content_type", "etag", "variants"])
+
+# Immutable because every content change produces a new URL
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def compress_variants(body, gzip_level=9, brotli_quality=11):
+    """Encoding -> bytes for every encoding we can produce, always including identity"""
+    variants = {"identity": body, "gzip": gzip.compress(body, gzip_level, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=brotli_quality)
+    # Drop encodings that do not actually save bytes
+    return {encoding: data for encoding, data in variants.items()
+            if encoding == "identity" or len(data) < len(body)}
+
+
+def negotiate(accept_encoding, available):
+    """Pick the smallest acceptable encoding out of `available` (encoding -> bytes)"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+
+    def acceptable(encoding):
+        if encoding in accepted:
+            return accepted[encoding] > 0
+        if encoding == "identity":
+            return accepted.get("*", 1.0) > 0
+        return accepted.get("*", 0.0) > 0
+
+    candidates = [encoding for encoding in available if acceptable(encoding)]
+    if not candidates:
+        return "identity"
+    return min(candidates, key=lambda encoding: len(available[encoding]))
+
+
+def compress_dynamic(body, accept_encoding):
+    """Gzip a dynamic response if the client accepts it; returns (body, encoding or None)"""
+    if len(body) < MIN_COMPRESS_SIZE or negotiate(accept_encoding, {"identity": body, "gzip": b""}) != "gzip":
+        return body, None
+    return gzip.compress(body, 6), "gzip"
+
+
+class AssetRegistry:
+    """Load every file in a directory once, fingerprint it and precompress it"""
+
+    def __init__(self, directory, url_prefix="/assets/"):
+        self.url_prefix = url_prefix
+        self.by_name = {}
+        self.by_fingerprint = {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            stem, ext = os.path.splitext(name)
+            fingerprinted = f"{stem}.{digest}{ext}"
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type == "application/javascript":
+                content_type += "; charset=utf-8"
+            asset = Asset(name, url_prefix + fingerprinted, content_type, digest, compress_variants(body))
+            self.by_name[name] = asset
+            self.by_fingerprint[fingerprinted] = asset
+
+    def url(self, name):
+        """Content-hashed URL of an asset, for use in templates"""
+        return self.by_name[name].url
+
+    def lookup(self, fingerprinted_name, accept_encoding):
+        """Return (asset, encoding, body) for a request, or None if unknown"""
+        asset = self.by_fingerprint.get(fingerprinted_name)
+        if asset is None:
+            return None
+        encoding = negotiate(accept_encoding, asset.variants)
+        return asset, encoding, asset.variants[encoding]
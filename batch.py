@@ -0,0 +1,87 @@
+"""Bounded parallel fan-out of batch items with per-item timeouts and an overall deadline"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Server-side ceilings; a batch request may ask for less but never more
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 100))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 4))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("BATCH_ITEM_TIMEOUT", 30))
+BATCH_DEADLINE = float(os.environ.get("BATCH_DEADLINE", 120))
+
+# One pool per process shared by every batch, so concurrent batches together
+# can never hold more than BATCH_WORKERS threads and upstream calls.
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", BATCH_MAX_CONCURRENCY))
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+    return _executor
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _timed_call(handler, item, submitted_at):
+    started = time.monotonic()
+    value = handler(item)
+    return value, started - submitted_at, time.monotonic() - started
+
+
+def run_batch(items, handler, concurrency, item_timeout, deadline):
+    """Run handler over items, at most `concurrency` at a time.
+
+    Returns one dict per item, in input order, with either "result" or
+    "error" plus timings. An item that exceeds `item_timeout` (measured from
+    submission) or is still running at the overall `deadline` is reported as
+    an error; items not started by the deadline are never submitted. Python
+    threads cannot be interrupted, so abandoned items finish in the shared
+    pool and still count against BATCH_WORKERS.
+    """
+    executor = get_executor()
+    started = time.monotonic()
+    deadline_at = started + deadline
+    results = [None] * len(items)
+    pending = {}
+    next_index = 0
+
+    while next_index < len(items) or pending:
+        while next_index < len(items) and len(pending) < concurrency and time.monotonic() < deadline_at:
+            submitted_at = time.monotonic()
+            future = executor.submit(_timed_call, handler, items[next_index], submitted_at)
+            pending[future] = (next_index, submitted_at)
+            next_index += 1
+        if not pending:
+            break
+
+        expires_at = min(min(submitted_at + item_timeout for _, submitted_at in pending.values()), deadline_at)
+        done, _ = wait(pending, timeout=max(0, expires_at - time.monotonic()), return_when=FIRST_COMPLETED)
+
+        now = time.monotonic()
+        for future, (index, submitted_at) in list(pending.items()):
+            if future in done:
+                try:
+                    value, queued, ran = future.result()
+                    results[index] = {"index": index, "ok": True, "result": value,
+                                      "timing_ms": {"queued": _ms(queued), "run": _ms(ran)}}
+                except Exception as e:
+                    results[index] = {"index": index, "ok": False, "error": str(e) or type(e).__name__,
+                                      "timing_ms": {"total": _ms(now - submitted_at)}}
+            elif now >= submitted_at + item_timeout or now >= deadline_at:
+                future.cancel()
+                reason = "Item timed out" if now >= submitted_at + item_timeout else "Batch deadline exceeded"
+                results[index] = {"index": index, "ok": False, "error": reason,
+                                  "timing_ms": {"total": _ms(now - submitted_at)}}
+            else:
+                continue
+            del pending[future]
+
+    for index in range(next_index, len(items)):
+        results[index] = {"index": index, "ok": False, "error": "Batch deadline exceeded before item started",
+                          "timing_ms": {"total": 0.0}}
+
+    return results, _ms(time.monotonic() - started)
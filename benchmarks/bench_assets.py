@@ -0,0 +1,82 @@
+"""Bytes on the wire and server time: inline CSS/JS vs fingerprinted, compressed assets.
+
+"Before" is the page with the stylesheet and script inlined and sent
+uncompressed, as it was served before assets were extracted. "After" is
+what the app serves now to a browser sending Accept-Encoding: gzip, br.
+
+Usage:
+    python benchmarks/bench_assets.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import app as focusgroup  # noqa: E402
+
+BROWSER = {"Accept-Encoding": "gzip, deflate, br"}
+
+SIMULATION_FORM = {
+    "product_description": "An AI recipe app that suggests meals based on ingredients you already have.",
+    "name1": "Marco Rossi", "age1": "38", "job1": "Professional Chef", "traits1": "Perfectionist, skeptical",
+    "name2": "Jennifer Walsh", "age2": "34", "job2": "Working Mother", "traits2": "Time-starved, practical",
+    "name3": "David Chen", "age3": "28", "job3": "Food Blogger", "traits3": "Trend-focused, experimental",
+}
+
+
+def inline_assets(page):
+    """Rebuild the old page with the stylesheet and script embedded"""
+    for name, tag, wrap in (("app.css", '<link rel="stylesheet" href="{}">', "<style>\n{}</style>"),
+                            ("app.js", '<script src="{}"></script>', "<script>\n{}</script>")):
+        asset = focusgroup.assets.by_name[name]
+        page = page.replace(tag.format(asset.url), wrap.format(asset.variants["identity"].decode("utf-8")))
+    return page
+
+
+def timed(fn, runs=200):
+    """Best-of-runs seconds for one call and the value it returned"""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return value, best
+
+
+def main():
+    client = focusgroup.app.test_client()
+    asset_urls = [focusgroup.assets.url("app.css"), focusgroup.assets.url("app.js")]
+
+    home_before = inline_assets(focusgroup.HOME_PAGE.decode("utf-8")).encode("utf-8")
+    home_after, home_time = timed(lambda: client.get("/", headers=BROWSER))
+    assets_after = [client.get(url, headers=BROWSER) for url in asset_urls]
+
+    def old_results():
+        return inline_assets(client.post("/run-simulation", data=SIMULATION_FORM).get_data(as_text=True))
+
+    results_before, results_before_time = timed(old_results, runs=50)
+    results_after, results_after_time = timed(
+        lambda: client.post("/run-simulation", data=SIMULATION_FORM, headers=BROWSER), runs=50)
+
+    first_visit_after = len(home_after.data) + sum(len(r.data) for r in assets_after)
+    rows = [
+        ("first visit (HTML + CSS + JS)", len(home_before), first_visit_after),
+        ("repeat visit (assets cached)", len(home_before), len(home_after.data)),
+        ("simulation result page", len(results_before.encode("utf-8")), len(results_after.data)),
+    ]
+    print(f"{'bytes on the wire':<32}{'before':>10}{'after':>10}{'saved':>8}")
+    for name, before, after in rows:
+        print(f"{name:<32}{before:>10,}{after:>10,}{1 - after / before:>8.0%}")
+    print()
+    encodings = ", ".join(f"{url.rsplit('/', 1)[-1]}={r.headers.get('Content-Encoding', 'identity')}"
+                          for url, r in zip(asset_urls, assets_after))
+    print(f"home encoding: {home_after.headers.get('Content-Encoding', 'identity')}; assets: {encodings}")
+    print(f"server time, GET / (precompressed):          {home_time * 1e3:.3f} ms")
+    print(f"server time, result page before (inline):    {results_before_time * 1e3:.3f} ms")
+    print(f"server time, result page after (+gzip):      {results_after_time * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: repeated any(word in text) scans vs the keyword-counting classifier.
+
+Classifies a corpus of product descriptions (short briefs plus long pasted
+pitch documents) with both approaches, reports time per call (and, for
+reference, that of classify_product, which adds semantic matching for
+descriptions the keywords do not settle), checks that
+classification time grows linearly with description length, and counts how
+often the two disagree. They disagree by design: the classifier picks the
+category with the most keyword matches instead of the first one with any
+hit, and the descriptions in BEHAVIOR_CHANGES are checked to come out
+that way before anything is timed.
+
+Usage:
+    python benchmarks/bench_classifier.py [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from classifier import PRODUCT_CATEGORIES, classify_product, product_classifier  # noqa: E402
+
+SHORT_DESCRIPTIONS = [
+    "An AI recipe app that suggests meals based on ingredients you already have in your kitchen.",
+    "A fitness tracker that builds personalised workout plans and syncs with your gym schedule.",
+    "A robo-advisor that helps young professionals invest spare change and build a budget.",
+    "An online course platform where students learn to code with a personal AI tutor.",
+    "A travel planner that finds cheap flights and hotel deals for your next vacation.",
+    "A fashion ecommerce store that recommends clothes based on your style.",
+    "A project management tool for remote engineering teams.",
+    "A meditation and sleep app with guided breathing exercises.",
+    "A crypto trading bot with stop-loss automation.",
+    "A B2B invoicing platform for freelancers and agencies.",
+]
+
+# (description, first-match category, best-score category): a later category
+# with more hits now wins, while a tie still goes to the earlier category
+BEHAVIOR_CHANGES = [
+    ("A cooking course where students learn from chef tutors at culinary school", "food", "education"),
+    ("A healthy recipe app for fitness fans: workout plans, gym training and running logs", "food", "fitness"),
+    ("A budgeting app for travel: track trip, hotel and flight spending on vacation", "finance", "travel"),
+    ("A fashion store app that helps you save money on clothes and retail shopping", "finance", "shopping"),
+    ("A study app for students who love food", "food", "education"),
+    ("A meal planner that helps you budget", "food", "food"),
+]
+
+FILLER = (
+    "Our mission is to delight customers with a seamless experience across every device. "
+    "The team has decades of combined experience and a clear go-to-market plan. "
+    "We partner with leading providers and integrate with the tools people already use. "
+)
+
+
+def legacy_classify(text):
+    """The original first-match cascade of any(word in text) scans"""
+    lowered = text.lower()
+    for category, keywords in PRODUCT_CATEGORIES.items():
+        if any(word in lowered for word in keywords):
+            return category
+    return "general"
+
+
+def check_behavior_changes():
+    """Exit with the offending cases unless BEHAVIOR_CHANGES classify as listed"""
+    wrong = [(text, expected, product_classifier.classify(text).category)
+             for text, first_match, expected in BEHAVIOR_CHANGES
+             if legacy_classify(text) != first_match or product_classifier.classify(text).category != expected]
+    if wrong:
+        sys.exit("\n".join(f"expected {expected}, got {got}: {text}" for text, expected, got in wrong))
+    changed = sum(first_match != expected for _, first_match, expected in BEHAVIOR_CHANGES)
+    print(f"behavior changes: {changed} of {len(BEHAVIOR_CHANGES)} descriptions move to the category with more hits; "
+          f"ties keep the earlier category")
+
+
+def build_corpus(seed=7):
+    """Short briefs plus long descriptions of 10-80 KB"""
+    rng = random.Random(seed)
+    corpus = list(SHORT_DESCRIPTIONS)
+    for size_kb in (10, 20, 40, 80):
+        for brief in rng.sample(SHORT_DESCRIPTIONS, 3):
+            body = FILLER * (size_kb * 1024 // len(FILLER))
+            corpus.append(body + brief)
+    return corpus
+
+
+def time_per_call(fn, texts, repeat):
+    """Best-of-repeat average seconds per call over texts"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    check_behavior_changes()
+    corpus = build_corpus()
+    disagreements = sum(legacy_classify(t) != product_classifier.classify(t).category for t in corpus)
+    print(f"corpus: {len(corpus)} descriptions, {sum(map(len, corpus)) / 1024:,.0f} KB total, "
+          f"{disagreements} classification differences")
+    print()
+
+    print(f"{'description size':<18}{'legacy':>14}{'counting':>14}{'speedup':>10}{'classify_product':>19}")
+    for size_kb in (0, 10, 20, 40, 80):
+        if size_kb:
+            texts = [FILLER * (size_kb * 1024 // len(FILLER)) + " no matching keywords here"]
+        else:
+            texts = SHORT_DESCRIPTIONS
+        legacy = time_per_call(legacy_classify, texts, args.repeat)
+        counting = time_per_call(product_classifier.classify, texts, args.repeat)
+        full = time_per_call(classify_product, texts, args.repeat)
+        label = f"{size_kb} KB" if size_kb else "short briefs"
+        print(f"{label:<18}{legacy * 1e6:>11,.1f} us{counting * 1e6:>11,.1f} us{legacy / counting:>9.1f}x"
+              f"{full * 1e6:>16,.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: how long a simulation holds an HTTP worker, run inline vs submitted as a background job.
+
+Starts the stub OpenAI server and sends a burst of model-mode simulations
+through the Flask test client, first to /api/simulate (the request holds
+the worker until the simulation is done) and then to /api/jobs (the request
+returns a job id and the job threads run it). Reports, per path, the time
+each request held its worker and the time until the result was in hand;
+for jobs that includes queue wait, reported separately, and the result is
+collected by polling the status URL every --poll seconds.
+
+Usage:
+    python benchmarks/bench_jobs.py [--jobs 24] [--concurrency 8] [--latency 0.5] [--jitter 0.3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stub_openai import PERSONAS, add_stub_arguments, stub_from_args  # noqa: E402
+
+PRODUCT = "An AI fitness app that creates personalized 15-minute home workouts. $12.99/month with a 7-day free trial."
+BODY = {"product_description": PRODUCT, "personas": PERSONAS, "mode": "model"}
+
+
+def inline(client, poll):
+    """(seconds the worker was held, seconds until the result, queue wait) for /api/simulate"""
+    started = time.perf_counter()
+    response = client.post("/api/simulate", json=BODY)
+    assert response.status_code == 200
+    seconds = time.perf_counter() - started
+    return seconds, seconds, 0.0
+
+
+def queued(client, poll):
+    """The same for a job submitted to /api/jobs and polled until it is done"""
+    started = time.perf_counter()
+    response = client.post("/api/jobs", json=BODY)
+    assert response.status_code == 202
+    held = time.perf_counter() - started
+    job = response.get_json()
+    while job["status"] in ("queued", "running"):
+        time.sleep(poll)
+        job = client.get(job["status_url"]).get_json()
+    assert job["status"] == "done", job
+    return held, time.perf_counter() - started, job["started_at"] - job["created_at"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_stub_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=24, help="simulations per path")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients submitting at once")
+    parser.add_argument("--poll", type=float, default=0.25, help="seconds between status polls")
+    parser.set_defaults(latency=0.5, jitter=0.3)
+    args = parser.parse_args()
+
+    stub = stub_from_args(args)
+    directory = tempfile.mkdtemp(prefix="bench-jobs-")
+    os.environ.update(OPENAI_API_KEY="sk-benchmark", OPENAI_API_BASE=f"http://127.0.0.1:{stub.server_port}/v1",
+                      SIMULATION_DB="", SIMULATION_JOBS_DB=os.path.join(directory, "jobs.db"), RATE_LIMIT_RATE="0")
+    import app
+    client = app.app.test_client()
+
+    print(f"stub latency {args.latency}s +0..{args.jitter}s; {args.jobs} model-mode simulations, "
+          f"{args.concurrency} at a time; {app.simulation_jobs.workers} job threads")
+    print(f"{'path':<14} {'held p50':>9} {'held p99':>9} {'result p50':>11} {'result p99':>11} {'wait p50':>9}")
+    for name, run in (("/api/simulate", inline), ("/api/jobs", queued)):
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            rows = list(pool.map(lambda _: run(client, args.poll), range(args.jobs)))
+        held, result, wait = zip(*rows)
+        print(f"{name:<14} {statistics.median(held) * 1000:7.1f}ms {percentile(held, 0.99) * 1000:7.1f}ms "
+              f"{statistics.median(result):10.2f}s {percentile(result, 0.99):10.2f}s "
+              f"{statistics.median(wait) * 1000:7.1f}ms")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
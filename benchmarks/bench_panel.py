@@ -0,0 +1,61 @@
+"""Benchmark: synthetic panel simulation with NumPy vs per-persona classification.
+
+Times simulate_panel at several panel sizes and, for comparison, the naive
+approach of building every persona as a dict and running classify_role on
+its joined traits string one at a time.
+
+Usage:
+    python benchmarks/bench_panel.py [--sizes 1000,10000,100000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app import get_contextual_personas  # noqa: E402
+from classifier import classify_role  # noqa: E402
+from panel import simulate_panel  # noqa: E402
+
+
+def naive_panel(archetypes, size):
+    """One dict and one classify_role call per member"""
+    phrases = [[p.strip() for p in archetype["traits"].split(",")] for archetype in archetypes]
+    roles = {}
+    for _ in range(size):
+        index = random.randrange(len(archetypes))
+        traits = ", ".join(p for p in phrases[index] if random.random() < 0.75)
+        persona = {"age": archetypes[index]["age"] + random.gauss(0, 7), "traits": traits}
+        role = classify_role(persona["traits"])
+        roles[role] = roles.get(role, 0) + 1
+    return roles
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    archetypes = get_contextual_personas("An AI recipe app that suggests meals from your kitchen")
+    print(f"{'panel size':>12}{'numpy':>12}{'per-persona':>14}{'speedup':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectorized = best_of(args.repeat, lambda: simulate_panel(archetypes, size, seed=1))
+        naive = best_of(args.repeat, lambda: naive_panel(archetypes, size))
+        print(f"{size:>12}{vectorized * 1000:>10.1f}ms{naive * 1000:>12.1f}ms{naive / vectorized:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
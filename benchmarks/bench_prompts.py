@@ -0,0 +1,142 @@
+"""Benchmark: persona calls for long pasted descriptions, with and without prompt compaction.
+
+Builds a corpus of pitch-deck-length descriptions (2-32 KB) around the
+catalog's exemplar products: the pitch and its price first, then market
+sizing, team, roadmap, competition, testimonials and FAQ sections. Each is
+sent to /generate-personas against the stub upstream twice: as before
+(description whole, max_tokens 800) and with the prompt pipeline (description
+compacted to PROMPT_DESCRIPTION_TOKENS, max_tokens sized to three personas).
+The stub charges --prompt-latency seconds per 1K prompt tokens on top of its
+base latency, as a model's time to read the prompt.
+
+Reports, per description size: prompt tokens as billed by the stub, the
+max_tokens requested, latency, cost at the configured prices, compaction
+time and how often the price sentence survived compaction.
+
+Usage:
+    python benchmarks/bench_prompts.py [--per-size 10] [--latency 0.3] [--prompt-latency 0.05]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stub_openai import add_stub_arguments, stub_from_args  # noqa: E402
+
+SIZES = (2000, 8000, 32000)
+
+SECTIONS = [
+    "The total addressable market for {product} is estimated at {n} billion dollars and growing {p}% a year.",
+    "Our founding team previously built products used by {n} million people at companies across the industry.",
+    "In the next quarter we will ship integrations, a redesigned onboarding flow and a partner program.",
+    "Competitors focus on enterprise buyers, while we focus on individuals who want {product} without the complexity.",
+    "Beta users told us it saved them {n} hours a month, and {p}% said they would recommend it to a friend.",
+    "Frequently asked: can I cancel at any time? Yes, and your data can be exported in one click.",
+    "We acquire users through content, referrals and partnerships, with a blended acquisition cost of ${n}.",
+    "Security is built in: data is encrypted at rest and in transit, and we never sell personal information.",
+    "Our roadmap includes a mobile app, offline mode, team accounts and an API for power users.",
+    "Retention after ninety days is {p}%, well above the category average for consumer subscriptions.",
+]
+
+
+def long_description(product, size, rng):
+    """A pitch for `product` padded with deck sections to about `size` characters"""
+    price = f"{product.capitalize()} costs ${rng.choice([4.99, 9.99, 12.99, 19.99])}/month with a 7-day free trial."
+    parts = [f"Introducing our {product}.", price]
+    while sum(len(part) + 1 for part in parts) < size:
+        section = rng.choice(SECTIONS).format(product=product, n=rng.randint(2, 90), p=rng.randint(10, 95))
+        parts.append(("\n\n" if rng.random() < 0.2 else "") + section)
+    return " ".join(parts), price
+
+
+def corpus(per_size, seed=1):
+    rng = random.Random(seed)
+    with open(os.path.join(os.path.dirname(__file__), "..", "data", "personas.json"), encoding="utf-8") as f:
+        products = [text for entry in json.load(f)["categories"].values() for text in entry.get("exemplars", ())]
+    return {size: [long_description(rng.choice(products), size, rng) for _ in range(per_size)] for size in SIZES}
+
+
+def run(app, client, descriptions, stub):
+    """(prompt tokens, max_tokens, seconds, cost) per description, from the stub's billed usage"""
+    rows = []
+    for description, _ in descriptions:
+        params = app.persona_completion_params(description, "")
+        before = stub.config.requests
+        started = time.perf_counter()
+        response = client.post("/generate-personas", json={"product_description": description, "cache": "bypass"})
+        seconds = time.perf_counter() - started
+        assert response.status_code == 200 and stub.config.requests > before
+        usage = stub.last_usage
+        rows.append((usage["prompt_tokens"], params["max_tokens"], seconds,
+                     app.usage_cost(usage["prompt_tokens"], usage["completion_tokens"])))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_stub_arguments(parser)
+    parser.add_argument("--per-size", type=int, default=10, help="descriptions per size")
+    parser.set_defaults(latency=0.3, prompt_latency=0.05)
+    args = parser.parse_args()
+
+    stub = stub_from_args(args)
+    # Remember the usage the stub bills for each completion
+    handler = stub.RequestHandlerClass
+    send_json = handler.send_json
+
+    def send_json_recording_usage(self, status, payload):
+        if "usage" in payload:
+            stub.last_usage = payload["usage"]
+        send_json(self, status, payload)
+    handler.send_json = send_json_recording_usage
+
+    os.environ.update(OPENAI_API_KEY="sk-benchmark", OPENAI_API_BASE=f"http://127.0.0.1:{stub.server_port}/v1",
+                      SIMULATION_DB="", RATE_LIMIT_RATE="0")
+    import app
+    import prompts
+    client = app.app.test_client()
+    descriptions = corpus(args.per_size)
+
+    compacted = app.prompt_description
+    sized = app.persona_max_tokens
+    baseline = {
+        "prompt_description": lambda text, budget=None: text,
+        "persona_max_tokens": lambda count: 800 if count == 3 else 300 * count,
+    }
+
+    print(f"stub latency {args.latency}s + {args.prompt_latency}s per 1K prompt tokens; "
+          f"description budget {app.PROMPT_DESCRIPTION_TOKENS} tokens; prices ${prompts.OPENAI_PROMPT_PRICE}"
+          f"/${prompts.OPENAI_COMPLETION_PRICE} per 1K prompt/completion tokens")
+    print(f"{'size':>6} {'pipeline':<9} {'prompt tok':>10} {'max_tokens':>10} {'latency':>9} {'cost/1K req':>12}")
+    for size, items in descriptions.items():
+        for name, patch in (("before", baseline), ("after", {"prompt_description": compacted,
+                                                             "persona_max_tokens": sized})):
+            for attribute, value in patch.items():
+                setattr(app, attribute, value)
+            rows = run(app, client, items, stub)
+            print(f"{size:>6} {name:<9} {statistics.median(r[0] for r in rows):>10.0f} "
+                  f"{statistics.median(r[1] for r in rows):>10.0f} {statistics.median(r[2] for r in rows):>8.3f}s "
+                  f"${statistics.mean(r[3] for r in rows) * 1000:>10.3f}")
+
+    timings, kept = [], 0
+    for items in descriptions.values():
+        for description, price in items:
+            app.compact_description.cache_clear()
+            started = time.perf_counter()
+            text = app.compact_description(description)
+            timings.append(time.perf_counter() - started)
+            kept += price in text
+    total = sum(len(items) for items in descriptions.values())
+    print(f"compaction: median {statistics.median(timings) * 1000:.2f} ms, max {max(timings) * 1000:.2f} ms; "
+          f"price sentence kept in {kept}/{total}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: /generate-personas recorded against the stub upstream, then replayed and run locally offline.
+
+Records --requests persona calls (a few products, each asked several times,
+bypassing the persona cache) against the stub with latency jitter, errors
+and malformed completions, using LLM_BACKEND=record. The same requests are
+then replayed twice from the recording with LLM_BACKEND=replay, with the
+stub shut down, and once with LLM_BACKEND=local. Reports latency
+percentiles per run and how many responses matched the recorded run
+exactly; each run is a fresh process so it starts with the recording's
+state, not the last run's.
+
+Usage:
+    python benchmarks/bench_replay.py [--requests 60] [--latency 0.3] [--jitter 0.6] [--error-rate 0.05]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_openai import add_stub_arguments, stub_from_args  # noqa: E402
+
+PRODUCTS = (
+    "Meal planning app for busy families, $9.99/month",
+    "Noise-cancelling headphones for open-plan offices",
+    "Language learning app with AI conversation practice",
+    "Budgeting app that rounds up purchases into savings",
+)
+
+# Run in a child process so each backend starts from a fresh import
+CLIENT = """
+import json, os, statistics, sys, time
+sys.path.insert(0, {root!r})
+import app
+client = app.app.test_client()
+seconds, personas = [], []
+for i in range({requests}):
+    started = time.perf_counter()
+    response = client.post("/generate-personas", json={{"product_description": {products!r}[i % {count}],
+                                                        "cache": "bypass"}})
+    seconds.append(time.perf_counter() - started)
+    personas.append([p["name"] for p in response.get_json()["personas"]])
+print(json.dumps({{"seconds": seconds, "personas": personas}}))
+"""
+
+
+def run(backend, requests, recordings, environ):
+    env = dict(os.environ, **environ, LLM_BACKEND=backend, LLM_RECORDINGS=recordings, SIMULATION_DB="",
+               SIMULATION_JOBS_DB="", RATE_LIMIT_RATE="0")
+    code = CLIENT.format(root=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                         requests=requests, products=PRODUCTS, count=len(PRODUCTS))
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_stub_arguments(parser)
+    parser.add_argument("--requests", type=int, default=60, help="persona requests per run")
+    parser.set_defaults(latency=0.3, jitter=0.6, error_rate=0.05, malformed_rate=0.05, seed=1)
+    args = parser.parse_args()
+
+    recordings = os.path.join(tempfile.mkdtemp(prefix="bench-replay-"), "recordings.jsonl")
+    stub = stub_from_args(args)
+    live = {"OPENAI_API_KEY": "sk-benchmark", "OPENAI_API_BASE": f"http://127.0.0.1:{stub.server_port}/v1"}
+    runs = [("record", run("record", args.requests, recordings, live))]
+    stub.shutdown()
+    runs += [("replay", run("replay", args.requests, recordings, {})),
+             ("replay again", run("replay", args.requests, recordings, {})),
+             ("local", run("local", args.requests, recordings, {}))]
+
+    with open(recordings) as f:
+        calls = sum(1 for _ in f)
+    print(f"stub latency {args.latency}s +0..{args.jitter}s, {args.error_rate:.0%} errors, "
+          f"{args.malformed_rate:.0%} malformed; {args.requests} requests, {calls} upstream calls recorded")
+    print(f"{'run':<13} {'p50':>8} {'p95':>8} {'p99':>8} {'total':>8}  same personas as recorded")
+    recorded = runs[0][1]["personas"]
+    for name, result in runs:
+        seconds = result["seconds"]
+        same = sum(a == b for a, b in zip(result["personas"], recorded))
+        print(f"{name:<13} {percentile(seconds, 0.5):7.3f}s {percentile(seconds, 0.95):7.3f}s "
+              f"{percentile(seconds, 0.99):7.3f}s {sum(seconds):7.2f}s  {same}/{len(recorded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Benchmark: semantic category matching vs keywords alone on a labeled set.
+
+Classifies hand-labeled product descriptions (none of them catalog
+exemplars) with the keyword classifier alone and with the semantic matcher
+deciding what the keywords do not settle, as classify_product does, at
+several confidence thresholds, and reports accuracy, how often each fell
+through to the generic category, per-call latency and the time to build the
+exemplar matrix. The set mixes descriptions with no keyword hit and ones a
+keyword already gets right, which semantic matching must not overturn.
+
+Usage:
+    python benchmarks/bench_semantic.py [--repeat 200] [--thresholds 0.2,0.25,0.3,0.35,0.4] [--margin 0.2] [--errors]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalog import catalog  # noqa: E402
+from classifier import classify_product  # noqa: E402
+from semantic import SemanticMatcher  # noqa: E402
+
+LABELED = [
+    ("A meal kit subscription with chef-designed dinners", "food"),
+    ("Nutrition tracker that logs macros from photos of your plate", "food"),
+    ("Farm-to-table produce delivery for city apartments", "food"),
+    ("An app that turns your pantry staples into weeknight dinners", "food"),
+    ("Cocktail mixing guide with bartender techniques", "food"),
+    ("Bakery pre-order app for fresh bread and pastries", "food"),
+    ("Lunch ordering for office teams from nearby restaurants", "food"),
+    ("Sourdough starter kit with step by step guidance", "food"),
+    ("Personalized marathon plans that adapt to your pace", "fitness"),
+    ("Connected rowing machine with on-demand classes", "fitness"),
+    ("A posture coach wearable that buzzes when you slouch", "fitness"),
+    ("Boxing workouts streamed to your TV", "fitness"),
+    ("Swim stroke analysis for triathletes", "fitness"),
+    ("Sleep and recovery score for athletes", "fitness"),
+    ("Hiking challenges with friends and step goals", "fitness"),
+    ("Stretching routines for desk workers with back pain", "fitness"),
+    ("Commission-free brokerage for first-time investors", "finance"),
+    ("Round-up savings that invests your spare change", "finance"),
+    ("Credit card rewards optimizer", "finance"),
+    ("Invoice factoring for small business cash flow", "finance"),
+    ("Stock portfolio tracker with dividend forecasts", "finance"),
+    ("Debt payoff planner for student loans", "finance"),
+    ("Payroll and bookkeeping for freelancers", "finance"),
+    ("A bitcoin exchange with low fees", "finance"),
+    ("Adaptive math practice for middle schoolers", "education"),
+    ("Spanish conversation practice with native speakers", "education"),
+    ("SAT prep with personalized practice tests", "education"),
+    ("Coding lessons for kids using games", "education"),
+    ("Online degree programs from accredited universities", "education"),
+    ("Flashcard app with spaced repetition for medical students", "education"),
+    ("Tools for teachers to grade essays faster", "education"),
+    ("Upskilling platform for employees to earn certificates", "education"),
+    ("Last-minute hotel deals near you", "travel"),
+    ("Trip planning assistant that builds day-by-day itineraries", "travel"),
+    ("Cheap flight alerts for weekend getaways", "travel"),
+    ("Campervan rentals for national park road trips", "travel"),
+    ("Boutique hotel booking for honeymooners", "travel"),
+    ("Guided walking tours in European cities", "travel"),
+    ("Points and miles tracker for frequent flyers", "travel"),
+    ("Holiday home swap between families", "travel"),
+    ("Online boutique for vintage handbags", "shopping"),
+    ("A browser extension that finds coupon codes at checkout", "shopping"),
+    ("Monthly sock subscription with fun designs", "shopping"),
+    ("Marketplace for refurbished phones and laptops", "shopping"),
+    ("Personal shopper for plus-size clothing", "shopping"),
+    ("Resale app for kids' clothes and toys", "shopping"),
+    ("Same-day delivery from neighborhood shops", "shopping"),
+    ("Skincare brand selling direct to consumers", "shopping"),
+    ("Kanban boards for software teams", "general"),
+    ("CRM for real estate agents", "general"),
+    ("Meeting transcription and summaries", "general"),
+    ("Dog walking marketplace", "general"),
+    ("Error monitoring for web developers", "general"),
+    ("Shared family calendar and reminders", "general"),
+    ("Applicant tracking system for recruiters", "general"),
+    ("A smart doorbell with video", "general"),
+    # A keyword already gets these right
+    ("A platform for booking yoga classes at local studios", "fitness"),
+    ("Recipe box that teaches you to cook restaurant dishes at home", "food"),
+    ("Gym membership marketplace with day passes", "fitness"),
+    ("Budget planner for couples sharing money", "finance"),
+    ("Online course on photography for beginners", "education"),
+    ("Hotel and flight bundles for family vacations", "travel"),
+    ("Fashion rental store for special occasions", "shopping"),
+    ("Home workout videos for busy parents", "fitness"),
+    ("Tutor matching for high school students", "education"),
+    ("Meal prep containers with portion guides", "food"),
+]
+
+
+def accuracy(classify):
+    correct = sum(classify(text) == label for text, label in LABELED)
+    generic = sum(classify(text) == catalog.default for text, _ in LABELED)
+    return correct / len(LABELED), generic
+
+
+def keyword_only(text):
+    return classify_product(text, matcher=None)
+
+
+def with_matcher(matcher):
+    def classify(text):
+        return classify_product(text, matcher)
+    return classify
+
+
+def per_call_us(classify, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text, _ in LABELED:
+            classify(text)
+    return (time.perf_counter() - started) / (repeat * len(LABELED)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the labeled set for latency")
+    parser.add_argument("--thresholds", default="0.2,0.25,0.3,0.35,0.4")
+    parser.add_argument("--margin", type=float, default=0.2, help="similarity lead needed to overturn a keyword pick")
+    parser.add_argument("--errors", action="store_true", help="list misclassified descriptions")
+    args = parser.parse_args()
+
+    exemplars = catalog.exemplar_table()
+    builds = []
+    for _ in range(5):
+        started = time.perf_counter()
+        SemanticMatcher(exemplars, 0.0)
+        builds.append(time.perf_counter() - started)
+    print(f"{sum(len(texts) for texts in exemplars.values())} exemplars in {len(exemplars)} categories; "
+          f"matrix build {statistics.median(builds) * 1000:.1f} ms (median of 5)")
+    print(f"{len(LABELED)} labeled descriptions\n")
+
+    rows = [("keywords only", keyword_only)]
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        rows.append((f"keywords, then semantic >= {threshold:g}",
+                     with_matcher(SemanticMatcher(exemplars, threshold, args.margin))))
+
+    width = max(len(name) for name, _ in rows)
+    print(f"{'classifier':<{width}}  accuracy  generic  per call")
+    for name, classify in rows:
+        score, generic = accuracy(classify)
+        print(f"{name:<{width}}  {score:8.1%}  {generic:7d}  {per_call_us(classify, args.repeat):6.1f} us")
+
+    if args.errors:
+        classify = rows[-1][1]
+        print()
+        for text, label in LABELED:
+            predicted = classify(text)
+            if predicted != label:
+                print(f"{label:>9} -> {predicted:<9}  {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: model-written simulations with concurrent persona calls vs one call after another.
+
+Starts the stub OpenAI server and runs `simulate_with_model` in-process, then
+the same persona and insight calls issued sequentially, reporting wall time
+per simulation and how many responses came from the model. With
+--slow-rate, that fraction of calls takes --slow-latency seconds, to show a
+slow call falling back to canned text at the persona budget instead of
+holding up the page.
+
+Usage:
+    python benchmarks/bench_simulation.py [--latency 0.5] [--jitter 0.3] [--repeat 5]
+                                          [--slow-rate 0.2] [--slow-latency 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stub_openai import PERSONAS, add_stub_arguments, stub_from_args  # noqa: E402
+
+PRODUCT = "An AI fitness app that creates personalized 15-minute home workouts. $12.99/month with a 7-day free trial."
+
+
+def sequential(app, personas):
+    """The same calls as simulate_with_model, each waiting for the one before"""
+    result = app.simulate_focus_group(PRODUCT, personas)
+    texts = []
+    for p, response in zip(personas, result['responses']):
+        deadline = time.monotonic() + app.SIMULATION_PERSONA_BUDGET
+        texts.append(app.complete_text(app.response_messages(PRODUCT, p, response['role']),
+                                       app.RESPONSE_MAX_TOKENS, deadline))
+    app.apply_model_responses(result['responses'], texts)
+    app.complete_text(app.insight_messages(PRODUCT, result['responses']), app.INSIGHT_MAX_TOKENS,
+                      time.monotonic() + app.SIMULATION_INSIGHT_BUDGET)
+    return result
+
+
+def concurrent(app, personas):
+    return app.simulate_with_model(PRODUCT, personas, {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_stub_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="simulations per mode; the median is reported")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of calls that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="seconds a slow call takes")
+    args = parser.parse_args()
+
+    stub = stub_from_args(args)
+    if args.slow_rate:
+        draw = stub.config.draw
+
+        def draw_with_slow_calls():
+            delay, mode = draw()
+            return (args.slow_latency if stub.config.random.random() < args.slow_rate else delay), mode
+        stub.config.draw = draw_with_slow_calls
+
+    os.environ.update(OPENAI_API_KEY="sk-benchmark", OPENAI_API_BASE=f"http://127.0.0.1:{stub.server_port}/v1",
+                      SIMULATION_DB="")
+    import app
+
+    print(f"stub latency {args.latency}s +0..{args.jitter}s, {args.slow_rate:.0%} of calls {args.slow_latency}s; "
+          f"persona budget {app.SIMULATION_PERSONA_BUDGET}s, insight budget {app.SIMULATION_INSIGHT_BUDGET}s")
+    print(f"{'mode':<12} {'median':>8} {'max':>8}  model responses")
+    for name, run in (("sequential", sequential), ("concurrent", concurrent)):
+        seconds, model = [], 0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = run(app, PERSONAS)
+            seconds.append(time.perf_counter() - started)
+            model += sum(response['source'] == "model" for response in result['responses'])
+        total = args.repeat * len(PERSONAS)
+        print(f"{name:<12} {statistics.median(seconds):7.2f}s {max(seconds):7.2f}s  {model}/{total}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark: import time and boot time of the app.
+
+Runs each scenario in a fresh interpreter so nothing is cached in-process:
+
+- import only: `import app`, with and without OPENAI_API_KEY, reporting
+  whether openai was imported as a side effect
+- first request: import, then a test-client `/generate-personas` call
+  (fallback-only without a key, so no network is used)
+- openai import: the cost that is now deferred to the first upstream call
+- gunicorn boot: seconds until `/health` answers, with and without --preload
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--workers 2]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_ONLY = """
+import sys, time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started, "openai" in sys.modules)
+"""
+
+FIRST_REQUEST = """
+import sys, time
+started = time.perf_counter()
+import app
+client = app.app.test_client()
+client.post("/generate-personas", json={"product_description": "A meal planning app"})
+print(time.perf_counter() - started, "openai" in sys.modules)
+"""
+
+OPENAI_IMPORT = """
+import sys, time
+started = time.perf_counter()
+import openai
+print(time.perf_counter() - started, True)
+"""
+
+
+def run_snippet(code, env):
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[-2]), output[-1] == "True"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_boot(workers, preload, env):
+    """Seconds from spawning gunicorn until /health answers"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"],
+        cwd=ROOT, env=dict(env, GUNICORN_PRELOAD="1" if preload else "0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                json.loads(urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read())
+                return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None or time.perf_counter() - started > 30:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per scenario; the median is reported")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for the boot scenarios")
+    args = parser.parse_args()
+
+    without_key = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    without_key["SIMULATION_DB"] = ""
+    with_key = dict(without_key, OPENAI_API_KEY="sk-benchmark")
+    scenarios = [
+        ("import only, no key", IMPORT_ONLY, without_key),
+        ("import only, with key", IMPORT_ONLY, with_key),
+        ("import + first request, no key", FIRST_REQUEST, without_key),
+        ("openai import (deferred)", OPENAI_IMPORT, without_key),
+    ]
+    rows = []
+    for name, code, env in scenarios:
+        runs = [run_snippet(code, env) for _ in range(args.repeat)]
+        rows.append((name, statistics.median(seconds for seconds, _ in runs), runs[0][1]))
+
+    width = max(len(name) for name, _, _ in rows)
+    print(f"{'scenario':<{width}}  {'median':>9}  openai loaded")
+    for name, seconds, loaded in rows:
+        print(f"{name:<{width}}  {seconds * 1000:7.1f}ms  {'yes' if loaded else 'no'}")
+
+    try:
+        for preload in (False, True):
+            seconds = statistics.median(gunicorn_boot(args.workers, preload, with_key) for _ in range(args.repeat))
+            label = f"gunicorn {args.workers} workers, {'preload' if preload else 'no preload'}"
+            print(f"{label:<{width}}  {seconds * 1000:7.1f}ms")
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"gunicorn boot skipped: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Micro-benchmark: per-request template compilation vs the precompiled page.
+
+Compares requests/sec for ``/`` and ``/run-simulation`` using the old
+``render_template_string(HTML_TEMPLATE, ...)`` path against the current
+pre-rendered home page and results-block-only rendering.
+
+Usage:
+    python benchmarks/bench_template.py [--seconds 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from flask import render_template_string  # noqa: E402
+
+import app as focusgroup  # noqa: E402
+
+SIMULATION_FORM = {
+    "product_description": "An AI recipe app that suggests meals based on ingredients you already have.",
+    "name1": "Marco Rossi", "age1": "38", "job1": "Professional Chef",
+    "traits1": "Perfectionist, values technique, skeptical of shortcuts",
+    "name2": "Jennifer Walsh", "age2": "34", "job2": "Working Mother of Two",
+    "traits2": "Time-starved, needs family-friendly meals",
+    "name3": "David Chen", "age3": "28", "job3": "Food Blogger",
+    "traits3": "Trend-focused, loves experimenting",
+}
+
+
+def measure(fn, seconds):
+    """Call fn repeatedly for the given duration and return calls/sec"""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    args = parser.parse_args()
+
+    flask_app = focusgroup.app
+    client = flask_app.test_client()
+    sample_result = {
+        "product": SIMULATION_FORM["product_description"],
+        "responses": [
+            {"name": "Marco Rossi", "role": "The Expert/Skeptic", "text": "Not convinced yet."},
+            {"name": "Jennifer Walsh", "role": "The Practical User", "text": "Show me the value."},
+            {"name": "David Chen", "role": "The Early Adopter", "text": "Sign me up."},
+        ],
+        "insight": "Focus on onboarding.",
+    }
+
+    def old_home():
+        with flask_app.test_request_context("/"):
+            render_template_string(focusgroup.HTML_TEMPLATE, result=None, asset_url=focusgroup.assets.url)
+
+    def old_results():
+        with flask_app.test_request_context("/run-simulation", method="POST"):
+            render_template_string(focusgroup.HTML_TEMPLATE, result=sample_result, asset_url=focusgroup.assets.url)
+
+    rows = [
+        ("render only: home (old)", measure(old_home, args.seconds)),
+        ("render only: home (new)", measure(lambda: focusgroup.HOME_PAGE, args.seconds)),
+        ("render only: results (old)", measure(old_results, args.seconds)),
+        ("render only: results (new)", measure(lambda: focusgroup.render_page(sample_result), args.seconds)),
+        ("GET / (new)", measure(lambda: client.get("/"), args.seconds)),
+        ("GET / If-None-Match (new)", measure(
+            lambda: client.get("/", headers={"If-None-Match": '"%s"' % focusgroup.HOME_ETAG}), args.seconds)),
+        ("POST /run-simulation (new)", measure(
+            lambda: client.post("/run-simulation", data=SIMULATION_FORM), args.seconds)),
+    ]
+
+    width = max(len(name) for name, _ in rows)
+    for name, rate in rows:
+        print(f"{name:<{width}}  {rate:12,.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
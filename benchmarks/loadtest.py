@@ -0,0 +1,211 @@
+"""Offline load test of the app's main routes against the stub OpenAI server.
+
+Starts the stub (with optional latency jitter, error and malformed-JSON
+rates), runs the app under gunicorn with OPENAI_API_BASE pointed at it, and
+drives `/`, `/generate-personas` and `/run-simulation` from a pool of
+concurrent clients for a fixed duration. Reports throughput, error counts
+and p50/p95/p99 latency per route, plus how many persona requests fell back.
+No network access or API key is needed.
+
+Usage:
+    python benchmarks/loadtest.py [--server flask|asgi] [--workers 1] [--concurrency 20]
+                                  [--duration 10] [--routes home,personas,simulation]
+                                  [--latency 0.5] [--jitter 0.2] [--error-rate 0.05]
+                                  [--malformed-rate 0.05] [--seed 1] [--json results.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_openai import PERSONAS, add_stub_arguments, stub_from_args  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+SERVERS = {
+    "flask": ["app:app"],
+    "asgi": ["asgi:app", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def home_request(base_url, index):
+    return urllib.request.Request(f"{base_url}/")
+
+
+def personas_request(base_url, index):
+    body = json.dumps({"product_description": f"Load test product {index}", "cache": "bypass"}).encode()
+    return urllib.request.Request(f"{base_url}/generate-personas", data=body,
+                                  headers={"Content-Type": "application/json"})
+
+
+def simulation_request(base_url, index):
+    form = {"product_description": f"Load test product {index}"}
+    for i, persona in enumerate(PERSONAS, 1):
+        form.update({f"name{i}": persona["name"], f"age{i}": persona["age"],
+                     f"job{i}": persona["occupation"], f"traits{i}": persona["traits"]})
+    return urllib.request.Request(f"{base_url}/run-simulation", data=urllib.parse.urlencode(form).encode())
+
+
+def api_simulation_request(base_url, index):
+    body = json.dumps({"product_description": f"Load test product {index}", "personas": PERSONAS}).encode()
+    return urllib.request.Request(f"{base_url}/api/simulate", data=body, headers={"Content-Type": "application/json"})
+
+
+ROUTES = {
+    "home": ("GET /", home_request),
+    "personas": ("POST /generate-personas", personas_request),
+    "simulation": ("POST /run-simulation", simulation_request),
+    "api_simulation": ("POST /api/simulate", api_simulation_request),
+}
+
+
+def timed_request(request):
+    """Return (latency in seconds, ok)"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            ok = 200 <= response.status < 300
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))]
+
+
+def run_load(base_url, routes, concurrency, duration):
+    """Each client cycles through `routes` until the duration is up; returns per-route results"""
+    samples = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+    counter = itertools.count()
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset):
+        for route in itertools.islice(itertools.cycle(routes), offset, None):
+            if time.monotonic() >= stop_at:
+                return
+            latency, ok = timed_request(ROUTES[route][1](base_url, next(counter)))
+            with lock:
+                samples[route].append(latency)
+                if not ok:
+                    errors[route] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for route in routes:
+        latencies = sorted(samples[route])
+        results[route] = {
+            "requests": len(latencies),
+            "errors": errors[route],
+            "throughput": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        }
+    return results, elapsed
+
+
+def print_report(results, elapsed):
+    print(f"{'route':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for route, result in results.items():
+        print(f"{ROUTES[route][0]:<26}{result['requests']:>9}{result['errors']:>8}{result['throughput']:>9.1f}"
+              f"{result['p50'] * 1000:>7.0f}ms{result['p95'] * 1000:>7.0f}ms"
+              f"{result['p99'] * 1000:>7.0f}ms{result['max'] * 1000:>7.0f}ms")
+    total = sum(result["requests"] for result in results.values())
+    print(f"{'total':<26}{total:>9}{sum(r['errors'] for r in results.values()):>8}{total / elapsed:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=sorted(SERVERS), default="flask")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--routes", default="home,personas,simulation",
+                        help=f"comma-separated subset of {','.join(ROUTES)}")
+    parser.add_argument("--json", help="also write the results to this file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    unknown = [route for route in routes if route not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    stub = stub_from_args(args)
+    env = dict(os.environ,
+               OPENAI_API_KEY="sk-loadtest",
+               OPENAI_API_BASE=f"http://127.0.0.1:{stub.server_port}/v1",
+               UPSTREAM_MAX_CALLS=str(max(16, args.concurrency)),
+               SIMULATION_DB="",
+               SIMULATION_JOBS_DB="",
+               RATE_LIMIT_RATE="0")
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-b", f"127.0.0.1:{port}",
+         "--timeout", "300", *SERVERS[args.server]],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(f"{base_url}/health")
+        print(f"{args.server}, {args.workers} worker(s), concurrency {args.concurrency}, {args.duration:g}s; "
+              f"upstream {args.latency}s +0..{args.jitter}s, errors {args.error_rate:.0%}, "
+              f"malformed {args.malformed_rate:.0%}")
+        results, elapsed = run_load(base_url, routes, args.concurrency, args.duration)
+        upstream = json.loads(urllib.request.urlopen(f"{base_url}/health").read())["upstream"]
+    finally:
+        server.terminate()
+        server.wait()
+        stub.shutdown()
+
+    print_report(results, elapsed)
+    print(f"stub: {stub.config.requests} calls, {stub.config.errors} errors, {stub.config.malformed} malformed; "
+          f"persona fallbacks (last worker polled): {upstream['fallbacks']}/{upstream['requests']}, "
+          f"breaker {upstream['breaker_state']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "elapsed": elapsed, "routes": results, "upstream": upstream}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Load test: sync Flask workers vs the ASGI entry point on upstream-bound requests.
+
+Starts the stub OpenAI server, then runs the app with one worker under
+gunicorn's sync worker (app:app) and under uvicorn (asgi:app), firing
+concurrent cache-bypassing /generate-personas requests at each and
+reporting throughput and latency.
+
+Usage:
+    python benchmarks/loadtest_asgi.py [--requests 100] [--concurrency 50] [--latency 0.2]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from loadtest import free_port, wait_until_up  # noqa: E402
+from stub_openai import start_stub  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+SERVERS = {
+    "flask (gunicorn sync)": ["app:app"],
+    "asgi (uvicorn worker)": ["asgi:app", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+
+def post_personas(base_url, index):
+    body = json.dumps({"product_description": f"Load test product {index}", "cache": "bypass"}).encode()
+    request = urllib.request.Request(f"{base_url}/generate-personas", data=body,
+                                     headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def run_load(base_url, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(lambda i: post_personas(base_url, i), range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput": requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub upstream latency in seconds")
+    args = parser.parse_args()
+
+    stub = start_stub(latency=args.latency)
+    env = dict(os.environ,
+               OPENAI_API_KEY="sk-loadtest",
+               OPENAI_API_BASE=f"http://127.0.0.1:{stub.server_port}/v1",
+               RATE_LIMIT_RATE="0",
+               UPSTREAM_BUDGET="300",
+               UPSTREAM_MAX_CALLS=str(args.concurrency))
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, upstream latency {args.latency}s, 1 worker")
+    print(f"{'server':<24}{'req/s':>10}{'p50':>10}{'p95':>10}{'max':>10}")
+    for name, target in SERVERS.items():
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", "1", "-b", f"127.0.0.1:{port}", "--timeout", "300", *target],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_up(f"{base_url}/health")
+            result = run_load(base_url, args.requests, args.concurrency)
+            upstream = json.loads(urllib.request.urlopen(f"{base_url}/health").read())["upstream"]
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name:<24}{result['throughput']:>10.1f}{result['p50']:>9.2f}s{result['p95']:>9.2f}s"
+              f"{result['max']:>9.2f}s   fallbacks={upstream['fallbacks']}")
+
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Local stub of the OpenAI ChatCompletion API for offline benchmarks.
+
+Speaks the ChatCompletion wire format (including stream=True server-sent
+events and function calls) on POST .../chat/completions and answers with a
+persona JSON array (or prose, for prompts with a system message) after a
+configurable latency. Upstream misbehaviour can be injected:
+random latency jitter, a rate of HTTP 500 errors and a rate of malformed
+(truncated) JSON completions. Point the app at it with
+OPENAI_API_BASE=http://127.0.0.1:<port>/v1, which sets openai.api_base.
+
+Usage:
+    python benchmarks/stub_openai.py [--port 8900] [--latency 0.5] [--jitter 0.2]
+                                     [--error-rate 0.05] [--malformed-rate 0.05] [--seed 1]
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PERSONAS = [
+    {"name": "Avery Stone", "age": 41, "occupation": "Operations Manager", "traits": "Analytical, skeptical of new tools, needs proof"},
+    {"name": "Riley Park", "age": 27, "occupation": "Growth Marketer", "traits": "Early adopter, trend-focused, shares discoveries"},
+    {"name": "Morgan Diaz", "age": 35, "occupation": "Office Administrator", "traits": "Practical, budget-conscious, wants simplicity"},
+]
+
+# Drawn on when a top-up request names the personas it already has
+EXTRA_PERSONAS = [
+    {"name": "Jordan Blake", "age": 52, "occupation": "Procurement Lead", "traits": "Data-driven, cautious, wants references"},
+    {"name": "Sam Okafor", "age": 24, "occupation": "Product Designer", "traits": "Optimistic, experimental, loves new apps"},
+    {"name": "Taylor Reed", "age": 46, "occupation": "Small Business Owner", "traits": "Time-poor, cost-aware, needs quick wins"},
+]
+
+# Characters per streamed chunk, roughly a few tokens
+STREAM_CHUNK_SIZE = 12
+
+# Length of the prose answered to in-character prompts, about 100 words
+STUB_REPLY_CHARS = 600
+
+
+class StubConfig:
+    def __init__(self, latency=0.5, jitter=0.0, error_rate=0.0, malformed_rate=0.0, seed=None, prompt_latency=0.0):
+        self.latency = latency
+        self.prompt_latency = prompt_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.malformed = 0
+
+    def draw(self):
+        """Decide the delay and failure mode of one request"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return delay, "error"
+            if roll < self.error_rate + self.malformed_rate:
+                self.malformed += 1
+                return delay, "malformed"
+            return delay, "ok"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "Unknown endpoint", "type": "invalid_request_error"}})
+
+        delay, mode = self.config.draw()
+        if mode == "error":
+            time.sleep(delay)
+            return self.send_json(500, {"error": {"message": "Stub upstream error", "type": "server_error"}})
+
+        # Answer only as many personas as asked for, none already named in the
+        # prompt, and take proportionally less time, as a model would
+        messages = request.get("messages", [])
+        prompt = " ".join(str(m.get("content", "")) for m in messages)
+        wanted = re.search(r"Create (\d+) more", prompt)
+        count = int(wanted.group(1)) if wanted else 3
+        personas = [p for p in PERSONAS + EXTRA_PERSONAS if p["name"] not in prompt][:count]
+        delay *= len(personas) / len(PERSONAS)
+        # Reading the prompt takes time too, in proportion to its length
+        functions = request.get("functions") or []
+        prompt_tokens = (len(prompt) + (len(json.dumps(functions)) if functions else 0)) // 4
+        delay += prompt_tokens / 1000 * self.config.prompt_latency
+
+        # Answer through the requested function if there is one, else as plain content;
+        # in-character prompts (simulation responses and insights) get prose
+        function = (functions or [None])[0]
+        if any(m.get("role") == "system" for m in messages):
+            content = "Stub reply: " + str(messages[0].get("content", ""))[:STUB_REPLY_CHARS]
+        else:
+            content = json.dumps({"personas": personas} if function else personas)
+        if mode == "malformed":
+            content = content[: len(content) * 2 // 3]
+        # Output stops at max_tokens, as a model's does
+        finish_reason = "function_call" if function else "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and len(content) // 4 > max_tokens:
+            content = content[: max_tokens * 4]
+            finish_reason = "length"
+        model = request.get("model", "gpt-3.5-turbo")
+        if request.get("stream"):
+            return self.send_stream(content, model, delay, function)
+
+        time.sleep(delay)
+        if function:
+            message = {"role": "assistant", "content": None,
+                       "function_call": {"name": function["name"], "arguments": content}}
+        else:
+            message = {"role": "assistant", "content": content}
+        self.send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_tokens + len(content) // 4},
+        })
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped waiting, e.g. at its latency budget
+            self.close_connection = True
+
+    def send_stream(self, content, model, delay, function=None):
+        """Spread the delay over the chunks, like a model generating tokens"""
+        chunks = [content[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(content), STREAM_CHUNK_SIZE)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            if function:
+                delta = {"function_call": {"arguments": chunk}}
+                if i == 0:
+                    delta["function_call"]["name"] = function["name"]
+            else:
+                delta = {"content": chunk}
+            event = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def start_stub(port=0, latency=0.5, jitter=0.0, error_rate=0.0, malformed_rate=0.0, seed=None, prompt_latency=0.0):
+    """Start the stub in a background thread; returns the server (server.server_port is the port)"""
+    config = StubConfig(latency, jitter, error_rate, malformed_rate, seed, prompt_latency)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.5, help="base upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, 0..jitter seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of completions with broken JSON")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+    parser.add_argument("--prompt-latency", type=float, default=0.0,
+                        help="extra seconds per 1K prompt tokens, for the time a model takes to read the prompt")
+
+
+def stub_from_args(args, port=0):
+    return start_stub(port, args.latency, args.jitter, args.error_rate, args.malformed_rate, args.seed,
+                      args.prompt_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = stub_from_args(args, args.port)
+    print(f"Stub OpenAI API on http://127.0.0.1:{server.server_port}/v1 (latency {args.latency}s "
+          f"+0..{args.jitter}s, errors {args.error_rate:.0%}, malformed {args.malformed_rate:.0%})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Two-tier result cache: in-process LRU with TTL, plus optional shared SQLite tier"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize free text so trivially different inputs share a cache key"""
+    return " ".join((text or "").lower().split()).rstrip(".!?")
+
+
+def cache_key(product_description, target_market, model, temperature):
+    """Hash of the normalized inputs that determine a persona completion"""
+    payload = json.dumps([
+        normalize_text(product_description),
+        normalize_text(target_market),
+        model,
+        round(float(temperature), 3),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """Thread-safe LRU cache of bytes values with a TTL and a total size cap"""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store `value` for `ttl` seconds, at most the cache's own TTL (the default)"""
+        if len(value) > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Size-capped LRU cache in a SQLite file, shared by every worker on the host"""
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread and per process; connections must not cross a fork.
+        # The file and schema are created on first use, not at import.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """Return (value, seconds until it expires), or (None, None) if absent or expired"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        if row[1] <= now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None, None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return bytes(row[0]), row[1] - now
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + self.ttl, now),
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM cache ORDER BY accessed_at LIMIT 1"
+                ).fetchone()
+                conn.execute("DELETE FROM cache WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResultCache:
+    """Memory tier in front of an optional disk tier, with hit/miss counters.
+
+    Values are JSON-serializable objects; they are stored encoded so the byte
+    caps are accurate and cached objects can never be mutated by callers.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return (value, tier) where tier is "memory", "disk" or None on a miss"""
+        raw = self.memory.get(key)
+        if raw is not None:
+            self.memory_hits += 1
+            return json.loads(raw), "memory"
+        if self.disk is not None:
+            try:
+                raw, ttl = self.disk.lookup(key)
+            except sqlite3.Error as e:
+                print(f"Cache read error: {e}")
+                raw = None
+            if raw is not None:
+                self.disk_hits += 1
+                # Promoted with the disk entry's remaining lifetime, so it expires from both tiers together
+                self.memory.set(key, raw, ttl)
+                return json.loads(raw), "disk"
+        self.misses += 1
+        return None, None
+
+    def set(self, key, value):
+        raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        self.memory.set(key, raw)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, raw)
+            except sqlite3.Error as e:
+                print(f"Cache write error: {e}")
+
+    def invalidate(self, key):
+        self.invalidations += 1
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except sqlite3.Error as e:
+                print(f"Cache delete error: {e}")
+
+    def stats(self):
+        stats = {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "invalidations": self.invalidations,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size,
+            "memory_max_bytes": self.memory.max_bytes,
+            "memory_evictions": self.memory.evictions,
+            "disk_enabled": self.disk is not None,
+        }
+        if self.disk is not None:
+            stats["disk_evictions"] = self.disk.evictions
+        return stats
+
+
+def cache_from_env(prefix):
+    """Build a ResultCache configured by <prefix>_TTL, _MAX_BYTES, _DB and _DB_MAX_BYTES"""
+    ttl = float(os.environ.get(f"{prefix}_TTL", 3600))
+    memory = MemoryCache(int(os.environ.get(f"{prefix}_MAX_BYTES", 8 * 1024 * 1024)), ttl)
+    disk = None
+    db_path = os.environ.get(f"{prefix}_DB")
+    if db_path:
+        disk = SQLiteCache(db_path, int(os.environ.get(f"{prefix}_DB_MAX_BYTES", 256 * 1024 * 1024)), ttl)
+    return ResultCache(memory, disk)
@@ -0,0 +1,76 @@
+"""Fallback persona catalog: product categories, archetype personas and insights loaded from a data file.
+
+The catalog is read once at import into immutable records, and each
+category's `{"personas": [...]}` response is encoded (and compressed) up
+front, so serving fallback personas is a dictionary lookup plus a write.
+New categories are added by editing the data file; nothing else changes.
+"""
+import json
+import os
+from collections import namedtuple
+
+from assets import compress_variants
+
+# Override to load a different catalog without touching the repo
+PERSONA_CATALOG = os.environ.get(
+    "PERSONA_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "personas.json"))
+
+# Fallback sets are merged slot by slot with partial model output, so each needs this many personas
+PERSONAS_PER_CATEGORY = 3
+
+Persona = namedtuple("Persona", ["name", "age", "occupation", "traits"])
+Category = namedtuple("Category", ["name", "keywords", "exemplars", "personas", "insight", "variants"])
+
+
+def encode_personas(personas):
+    """Encode a personas response exactly as Flask's jsonify does"""
+    payload = {"personas": [persona._asdict() for persona in personas]}
+    return (json.dumps(payload, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class Catalog:
+    """Categories in file order (keyword ties go to the earlier one) plus the default category"""
+
+    def __init__(self, data):
+        self.default = data["default"]
+        entries = data["categories"]
+        if self.default not in entries:
+            raise ValueError(f"Default category {self.default!r} is not in the catalog")
+        default_insight = entries[self.default].get("insight")
+        if not default_insight:
+            raise ValueError(f"Default category {self.default!r} needs an insight")
+
+        self.categories = {}
+        for name, entry in entries.items():
+            personas = tuple(Persona(p["name"], int(p["age"]), p["occupation"], p["traits"])
+                             for p in entry["personas"])
+            if len(personas) < PERSONAS_PER_CATEGORY:
+                raise ValueError(f"Category {name!r} needs at least {PERSONAS_PER_CATEGORY} personas")
+            self.categories[name] = Category(
+                name,
+                tuple(entry.get("keywords", ())),
+                tuple(entry.get("exemplars", ())),
+                personas,
+                entry.get("insight") or default_insight,
+                compress_variants(encode_personas(personas)),
+            )
+
+    def keyword_table(self):
+        """Category -> keywords for the product classifier; the default category needs none"""
+        return {name: category.keywords for name, category in self.categories.items() if category.keywords}
+
+    def exemplar_table(self):
+        """Category -> example product descriptions for the semantic matcher"""
+        return {name: category.exemplars for name, category in self.categories.items() if category.exemplars}
+
+    def lookup(self, name):
+        """The category's record, or the default category's for an unknown name"""
+        return self.categories.get(name) or self.categories[self.default]
+
+
+def load_catalog(path):
+    with open(path, encoding="utf-8") as f:
+        return Catalog(json.load(f))
+
+
+catalog = load_catalog(PERSONA_CATALOG)
@@ -0,0 +1,117 @@
+"""Moderated multi-round discussion: moderator questions, turn prompts and a compacted transcript.
+
+Each round every persona answers the moderator's question, seeing the
+discussion so far only as a compacted summary: the lead sentence of each
+earlier turn, newest first, for as many turns as fit a fixed token budget.
+A turn's prompt therefore stays about the same size however many rounds
+have gone before, and the most recent positions are the last to be dropped.
+"""
+import os
+import re
+
+from prompts import estimate_tokens
+
+DISCUSSION_DEFAULT_ROUNDS = 3
+DISCUSSION_MAX_ROUNDS = int(os.environ.get("DISCUSSION_MAX_ROUNDS", 6))
+DISCUSSION_MAX_PERSONAS = 6
+# Seconds the turns of one round share; the round's stragglers keep canned text
+DISCUSSION_ROUND_BUDGET = float(os.environ.get("DISCUSSION_ROUND_BUDGET", 6))
+# Estimated tokens the summary of earlier turns may take in each turn's prompt
+DISCUSSION_SUMMARY_TOKENS = int(os.environ.get("DISCUSSION_SUMMARY_TOKENS", 350))
+TURN_MAX_TOKENS = 160
+# Characters of a turn kept in the summary: about its first sentence
+TURN_SUMMARY_CHARS = 240
+
+MODERATOR_QUESTIONS = (
+    "What is your first reaction to this product? Would you use it?",
+    "You've heard each other's first reactions. Where do you agree or disagree with the others, and why?",
+    "What would it take to change your mind, and what would you be willing to pay?",
+)
+FINAL_QUESTION = ("Give your final verdict: would you sign up, and what is the one thing "
+                  "the team must get right?")
+
+# Canned turns for rounds after the first, by role; the first round uses the canned simulation text
+CANNED_REACTIONS = {
+    "The Expert/Skeptic": ("Hearing {others}, my view hasn't changed much: enthusiasm isn't evidence. "
+                           "I'd want independent results and a clear cancellation policy before I commit."),
+    "The Early Adopter": ("I understand the concerns {others} raised, but I'd still try it straight away. "
+                          "If the first week delivers, the rest is down to the team keeping up the pace."),
+}
+DEFAULT_REACTION = ("Listening to {others}, I'm somewhere in the middle. If the free option shows me value "
+                    "quickly I'd stay; if it needs a lot of setup, I'd drop it.")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def moderator_question(round_number, rounds):
+    """The moderator's question for a round, numbered from 1; the last of several rounds asks for a verdict"""
+    if rounds > 1 and round_number == rounds:
+        return FINAL_QUESTION
+    return MODERATOR_QUESTIONS[min(round_number, len(MODERATOR_QUESTIONS)) - 1]
+
+
+def lead(text, max_chars=TURN_SUMMARY_CHARS):
+    """The first sentence of a turn, cut at a word boundary if it is longer than max_chars"""
+    text = " ".join(text.split())
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    if len(sentence) <= max_chars:
+        return sentence
+    return sentence[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def compact_transcript(turns, budget=DISCUSSION_SUMMARY_TOKENS):
+    """Summary of earlier turns within about `budget` tokens, in the order they were said.
+
+    Turns are taken newest first, each reduced to its lead sentence, until the
+    next one would not fit; older turns are left out.
+    """
+    lines = []
+    used = 0
+    for turn in reversed(turns):
+        line = f"Round {turn['round']}, {turn['name']}: {lead(turn['text'])}"
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(reversed(lines))
+
+
+def others(personas, index):
+    """The other participants' names, as "A and B" or "A, B and C" """
+    names = [p['name'] for i, p in enumerate(personas) if i != index]
+    return " and ".join([", ".join(names[:-1]), names[-1]]) if len(names) > 1 else "".join(names)
+
+
+def canned_reaction(personas, index, role):
+    return CANNED_REACTIONS.get(role, DEFAULT_REACTION).format(others=others(personas, index))
+
+
+def turn_messages(product_description, personas, index, role, summary, question):
+    """Chat messages for one persona's turn in a round"""
+    persona = personas[index]
+    system = (
+        f"You are {persona['name']}, a {persona['age']}-year-old {persona['occupation']}. "
+        f"Your personality and traits: {persona['traits']}. "
+        f"You are in a moderated focus group about a product with {others(personas, index)}, "
+        f"where you come across as {role}. Stay in character and answer the moderator in the "
+        "first person in 50-90 words. React to what the others said, by name, where it matters to you. "
+        "No lists or headings."
+    )
+    user = f"The product: {product_description}\n\n"
+    if summary:
+        user += f"The discussion so far, in brief:\n{summary}\n\n"
+    user += f"Moderator: {question}"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def discussion_insight_messages(product_description, summary):
+    """Chat messages asking the moderator for recommendations from the compacted discussion"""
+    system = (
+        "You are the moderator of a product focus group that has just finished a discussion. Write one "
+        "paragraph of about 80 words with strategic recommendations for the product team: where the "
+        "participants converged, the main unresolved objection, and a pricing or positioning "
+        "suggestion. No lists or headings."
+    )
+    user = f"The product: {product_description}\n\nThe discussion, in brief:\n{summary}"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
@@ -0,0 +1,108 @@
+"""Streaming NDJSON and CSV export of stored simulations"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Columns of each exported record kind; NDJSON simulations also nest their personas and responses
+EXPORT_COLUMNS = {
+    "simulations": ("id", "created_at", "product_description", "insight", "simulate_ms"),
+    "personas": ("simulation_id", "created_at", "name", "age", "occupation", "traits"),
+    "responses": ("simulation_id", "created_at", "name", "role", "text", "source"),
+}
+
+# Rows are buffered into chunks of about this many bytes before they are sent
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def parse_time(value):
+    """A Unix timestamp or an ISO 8601 date/datetime (UTC unless it says otherwise), as epoch seconds"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def export_records(simulations, kind):
+    """Flatten simulations into one dict per exported record of `kind`"""
+    for simulation in simulations:
+        if kind == "simulations":
+            yield {
+                "id": simulation["id"],
+                "created_at": simulation["created_at"],
+                "product_description": simulation["product_description"],
+                "personas": simulation["personas"],
+                "responses": simulation["responses"],
+                "insight": simulation["insight"],
+                "simulate_ms": simulation["timings"].get("simulate_ms"),
+            }
+            continue
+        for item in simulation[kind]:
+            record = {"simulation_id": simulation["id"], "created_at": simulation["created_at"]}
+            record.update((column, item.get(column)) for column in EXPORT_COLUMNS[kind][2:])
+            yield record
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def csv_lines(records, columns):
+    """Header then one CSV line per record, keeping only `columns`"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, columns, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header is still buffered when there were no records
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def chunked(lines, chunk_bytes=EXPORT_CHUNK_BYTES):
+    """Join text lines into encoded chunks of about `chunk_bytes`"""
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip a byte stream as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(simulations, kind, fmt, compress=False):
+    """Encoded chunks of an export, optionally gzipped, produced lazily from `simulations`"""
+    records = export_records(simulations, kind)
+    lines = ndjson_lines(records) if fmt == "ndjson" else csv_lines(records, EXPORT_COLUMNS[kind])
+    chunks = chunked(lines)
+    return gzip_stream(chunks) if compress else chunks
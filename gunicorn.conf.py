@@ -0,0 +1,33 @@
+"""Gunicorn settings, picked up automatically from the working directory.
+
+The app is imported once in the master (preload) so the compiled template,
+pre-rendered pages, persona tables and static assets are shared copy-on-write
+by every worker instead of being rebuilt per worker. Set GUNICORN_PRELOAD=0
+to import the app in each worker instead, e.g. for code reloading.
+"""
+import gc
+import os
+import sys
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+
+def pre_fork(server, worker):
+    """Finish shared initialization in the master before each worker is forked"""
+    if not preload_app:
+        return
+    focusgroup = sys.modules.get("app")
+    if focusgroup is not None and focusgroup.llm is not None:
+        # Set up lazily by a plain `import app` (openai imported, recordings read); here every worker can share it
+        focusgroup.llm.prepare()
+    # Keep the collector away from shared objects: a collection in a worker
+    # writes to their GC headers and would copy every page they live on
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Start the worker's job threads, so queued simulations run even before its first request"""
+    focusgroup = sys.modules.get("app")
+    # ASGI workers start theirs at lifespan startup, once their event loop is running
+    if focusgroup is not None and "asgi" not in sys.modules:
+        focusgroup.start_job_workers()
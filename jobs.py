@@ -0,0 +1,297 @@
+"""Persistent simulation job queue: jobs in SQLite, run by a pool of threads in every worker process.
+
+Submitting a job is one INSERT, so the HTTP worker is free again within
+milliseconds while the simulation runs in the background. Each process that
+serves requests also runs JOB_WORKERS threads that claim queued jobs oldest
+first. A claim is a lease, renewed while the job runs: if the process dies
+mid-job (a gunicorn worker recycled, a crash, a deploy), the job stays
+`running` until its lease expires, then any worker on the host claims it
+again, up to JOB_MAX_ATTEMPTS times. Finished jobs keep their result for JOB_RETENTION
+seconds, so clients can collect it by polling or over Server-Sent Events.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+# Threads per process that run jobs
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+# Seconds a claimed job's worker may go without renewing its lease before another worker assumes it died;
+# leases are renewed every third of this while the job runs
+JOB_LEASE = float(os.environ.get("JOB_LEASE", 60))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+# Queued jobs beyond which submissions are refused with 429
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", 1000))
+# Seconds finished jobs are kept for their results to be collected
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 86400))
+# Seconds an idle worker thread waits before looking for jobs submitted by another process
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 0.5))
+# How often a job's event stream checks for a change, and how long it follows the job
+JOB_STREAM_INTERVAL = 0.25
+JOB_STREAM_TIMEOUT = float(os.environ.get("JOB_STREAM_TIMEOUT", 120))
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id TEXT PRIMARY KEY, created_at REAL NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL,"
+    " lease_until REAL, started_at REAL, finished_at REAL, request TEXT NOT NULL, result TEXT, error TEXT)",
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)",
+)
+
+COLUMNS = "id, created_at, status, attempts, started_at, finished_at, request, result, error"
+
+
+def job_from_row(row):
+    """Decode a row selected with COLUMNS"""
+    return {
+        "id": row[0],
+        "created_at": row[1],
+        "status": row[2],
+        "attempts": row[3],
+        "started_at": row[4],
+        "finished_at": row[5],
+        "request": json.loads(row[6]),
+        "result": json.loads(row[7]) if row[7] is not None else None,
+        "error": row[8],
+    }
+
+
+class JobQueue:
+    """Jobs in a SQLite file in WAL mode, shared by every worker on the host.
+
+    Claims run in an IMMEDIATE transaction, so two threads never take the
+    same job; idle threads first check for work with a plain read, so an
+    empty queue costs no write locks. A submission wakes this process's
+    threads at once, and the others find it within JOB_POLL_INTERVAL.
+
+    Each claim bumps the job's `attempts`, which then identifies the lease: a
+    heartbeat thread renews the leases this process holds, and a result is
+    recorded only while its lease is still the current one, so a worker
+    that stalled past its lease cannot overwrite the run that replaced it.
+    """
+
+    def __init__(self, path, workers=JOB_WORKERS, lease=JOB_LEASE, max_attempts=JOB_MAX_ATTEMPTS,
+                 max_queued=JOB_MAX_QUEUED, retention=JOB_RETENTION, poll_interval=JOB_POLL_INTERVAL):
+        self.path = path
+        self.workers = workers
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.max_queued = max_queued
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.reclaimed = 0
+        self.abandoned = 0
+        self.superseded = 0
+        self._local = threading.local()
+        # Leases this process holds, job id -> attempts
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._workers_pid = None
+        self._workers_lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def _connect(self):
+        # One connection per thread and per process; the schema is created on first use
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def submit(self, request):
+        """Queue a job for `request` (a JSON-serializable dict); returns its id"""
+        job_id = secrets.token_urlsafe(9)
+        self._connect().execute(
+            "INSERT INTO jobs (id, created_at, status, attempts, request) VALUES (?, ?, 'queued', 0, ?)",
+            (job_id, time.time(), json.dumps(request, separators=(",", ":"))),
+        )
+        self.submitted += 1
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """The job as a dict, with `position` in the queue while it waits, or None if there is no such id"""
+        conn = self._connect()
+        row = conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = job_from_row(row)
+        if job["status"] == "queued":
+            job["position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+            ).fetchone()[0]
+        return job
+
+    def depth(self):
+        """Jobs waiting and jobs running across the host, as {"queued": n, "running": n}"""
+        counts = dict(self._connect().execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+        ).fetchall())
+        return {"queued": counts.get("queued", 0), "running": counts.get("running", 0)}
+
+    def full(self):
+        return self.depth()["queued"] >= self.max_queued
+
+    def claim(self):
+        """Lease the oldest queued job, or a running one whose lease expired; returns it or None"""
+        conn = self._connect()
+        now = time.time()
+        claimable = ("SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                     " ORDER BY created_at LIMIT 1")
+        if conn.execute(claimable, (now,)).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(f"SELECT id, status, attempts FROM jobs WHERE id = ({claimable})",
+                                   (now,)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                job_id, status, attempts = row
+                if attempts < self.max_attempts:
+                    break
+                # Its worker died on every attempt: give up rather than crash another one
+                conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL, error = ?"
+                             " WHERE id = ?", (now, "Job abandoned after repeated worker failures", job_id))
+                self.abandoned += 1
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?,"
+                         " started_at = ? WHERE id = ?", (now + self.lease, now, job_id))
+            job = job_from_row(conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if status == "running":
+            self.reclaimed += 1
+        return job
+
+    def renew(self, job):
+        """Extend a claimed job's lease; returns False if the lease has been lost to another claim"""
+        return self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + self.lease, job["id"], job["attempts"]),
+        ).rowcount == 1
+
+    def finish(self, job, result=None, error=None):
+        """Record a claimed job's result, or its error message if it failed.
+
+        Returns False, recording nothing, if the job's lease expired and it was
+        claimed again or abandoned in the meantime.
+        """
+        status = "failed" if error is not None else "done"
+        recorded = self._connect().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, lease_until = NULL, result = ?, error = ?"
+            " WHERE id = ? AND status = 'running' AND attempts = ?",
+            (status, time.time(), json.dumps(result, separators=(",", ":")) if result is not None else None,
+             error, job["id"], job["attempts"]),
+        ).rowcount == 1
+        if not recorded:
+            self.superseded += 1
+        elif error is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        return recorded
+
+    def purge(self, now=None):
+        """Delete finished jobs older than the retention period; returns how many"""
+        cutoff = (now or time.time()) - self.retention
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)
+        ).rowcount
+
+    def ensure_workers(self, run):
+        """Start this process's worker threads if they are not running (cheap no-op otherwise).
+
+        Called after fork rather than at import, so each worker process runs
+        its own threads. `run(job)` returns the job's result, or raises to fail it.
+        """
+        if self._workers_pid == os.getpid():
+            return
+        with self._workers_lock:
+            if self._workers_pid == os.getpid():
+                return
+            self._workers_pid = os.getpid()
+            self._leases = {}
+            for i in range(self.workers):
+                threading.Thread(target=self._work_forever, args=(run,), name=f"job-worker-{i}", daemon=True).start()
+            threading.Thread(target=self._heartbeat_forever, name="job-heartbeat", daemon=True).start()
+
+    def _work_forever(self, run):
+        while True:
+            try:
+                job = self.claim()
+            except sqlite3.Error as e:
+                print(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                self._idle()
+                continue
+            with self._leases_lock:
+                self._leases[job["id"]] = job["attempts"]
+            try:
+                result = run(job)
+            except Exception as e:
+                print(f"Job {job['id']} failed: {e}")
+                self._finish_logged(job, error=str(e) or type(e).__name__)
+            else:
+                self._finish_logged(job, result=result)
+            finally:
+                with self._leases_lock:
+                    self._leases.pop(job["id"], None)
+
+    def _finish_logged(self, job, result=None, error=None):
+        try:
+            if not self.finish(job, result, error):
+                print(f"Job {job['id']} lost its lease; its result was discarded")
+        except sqlite3.Error as e:
+            # The lease runs out and the job is run again
+            print(f"Job queue error: {e}")
+
+    def _heartbeat_forever(self):
+        while True:
+            time.sleep(self.lease / 3)
+            with self._leases_lock:
+                held = [{"id": job_id, "attempts": attempts} for job_id, attempts in self._leases.items()]
+            for job in held:
+                try:
+                    if not self.renew(job):
+                        print(f"Job {job['id']} lost its lease")
+                except sqlite3.Error as e:
+                    # Retried on the next beat, which comes well before the lease runs out
+                    print(f"Job queue error: {e}")
+
+    def _idle(self):
+        self._wake.wait(self.poll_interval)
+        self._wake.clear()
+        now = time.time()
+        if now - self._purged_at > 60:
+            self._purged_at = now
+            try:
+                self.purge(now)
+            except sqlite3.Error as e:
+                print(f"Job queue error: {e}")
+
+    def stats(self):
+        return {
+            "path": self.path, "workers": self.workers, "submitted": self.submitted, "completed": self.completed,
+            "failed": self.failed, "reclaimed": self.reclaimed, "abandoned": self.abandoned,
+            "superseded": self.superseded,
+        }
+
+
+def queue_from_env(prefix):
+    """Build a JobQueue at <prefix>_DB (default jobs.db), or None when it is set empty"""
+    path = os.environ.get(f"{prefix}_DB", "jobs.db")
+    return JobQueue(path) if path else None
@@ -0,0 +1,72 @@
+"""Incremental parsing of a JSON array of objects as it streams in"""
+import json
+import re
+
+# Trailing commas before a closing bracket, a common slip in model output
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _loads_lenient(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", text))
+
+
+class JSONArrayStreamParser:
+    """Yield each top-level object of a JSON array as soon as it is complete.
+
+    Text before the opening bracket (such as a markdown fence, or the
+    ``{"personas":`` of a function call) is skipped. Trailing commas are
+    tolerated; objects that still fail to decode are counted in ``errors``
+    and skipped, so one bad element does not lose the ones around it. Input
+    that ends early simply leaves ``closed`` false.
+    """
+
+    def __init__(self):
+        self.errors = 0
+        self.closed = False
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._current = []
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the objects it completed"""
+        objects = []
+        for char in chunk:
+            if self.closed:
+                break
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                continue
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._current = [char]
+                elif char == "]":
+                    self.closed = True
+                continue
+            self._current.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(_loads_lenient("".join(self._current)))
+                    except ValueError:
+                        self.errors += 1
+                    self._current = []
+        return objects
@@ -0,0 +1,444 @@
+"""Model backends: every chat completion the routes make goes through one interface.
+
+Callers pass ChatCompletion keyword arguments (model, messages, functions,
+max_tokens, request_timeout, stream, ...) to `create`, or `acreate` on an
+event loop, and read the result as openai 0.28 returns it:
+`response.choices[0].message`, `response.usage`, and for stream=True an
+iterator of chunks with `choices[0].delta`. A backend for another provider
+translates to and from that shape, so swapping providers leaves the routes
+alone. The backends are:
+
+- openai: the openai package, imported and given the API key on first use
+- record: the openai backend, also appending each request with its response
+  (or error) and latency to a JSON Lines file
+- replay: answers from that file without the network, each after the latency
+  it originally took, so runs are offline and reproducible
+- local: deterministic answers built from the prompt, for profiling without
+  recordings
+"""
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from catalog import catalog
+from classifier import classify_product
+from prompts import estimate_prompt_tokens, estimate_tokens
+
+LLM_BACKENDS = ("openai", "record", "replay", "local")
+
+# Characters per chunk when a stream is made up from a whole completion
+STREAM_CHUNK_SIZE = 12
+
+_PERSONA_SYSTEM = re.compile(r"You are (?P<name>[^,]+), an? \d+-year-old (?P<occupation>[^.]+)\.")
+_PRODUCT = re.compile(r'Product: "(?P<product>.*?)"\s*\nTarget', re.DOTALL)
+_MORE_PERSONAS = re.compile(r"Create (\d+) more")
+
+# Sentences local replies are assembled from; the request picks which
+LOCAL_OPENINGS = (
+    "As a {occupation}, my first reaction is cautious interest.",
+    "Speaking as a {occupation}, I can see where this would fit into my week.",
+    "Honestly, as a {occupation} I'd need convincing before I paid for this.",
+    "This caught my attention straight away as a {occupation}.",
+)
+LOCAL_DETAILS = (
+    "The idea is clear, but I want to see it work on a bad day, not just in a demo.",
+    "Price matters to me, so a free trial would decide it.",
+    "If it saves me time in the first week, I'd keep using it.",
+    "I'd ask people I trust whether it lived up to the promise before committing.",
+    "My worry is that it becomes one more subscription I forget about.",
+    "Support and being able to cancel easily would make me far more comfortable.",
+)
+LOCAL_INSIGHTS = (
+    "Lead with the time saved in the first week, since that is what converts the practical participants.",
+    "Give the skeptics proof: independent reviews, a clear cancellation policy and transparent data handling.",
+    "Use early adopters as advocates with a referral offer once they have seen results.",
+    "A free trial followed by a modest monthly price addresses the main barrier, which is commitment.",
+    "Position the product on reliability rather than novelty, because trust is the recurring objection.",
+)
+
+
+class ReplayMiss(LookupError):
+    """A replayed request that was never recorded"""
+
+
+class ReplayedError(Exception):
+    """An upstream error reproduced from a recording"""
+
+
+class Payload(dict):
+    """A decoded response whose fields read as attributes or keys, like openai's OpenAIObject"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def payload(value):
+    """Decoded JSON with every object made a Payload"""
+    if isinstance(value, dict):
+        return Payload((key, payload(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [payload(item) for item in value]
+    return value
+
+
+def request_key(params):
+    """Hash identifying a request for replay; the timeout does not change what the model is asked"""
+    request = {name: value for name, value in params.items() if name != "request_timeout"}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def stream_chunks(response):
+    """A whole completion split into stream chunks, as the API would have sent it"""
+    message = response["choices"][0]["message"]
+    function_call = message.get("function_call")
+    text = function_call["arguments"] if function_call else message.get("content") or ""
+    chunks = []
+    for i in range(0, len(text), STREAM_CHUNK_SIZE) or [0]:
+        piece = text[i:i + STREAM_CHUNK_SIZE]
+        if function_call:
+            delta = {"function_call": {"arguments": piece}}
+            if i == 0:
+                delta["function_call"]["name"] = function_call["name"]
+        else:
+            delta = {"content": piece}
+        chunks.append({"object": "chat.completion.chunk", "model": response["model"],
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+    return chunks
+
+
+class LLMBackend(abc.ABC):
+    """Interface of a model backend; see the module docstring for the request and response shapes"""
+    name = None
+
+    def prepare(self):
+        """Do one-time setup ahead of the first call, e.g. in the gunicorn master before forking"""
+
+    def use_session(self, factory):
+        """Give async calls a shared HTTP session, where the backend makes HTTP calls"""
+
+    @abc.abstractmethod
+    def create(self, **params):
+        """A ChatCompletion response, or an iterator of chunks with stream=True"""
+
+    @abc.abstractmethod
+    async def acreate(self, **params):
+        """Async counterpart of create(), awaited on the event loop"""
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._openai = None
+        self._lock = threading.Lock()
+        self._session_factory = None
+
+    def client(self):
+        """The openai module, imported and given the API key on first use"""
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    import openai
+                    openai.api_key = self.api_key
+                    self._openai = openai
+        return self._openai
+
+    def prepare(self):
+        self.client()
+
+    def use_session(self, factory):
+        self._session_factory = factory
+
+    def create(self, **params):
+        return self.client().ChatCompletion.create(**params)
+
+    async def acreate(self, **params):
+        openai = self.client()
+        if self._session_factory is not None:
+            openai.aiosession.set(self._session_factory())
+        return await openai.ChatCompletion.acreate(**params)
+
+
+class RecordingBackend(LLMBackend):
+    """Another backend's calls, each appended to a JSON Lines file as it completes.
+
+    A line holds the request key, the request, the seconds the call took and
+    either the response, the stream's chunks with their offsets from the
+    start of the call, or the error. Lines are appended whole, so several
+    workers can record to one file.
+    """
+    name = "record"
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        self.inner.prepare()
+
+    def use_session(self, factory):
+        self.inner.use_session(factory)
+
+    def _append(self, params, started, **outcome):
+        entry = {"key": request_key(params), "request": params,
+                 "seconds": round(time.perf_counter() - started, 4), **outcome}
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def create(self, **params):
+        started = time.perf_counter()
+        try:
+            response = self.inner.create(**params)
+        except Exception as e:
+            self._append(params, started, error=str(e) or type(e).__name__)
+            raise
+        if params.get("stream"):
+            return self._record_stream(params, response, started)
+        self._append(params, started, response=response)
+        return response
+
+    def _record_stream(self, params, chunks, started):
+        # Recorded when the caller stops reading, with whatever it read
+        received = []
+        try:
+            for chunk in chunks:
+                received.append([round(time.perf_counter() - started, 4), chunk])
+                yield chunk
+        finally:
+            self._append(params, started, chunks=received)
+
+    async def acreate(self, **params):
+        started = time.perf_counter()
+        try:
+            response = await self.inner.acreate(**params)
+        except Exception as e:
+            self._append(params, started, error=str(e) or type(e).__name__)
+            raise
+        self._append(params, started, response=response)
+        return response
+
+    def stats(self):
+        return {"backend": self.name, "path": self.path, "recorded": self.recorded}
+
+
+class LocalBackend(LLMBackend):
+    """Deterministic completions made up from the prompt, without a model.
+
+    Persona requests get the archetypes of the product's catalog category
+    (skipping any the prompt already names); in-character prompts get a few
+    stock sentences picked by a hash of the request, so the same request
+    always gets the same answer. Usage is estimated and max_tokens is
+    honoured, as a model's would be.
+    """
+    name = "local"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def respond(self, params):
+        """The completion for a request, as a JSON-serializable dict"""
+        messages = params.get("messages", [])
+        functions = params.get("functions") or []
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        rng = random.Random(request_key(params))
+
+        if functions:
+            content = json.dumps({"personas": self._personas(prompt)})
+        else:
+            persona = _PERSONA_SYSTEM.search(prompt)
+            if persona:
+                sentences = [rng.choice(LOCAL_OPENINGS).format(occupation=persona["occupation"].strip())]
+                sentences += rng.sample(LOCAL_DETAILS, 3)
+            else:
+                sentences = rng.sample(LOCAL_INSIGHTS, 3)
+            content = " ".join(sentences)
+
+        finish_reason = "function_call" if functions else "stop"
+        max_tokens = params.get("max_tokens")
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            content = content[:max_tokens * 4]
+            finish_reason = "length"
+        if functions:
+            message = {"role": "assistant", "content": None,
+                       "function_call": {"name": functions[0]["name"], "arguments": content}}
+        else:
+            message = {"role": "assistant", "content": content}
+        prompt_tokens = estimate_prompt_tokens(messages, functions)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-local-{request_key(params)[:12]}",
+            "object": "chat.completion",
+            "model": params.get("model", "local"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @staticmethod
+    def _personas(prompt):
+        """The product category's archetypes, then other categories', minus personas the prompt names"""
+        product = _PRODUCT.search(prompt)
+        wanted = _MORE_PERSONAS.search(prompt)
+        category = catalog.lookup(classify_product(product["product"] if product else prompt))
+        pool = list(category.personas) + [persona for other in catalog.categories.values() if other is not category
+                                          for persona in other.personas]
+        count = int(wanted.group(1)) if wanted else 3
+        return [persona._asdict() for persona in pool if persona.name not in prompt][:count]
+
+    def create(self, **params):
+        time.sleep(self.latency)
+        response = self.respond(params)
+        if params.get("stream"):
+            return iter(payload(stream_chunks(response)))
+        return payload(response)
+
+    async def acreate(self, **params):
+        await asyncio.sleep(self.latency)
+        return payload(self.respond(params))
+
+    def stats(self):
+        return {"backend": self.name, "latency": self.latency}
+
+
+class ReplayBackend(LLMBackend):
+    """Recorded calls played back with their original latency, read from a RecordingBackend's file.
+
+    Requests are matched on their key; repeats of one request cycle through
+    its recordings in order, so a request recorded several times replays its
+    own spread of latencies and errors. A timeout shorter than the recorded
+    latency times out, as the live call would have. A request that was never
+    recorded raises ReplayMiss, or with misses="local" is answered by the
+    local backend after a latency drawn (with a fixed seed) from all the
+    recordings.
+    """
+    name = "replay"
+
+    def __init__(self, path, misses="error", seed=0):
+        if misses not in ("error", "local"):
+            raise ValueError(f"misses must be 'error' or 'local', not {misses!r}")
+        self.path = path
+        self.misses = misses
+        self.local = LocalBackend()
+        self.hits = 0
+        self.missed = 0
+        self._recordings = None
+        self._latencies = []
+        self._turns = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        self._load()
+
+    def _load(self):
+        if self._recordings is None:
+            with self._lock:
+                if self._recordings is None:
+                    recordings = {}
+                    with open(self.path, encoding="utf-8") as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                recordings.setdefault(entry["key"], []).append(entry)
+                                self._latencies.append(entry["seconds"])
+                    self._recordings = recordings
+        return self._recordings
+
+    def _entry(self, params):
+        """The recording to replay for a request, made up locally for a miss if so configured"""
+        entries = self._load().get(request_key(params))
+        with self._lock:
+            if entries:
+                self.hits += 1
+                turn = self._turns.get(entries[0]["key"], 0)
+                self._turns[entries[0]["key"]] = turn + 1
+                return entries[turn % len(entries)]
+            self.missed += 1
+            if self.misses == "error":
+                raise ReplayMiss("No recording for this request")
+            seconds = self._random.choice(self._latencies) if self._latencies else 0.0
+        response = self.local.respond(params)
+        if params.get("stream"):
+            offsets = [seconds] * len(stream_chunks(response))
+            return {"seconds": seconds, "chunks": list(zip(offsets, stream_chunks(response)))}
+        return {"seconds": seconds, "response": response}
+
+    @staticmethod
+    def _delay(entry, params):
+        """Seconds to wait before answering, and whether the live call would have timed out by then"""
+        timeout = params.get("request_timeout")
+        if timeout is not None and "chunks" not in entry and entry["seconds"] > timeout:
+            return timeout, True
+        return entry["seconds"], False
+
+    @staticmethod
+    def _outcome(entry, timed_out):
+        if timed_out:
+            raise TimeoutError("Replayed request timed out")
+        if "error" in entry:
+            raise ReplayedError(entry["error"])
+        return payload(entry["response"])
+
+    def create(self, **params):
+        entry = self._entry(params)
+        if "chunks" in entry:
+            return self._replay_stream(entry["chunks"])
+        delay, timed_out = self._delay(entry, params)
+        time.sleep(delay)
+        return self._outcome(entry, timed_out)
+
+    @staticmethod
+    def _replay_stream(chunks):
+        started = time.perf_counter()
+        for offset, chunk in chunks:
+            time.sleep(max(0.0, offset - (time.perf_counter() - started)))
+            yield payload(chunk)
+
+    async def acreate(self, **params):
+        entry = self._entry(params)
+        delay, timed_out = self._delay(entry, params)
+        await asyncio.sleep(delay)
+        return self._outcome(entry, timed_out)
+
+    def stats(self):
+        return {"backend": self.name, "path": self.path, "hits": self.hits, "misses": self.missed,
+                "recordings": sum(map(len, self._recordings.values())) if self._recordings is not None else None}
+
+
+def backend_from_env(prefix, api_key):
+    """Build the backend named by <prefix>_BACKEND (default openai), or None if it needs an API key and has none.
+
+    record and replay use the file at <prefix>_RECORDINGS (default
+    llm_recordings.jsonl); replay answers requests missing from it as set by
+    <prefix>_REPLAY_MISSES; local waits <prefix>_LOCAL_LATENCY seconds per call.
+    """
+    kind = os.environ.get(f"{prefix}_BACKEND", "openai")
+    if kind not in LLM_BACKENDS:
+        raise ValueError(f"{prefix}_BACKEND must be one of: {', '.join(LLM_BACKENDS)}")
+    path = os.environ.get(f"{prefix}_RECORDINGS", "llm_recordings.jsonl")
+    if kind == "local":
+        return LocalBackend(float(os.environ.get(f"{prefix}_LOCAL_LATENCY", 0)))
+    if kind == "replay":
+        return ReplayBackend(path, os.environ.get(f"{prefix}_REPLAY_MISSES", "error"))
+    if not api_key:
+        return None
+    backend = OpenAIBackend(api_key)
+    return RecordingBackend(backend, path) if kind == "record" else backend
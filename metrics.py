@@ -0,0 +1,336 @@
+"""Minimal Prometheus instrumentation that aggregates across gunicorn workers.
+
+Each process keeps its metrics in memory. When METRICS_DIR is set, a
+background thread in every process also writes a snapshot of its metrics to
+METRICS_DIR/<pid>.json every METRICS_FLUSH_INTERVAL seconds (and at exit),
+and a scrape of any worker merges all snapshots: counters and histograms are summed over every file
+(so they stay monotonic when a worker is recycled), gauges only over live
+processes, or the maximum is taken for gauges every process reads from the
+same shared source. A scrape folds the counters and histograms of exited
+processes into METRICS_DIR/exited.json and deletes their own files, so the
+directory does not grow with every recycled worker. Without METRICS_DIR,
+/metrics reports the serving process only.
+"""
+import atexit
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+# Counters and histograms of exited processes, folded together
+EXITED_SNAPSHOT = "exited.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+RENDER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a counter that is maintained elsewhere"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), merge="sum"):
+        super().__init__(name, documentation, labelnames)
+        self.merge = merge
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, with +Inf last, then sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(value)] for key, value in self._values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self._flusher_pid = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), merge="sum"):
+        """merge="max" for a host-wide value every process reports, so it is not counted once per process"""
+        return self.register(Gauge(name, documentation, labelnames, merge))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """Call fn before every snapshot, to refresh metrics mirrored from elsewhere"""
+        self.collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        for collect in self.collectors:
+            collect()
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def ensure_flusher(self):
+        """Start this process's snapshot thread if it is not running (cheap no-op otherwise).
+
+        Called from request hooks rather than at import so that each forked
+        worker starts its own thread.
+        """
+        if METRICS_DIR and self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Metrics flush error: {e}")
+
+    def flush(self):
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, f)
+        os.replace(tmp_path, path)
+
+    def _snapshots(self):
+        if not METRICS_DIR:
+            return [(True, self.snapshot())]
+        self.flush()
+        # Scrapes in other workers may be folding the same files
+        with open(os.path.join(METRICS_DIR, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            live, exited, exited_paths = [], [], []
+            for name in os.listdir(METRICS_DIR):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(METRICS_DIR, name)
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if name != EXITED_SNAPSHOT and _is_alive(data["pid"]):
+                    live.append((True, data["metrics"]))
+                    continue
+                exited.append((False, data["metrics"]))
+                if name != EXITED_SNAPSHOT:
+                    exited_paths.append(path)
+            if exited_paths:
+                exited = [(False, self._fold(exited))]
+                for path in exited_paths:
+                    os.remove(path)
+        return live + exited
+
+    def _fold(self, snapshots):
+        """Merge exited processes' snapshots into EXITED_SNAPSHOT; returns the merged snapshot"""
+        merged = self._merge(snapshots)
+        snapshot = {name: [[list(key), value] for key, value in values.items()] for name, values in merged.items()}
+        path = os.path.join(METRICS_DIR, EXITED_SNAPSHOT)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pid": None, "metrics": snapshot}, f)
+        os.replace(tmp_path, path)
+        return snapshot
+
+    def _merge(self, snapshots):
+        """Metric name -> {label values: value} over (alive, snapshot) pairs; gauges of dead processes are dropped"""
+        merged = {metric.name: {} for metric in self.metrics}
+        for alive, snapshot in snapshots:
+            for metric in self.metrics:
+                if metric.kind == "gauge" and not alive:
+                    continue
+                values = merged[metric.name]
+                for key, value in snapshot.get(metric.name, []):
+                    key = tuple(key)
+                    if metric.kind == "histogram":
+                        current = values.get(key)
+                        values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    elif metric.kind == "gauge" and metric.merge == "max":
+                        values[key] = max(values.get(key, value), value)
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return merged
+
+    def exposition(self):
+        """All metrics, merged across processes, in Prometheus text format"""
+        merged = self._merge(self._snapshots())
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(merged[metric.name].items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else f"{value:.1f}"
+    return str(value)
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "focusgroup_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+HTTP_LATENCY = registry.histogram(
+    "focusgroup_http_request_duration_seconds", "Time to produce an HTTP response by route", ("route",))
+HTTP_IN_FLIGHT = registry.gauge(
+    "focusgroup_http_requests_in_flight", "HTTP requests currently being handled by route", ("route",))
+OPENAI_LATENCY = registry.histogram(
+    "focusgroup_openai_request_duration_seconds", "OpenAI call latency by outcome", ("outcome",), UPSTREAM_BUCKETS)
+OPENAI_TOKENS = registry.counter(
+    "focusgroup_openai_tokens_total", "Tokens reported in OpenAI response.usage, estimated for streams", ("type",))
+OPENAI_COST = registry.counter(
+    "focusgroup_openai_cost_usd_total", "Estimated OpenAI spend at the configured prices by kind of call", ("call",))
+PROMPT_COMPACTIONS = registry.counter(
+    "focusgroup_prompt_compactions_total", "Descriptions compacted to fit the prompt token budget")
+PROMPT_TOKENS_TRIMMED = registry.counter(
+    "focusgroup_prompt_tokens_trimmed_total", "Estimated prompt tokens removed by compacting descriptions")
+PERSONA_PARSE_FAILURES = registry.counter(
+    "focusgroup_persona_parse_failures_total", "Completions that were not 3 valid personas in JSON")
+PERSONA_FALLBACKS = registry.counter(
+    "focusgroup_persona_fallbacks_total", "Persona requests served from get_contextual_personas", ("reason",))
+PERSONA_SALVAGED = registry.counter(
+    "focusgroup_persona_salvaged_total", "Valid personas recovered from truncated or malformed completions")
+PERSONA_TOPUPS = registry.counter(
+    "focusgroup_persona_topup_calls_total", "Follow-up OpenAI calls that requested only the missing personas",
+    ("outcome",))
+PERSONA_CALLS_SAVED = registry.counter(
+    "focusgroup_persona_calls_saved_total", "Full persona regenerations avoided by salvaging imperfect output")
+PERSONA_SECONDS_SAVED = registry.counter(
+    "focusgroup_persona_seconds_saved_total", "Estimated OpenAI seconds saved versus regenerating every persona")
+SIMULATION_RESPONSES = registry.counter(
+    "focusgroup_simulation_responses_total", "Persona responses in model-mode simulations by source", ("source",))
+DISCUSSION_ROUND_LATENCY = registry.histogram(
+    "focusgroup_discussion_round_duration_seconds", "Time for every persona to take a discussion turn",
+    buckets=UPSTREAM_BUCKETS)
+JOB_WAIT = registry.histogram(
+    "focusgroup_job_wait_seconds", "Time simulation jobs spent queued before a worker claimed them", ("mode",))
+JOB_LATENCY = registry.histogram(
+    "focusgroup_job_duration_seconds", "Time from submitting a simulation job to its result", ("mode",),
+    UPSTREAM_BUCKETS)
+TEMPLATE_RENDER = registry.histogram(
+    "focusgroup_template_render_seconds", "Results block render time", buckets=RENDER_BUCKETS)
+
+# Mirrored from the persona cache, single-flight, rate limiter, upstream guard and job queue by a collector
+UPSTREAM_CALLS = registry.counter(
+    "focusgroup_openai_calls_total", "OpenAI calls by outcome, including short-circuited ones", ("outcome",))
+UPSTREAM_QUEUE_DEPTH = registry.gauge(
+    "focusgroup_openai_queue_depth", "Requests waiting for an OpenAI call slot")
+REQUESTS_REJECTED = registry.counter(
+    "focusgroup_requests_rejected_total", "Requests refused with 429 by reason", ("reason",))
+UPSTREAM_CIRCUIT_OPEN = registry.gauge(
+    "focusgroup_openai_circuit_open", "Workers whose OpenAI circuit breaker is open or half-open")
+PERSONA_CACHE_LOOKUPS = registry.counter(
+    "focusgroup_persona_cache_lookups_total", "Persona cache lookups by result", ("result",))
+PERSONA_DEDUPLICATED = registry.counter(
+    "focusgroup_persona_requests_deduplicated_total",
+    "Persona requests served by another identical request's upstream call", ("scope",))
+JOB_QUEUE_DEPTH = registry.gauge(
+    "focusgroup_job_queue_depth", "Simulation jobs on the host by status", ("status",), merge="max")
+JOBS = registry.counter(
+    "focusgroup_jobs_total", "Simulation jobs by outcome, including jobs reclaimed from a dead worker", ("outcome",))
+PERSONA_CACHE_BYTES = registry.gauge(
+    "focusgroup_persona_cache_bytes", "Bytes held by the in-process persona cache")
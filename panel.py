@@ -0,0 +1,133 @@
+"""Large synthetic panels sampled from persona archetypes, aggregated with NumPy.
+
+A panel is never materialized as persona dicts. Each member is a row in a
+boolean member x trait-phrase matrix, sampled around one archetype, and
+classification is two matrix products against per-phrase keyword scores.
+That is exact for the keyword classifiers because their keywords never span
+the ", " between phrases, so scoring phrases separately and summing equals
+scoring the joined traits string.
+"""
+import os
+import re
+import time
+
+import numpy as np
+
+from classifier import TRAIT_ROLES, KeywordClassifier, role_classifier
+
+PANEL_DEFAULT_SIZE = int(os.environ.get("PANEL_DEFAULT_SIZE", 1000))
+PANEL_MAX_SIZE = int(os.environ.get("PANEL_MAX_SIZE", 20000))
+
+# Chance a member keeps each of its archetype's traits / picks up another archetype's
+KEEP_TRAIT = 0.75
+BORROW_TRAIT = 0.08
+# Chance a member keeps its archetype's occupation rather than another archetype's
+KEEP_OCCUPATION = 0.8
+AGE_SPREAD = 7.0
+MIN_AGE, MAX_AGE = 18, 80
+
+AGE_BAND_EDGES = (25, 35, 45, 55, 65)
+AGE_BANDS = ("18-24", "25-34", "35-44", "45-54", "55-64", "65+")
+
+ROLES = list(TRAIT_ROLES) + [role_classifier.default]
+
+# Objection -> trait keywords that raise it
+OBJECTION_KEYWORDS = {
+    "price": ['budget', 'price', 'cost', 'afford', 'money', 'frugal', 'cheap', 'value'],
+    "proof": ['skeptic', 'proof', 'data', 'science', 'evidence', 'measurable', 'credential', 'compliance'],
+    "time": ['time', 'busy', 'convenience', 'quick', 'efficien'],
+    "complexity": ['simplicity', 'simple', 'easy', 'risk-averse', 'overwhelm', 'tech-averse'],
+    "quality": ['perfectionist', 'quality', 'standards', 'authentic', 'technique'],
+    "privacy": ['privacy', 'security', 'secure', 'regulat'],
+}
+objection_classifier = KeywordClassifier(OBJECTION_KEYWORDS, default=None)
+OBJECTIONS = list(OBJECTION_KEYWORDS)
+
+# Objections each role voices in simulate_focus_group regardless of traits
+ROLE_OBJECTIONS = {
+    "The Expert/Skeptic": ("proof", "privacy"),
+    "The Early Adopter": (),
+    "The Practical User": ("price", "complexity"),
+}
+
+
+def _phrases(traits):
+    return [phrase.strip() for phrase in re.split(r"[,;]", traits) if phrase.strip()]
+
+
+def _score_matrix(classifier, phrases, labels):
+    """phrases x labels keyword match counts; 0 x labels when the archetypes have no traits"""
+    scores = np.zeros((len(phrases), len(labels)), dtype=np.int32)
+    for row, phrase in enumerate(phrases):
+        match = classifier.classify(phrase).scores
+        scores[row] = [match[label] for label in labels]
+    return scores
+
+
+def _shares(counts, total):
+    return {label: round(float(count) / total, 4) for label, count in counts if total}
+
+
+def simulate_panel(archetypes, size, seed=None):
+    """Sample `size` members around the archetypes and return aggregate statistics"""
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n_archetypes = len(archetypes)
+
+    # Trait vocabulary: every phrase of every archetype, deduplicated case-insensitively
+    phrases, owner = [], []
+    seen = {}
+    for index, archetype in enumerate(archetypes):
+        for phrase in _phrases(archetype["traits"]):
+            key = phrase.lower()
+            if key not in seen:
+                seen[key] = len(phrases)
+                phrases.append(phrase)
+                owner.append(index)
+    owner = np.array(owner)
+    keep_probability = np.where(owner[None, :] == np.arange(n_archetypes)[:, None], KEEP_TRAIT, BORROW_TRAIT)
+
+    # Sample members: archetype, age, occupation and trait phrases
+    archetype_of = rng.integers(0, n_archetypes, size)
+    base_ages = np.array([int(archetype["age"]) for archetype in archetypes], dtype=np.float64)
+    ages = np.clip(np.rint(base_ages[archetype_of] + rng.normal(0.0, AGE_SPREAD, size)), MIN_AGE, MAX_AGE).astype(np.int32)
+    occupation_of = np.where(rng.random(size) < KEEP_OCCUPATION, archetype_of, rng.integers(0, n_archetypes, size))
+    traits = rng.random((size, len(phrases))) < keep_probability[archetype_of]
+
+    # Roles: summed keyword scores, first role wins ties, no match -> the default role
+    role_scores = traits.astype(np.int32) @ _score_matrix(role_classifier, phrases, TRAIT_ROLES)
+    role_of = np.where(role_scores.max(axis=1) > 0, role_scores.argmax(axis=1), len(ROLES) - 1)
+
+    # Objections: raised by a trait keyword or by the member's role
+    objections = (traits.astype(np.int32) @ _score_matrix(objection_classifier, phrases, OBJECTIONS)) > 0
+    role_objections = np.array([[objection in ROLE_OBJECTIONS.get(role, ()) for objection in OBJECTIONS]
+                                for role in ROLES])
+    objections |= role_objections[role_of]
+
+    band_of = np.digitize(ages, AGE_BAND_EDGES)
+    band_counts = np.bincount(band_of, minlength=len(AGE_BANDS))
+    band_roles = np.bincount(band_of * len(ROLES) + role_of, minlength=len(AGE_BANDS) * len(ROLES))
+    band_roles = band_roles.reshape(len(AGE_BANDS), len(ROLES))
+    role_counts = np.bincount(role_of, minlength=len(ROLES))
+    occupation_counts = np.bincount(occupation_of, minlength=n_archetypes)
+
+    return {
+        "size": size,
+        "seed": seed,
+        "archetypes": [archetype["name"] for archetype in archetypes],
+        "role_mix": _shares(zip(ROLES, role_counts), size),
+        "objections": _shares(zip(OBJECTIONS, objections.sum(axis=0)), size),
+        "occupations": _shares(zip((a["occupation"] for a in archetypes), occupation_counts), size),
+        "age": {
+            "mean": round(float(ages.mean()), 1) if size else None,
+            "median": float(np.median(ages)) if size else None,
+        },
+        "age_bands": {
+            band: {
+                "share": round(float(band_counts[i]) / size, 4) if size else 0.0,
+                "role_mix": _shares(zip(ROLES, band_roles[i]), int(band_counts[i])),
+            }
+            for i, band in enumerate(AGE_BANDS)
+        },
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,117 @@
+"""Prompt sizing: token estimates, compaction of oversized descriptions, output budgets and cost.
+
+A pasted pitch deck would otherwise go into every prompt whole. Descriptions
+over the token budget are compacted extractively: the opening sentences are
+kept (they usually say what the product is), then the sentences that carry
+most of the description's recurring terms, prices and numbers, until the
+budget is spent, in their original order. No model call is needed, so
+compaction costs a few milliseconds even for a 32 KB deck, not a round trip.
+"""
+import json
+import math
+import os
+import re
+from functools import lru_cache
+
+# Estimated tokens a product description may take in a prompt; 0 leaves descriptions whole
+PROMPT_DESCRIPTION_TOKENS = int(os.environ.get("PROMPT_DESCRIPTION_TOKENS", 400))
+PROMPT_TARGET_MARKET_TOKENS = 100
+# Sentences from the start of a description kept ahead of higher-scoring ones
+LEAD_SENTENCES = 2
+
+# Completion tokens one persona takes in the function arguments, with about twice the usual length as headroom
+PERSONA_OUTPUT_TOKENS = 100
+PERSONA_OUTPUT_OVERHEAD = 40
+
+# USD per 1K tokens; the defaults are gpt-3.5-turbo's list prices
+OPENAI_PROMPT_PRICE = float(os.environ.get("OPENAI_PROMPT_PRICE", 0.0005))
+OPENAI_COMPLETION_PRICE = float(os.environ.get("OPENAI_COMPLETION_PRICE", 0.0015))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+_BULLET = re.compile(r"^\s*(?:[-*•#>]+|\d+[.)])\s*", re.MULTILINE)
+# Prices, percentages and plans are what personas react to, so they are worth keeping
+_FIGURE = re.compile(r"[$€£]\s?\d|\d+\s?%|\bper (?:month|year|user)\b|/(?:mo|month|yr|year)\b|\bfree trial\b",
+                     re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """Rough token count of English text, about four characters per token"""
+    return (len(text) + 3) // 4
+
+
+def estimate_prompt_tokens(messages, functions=()):
+    """Estimated prompt tokens of a chat request, with a few tokens of framing per message"""
+    tokens = sum(estimate_tokens(str(message.get("content") or "")) + 4 for message in messages)
+    if functions:
+        tokens += estimate_tokens(json.dumps(list(functions)))
+    return tokens
+
+
+def persona_max_tokens(count):
+    """max_tokens for a completion that should return `count` personas"""
+    return PERSONA_OUTPUT_OVERHEAD + count * PERSONA_OUTPUT_TOKENS
+
+
+def usage_cost(prompt_tokens, completion_tokens):
+    """USD cost of a call at the configured prices"""
+    return (prompt_tokens * OPENAI_PROMPT_PRICE + completion_tokens * OPENAI_COMPLETION_PRICE) / 1000
+
+
+def split_sentences(text):
+    """Sentences and list items of a description, with bullets and extra whitespace removed"""
+    text = _BULLET.sub("", text)
+    return [" ".join(sentence.split()) for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _score(words, frequency):
+    """Salience of a sentence: the log frequency of its distinct terms across the description, length-normalized"""
+    terms = {word for word in words if len(word) > 3}
+    if not terms:
+        return 0.0
+    return sum(math.log(frequency[word]) + 1 for word in terms) / math.sqrt(len(words))
+
+
+@lru_cache(maxsize=256)
+def compact_description(text, budget=PROMPT_DESCRIPTION_TOKENS):
+    """The description itself if it fits `budget` estimated tokens, else its most informative sentences that do"""
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+    sentences = split_sentences(text)
+    words = [_WORD.findall(sentence.lower()) for sentence in sentences]
+    frequency = {}
+    for sentence_words in words:
+        for word in set(sentence_words):
+            frequency[word] = frequency.get(word, 0) + 1
+
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (i >= LEAD_SENTENCES, -(_score(words[i], frequency) + bool(_FIGURE.search(sentences[i])))),
+    )
+    chosen = set()
+    seen = set()
+    used = 0
+    for i in ranked:
+        sentence = sentences[i]
+        key = sentence.lower()
+        if key in seen:
+            continue
+        tokens = estimate_tokens(sentence) + 1
+        if used + tokens > budget:
+            if not chosen:
+                # Even the opening sentence is too long: cut it at a word boundary
+                return sentence[:budget * 4].rsplit(" ", 1)[0] + " …"
+            continue
+        chosen.add(i)
+        seen.add(key)
+        used += tokens
+
+    # Mark where sentences were left out so the model does not read it as continuous prose
+    parts = []
+    previous = -1
+    for i in sorted(chosen):
+        if parts and i != previous + 1:
+            parts.append("…")
+        parts.append(sentences[i])
+        previous = i
+    return " ".join(parts)
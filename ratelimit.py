@@ -0,0 +1,91 @@
+"""Per-client token-bucket rate limiting"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """One token bucket per client key, refilled at `rate` tokens/second up to `burst`.
+
+    Buckets are kept in an LRU capped at `max_clients`; an evicted client
+    simply starts again with a full bucket. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.allowed = 0
+        self.rejected = 0
+        self._buckets = OrderedDict()  # client -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def acquire(self, client, cost=1):
+        """Take `cost` tokens; returns (allowed, retry_after in whole seconds).
+
+        A cost above the burst needs a full bucket and is charged in full: the
+        bucket goes into debt, so the client waits out the whole cost before
+        its next request instead of a large request costing only the burst.
+        """
+        if not self.enabled:
+            return True, 0
+        needed = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= needed
+            if allowed:
+                tokens -= cost
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        return False, max(1, math.ceil((needed - tokens) / self.rate))
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "burst": self.burst,
+            "clients": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+def client_key(api_key, forwarded_for, remote_addr, trust_proxy=False, api_keys=frozenset()):
+    """The X-API-Key value if it is one of `api_keys`, else the client IP (the first X-Forwarded-For hop behind a proxy).
+
+    An unknown key is ignored rather than given its own bucket, or a client
+    could send a fresh random key with every request to get a full bucket.
+    """
+    if api_key and api_key in api_keys:
+        return f"key:{api_key}"
+    if trust_proxy and forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{remote_addr}"
+
+
+def api_keys_from_env(prefix):
+    """The API keys in <prefix>_API_KEYS (comma-separated) that get a bucket of their own"""
+    return frozenset(key.strip() for key in os.environ.get(f"{prefix}_API_KEYS", "").split(",") if key.strip())
+
+
+def rate_limiter_from_env(prefix):
+    """Build a RateLimiter configured by <prefix>_RATE, _BURST and _MAX_CLIENTS"""
+    return RateLimiter(
+        rate=float(os.environ.get(f"{prefix}_RATE", 1.0)),
+        burst=float(os.environ.get(f"{prefix}_BURST", 10)),
+        max_clients=int(os.environ.get(f"{prefix}_MAX_CLIENTS", 10000)),
+    )
@@ -0,0 +1,395 @@
+"""Latency budget, circuit breaker, request hedging and admission control for upstream calls"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class UpstreamTimeout(Exception):
+    """The upstream did not answer within the latency budget"""
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open, so the upstream was not called"""
+
+
+class Overloaded(Exception):
+    """Admission was refused because too many calls are running or queued"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """At most `limit` calls at once, plus a bounded queue whose waiters give up after `queue_timeout`.
+
+    Callers beyond the queue are refused at once, so overload sheds quickly
+    instead of piling up blocked workers. Threads and event-loop callers may
+    share one gate: the count is kept under a single lock, and a slot freed
+    by either kind wakes a waiter of each. The gate is per process, so each
+    gunicorn worker admits its own `limit` calls.
+    """
+
+    def __init__(self, limit, max_queue, queue_timeout):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._cond = threading.Condition()
+        # (loop, future) of aenter() callers waiting for a slot
+        self._async_waiters = deque()
+
+    def enter(self, retry_after=1):
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return
+            self._check_queue(retry_after)
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.limit, self.queue_timeout):
+                    self.rejected_timeout += 1
+                    raise Overloaded("Timed out waiting for an upstream slot", retry_after)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def leave(self):
+        with self._cond:
+            self.active -= 1
+            self._wake()
+
+    async def aenter(self, retry_after=1):
+        """Async counterpart of enter(): waits on the event loop, never blocking it for more than the lock"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return
+            self._check_queue(retry_after)
+            self.waiting += 1
+        deadline = loop.time() + self.queue_timeout
+        try:
+            while True:
+                woken = loop.create_future()
+                with self._cond:
+                    if self.active < self.limit:
+                        self.active += 1
+                        return
+                    self._async_waiters.append((loop, woken))
+                try:
+                    await asyncio.wait_for(woken, deadline - loop.time())
+                except asyncio.TimeoutError:
+                    self.rejected_timeout += 1
+                    raise Overloaded("Timed out waiting for an upstream slot", retry_after)
+                except asyncio.CancelledError:
+                    if woken.done() and not woken.cancelled():
+                        # Pass on a wake-up this caller will not use
+                        with self._cond:
+                            self._wake()
+                    raise
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    async def aleave(self):
+        self.leave()
+
+    def _wake(self):
+        """Wake one waiting thread and one waiting coroutine for a freed slot; the lock must be held"""
+        self._cond.notify()
+        while self._async_waiters:
+            loop, woken = self._async_waiters.popleft()
+            if not woken.done():
+                loop.call_soon_threadsafe(_wake_future, woken)
+                return
+
+    def _check_queue(self, retry_after):
+        if self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise Overloaded("Upstream queue is full", retry_after)
+
+    def saturated(self):
+        """Whether a new caller would be refused right now"""
+        return self.active >= self.limit and self.waiting >= self.max_queue
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.waiting,
+            "max_queue": self.max_queue,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+def _wake_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; half-open lets one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Give back a half-open probe abandoned without an outcome, so the next call can probe"""
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class GuardedUpstream:
+    """Run upstream calls under a circuit breaker and a per-call latency budget.
+
+    With hedging enabled, a second identical call is fired when the first is
+    slower than the rolling p95 latency, and whichever answers first wins.
+    Calls run on a private pool so the caller can stop waiting at the budget;
+    the abandoned call should carry its own network timeout to free its thread.
+    An optional ConcurrencyGate admits calls before the breaker sees them and
+    raises Overloaded when its queue is full.
+    """
+
+    def __init__(self, breaker, budget, hedge=False, hedge_after=3.0, max_workers=16, gate=None):
+        self.breaker = breaker
+        self.gate = gate
+        self.budget = budget
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.short_circuits = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.requests = 0
+        self.fallbacks = 0
+        self._latencies = deque(maxlen=200)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+
+    def hedge_threshold(self):
+        """Rolling p95 of successful call latency, or the configured default until there is enough data"""
+        samples = sorted(self._latencies)
+        if len(samples) < 20:
+            return self.hedge_after
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def retry_after(self):
+        """Whole seconds until a slot is likely to free up: the median call latency"""
+        samples = sorted(self._latencies)
+        median = samples[len(samples) // 2] if samples else self.hedge_after
+        return max(1, math.ceil(median))
+
+    @contextmanager
+    def admit(self):
+        """Hold an admission slot, raising Overloaded if none is free in time"""
+        if self.gate is None:
+            yield
+            return
+        self.gate.enter(self.retry_after())
+        try:
+            yield
+        finally:
+            self.gate.leave()
+
+    def call(self, fn, budget=None):
+        """Return fn()'s result, or raise Overloaded, CircuitOpenError, UpstreamTimeout or fn's own error.
+
+        `budget` lowers the latency budget for this call, e.g. to what is left of a caller's deadline.
+        """
+        with self.admit():
+            return self._call(fn, budget)
+
+    def _call(self, fn, budget=None):
+        if not self.breaker.allow():
+            self.short_circuits += 1
+            raise CircuitOpenError("Upstream circuit is open")
+
+        self.calls += 1
+        started = time.monotonic()
+        deadline = started + (self.budget if budget is None else min(budget, self.budget))
+        primary = self._executor.submit(fn)
+        futures = [primary]
+        hedge_at = started + self.hedge_threshold() if self.hedge else None
+        error = None
+
+        while futures and time.monotonic() < deadline:
+            wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, _ = wait(futures, timeout=max(0, wake_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                self._record_success(started, hedged=future is not primary)
+                return result
+            if hedge_at is not None and time.monotonic() >= hedge_at and futures:
+                hedge_at = None
+                self.hedges += 1
+                futures.append(self._executor.submit(fn))
+
+        raise self._record_failure(timed_out=bool(futures) or error is None, error=error, budget=deadline - started)
+
+    async def acall(self, make_coroutine, budget=None):
+        """Async counterpart of call(); losing or late attempts are cancelled instead of abandoned"""
+        if self.gate is None:
+            return await self._acall(make_coroutine, budget)
+        await self.gate.aenter(self.retry_after())
+        try:
+            return await self._acall(make_coroutine, budget)
+        finally:
+            await self.gate.aleave()
+
+    async def _acall(self, make_coroutine, budget=None):
+        if not self.breaker.allow():
+            self.short_circuits += 1
+            raise CircuitOpenError("Upstream circuit is open")
+
+        self.calls += 1
+        started = time.monotonic()
+        deadline = started + (self.budget if budget is None else min(budget, self.budget))
+        primary = asyncio.ensure_future(make_coroutine())
+        tasks = {primary}
+        hedge_at = started + self.hedge_threshold() if self.hedge else None
+        error = None
+
+        try:
+            while tasks and time.monotonic() < deadline:
+                wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(0, wake_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    self._record_success(started, hedged=task is not primary)
+                    return task.result()
+                if hedge_at is not None and time.monotonic() >= hedge_at and tasks:
+                    hedge_at = None
+                    self.hedges += 1
+                    tasks.add(asyncio.ensure_future(make_coroutine()))
+        except asyncio.CancelledError:
+            # The caller went away: no verdict on the upstream
+            self.breaker.release_probe()
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        raise self._record_failure(timed_out=bool(tasks) or error is None, error=error, budget=deadline - started)
+
+    def _record_success(self, started, hedged):
+        self._latencies.append(time.monotonic() - started)
+        self.successes += 1
+        if hedged:
+            self.hedge_wins += 1
+        self.breaker.record_success()
+
+    def _record_failure(self, timed_out, error, budget):
+        """Count a failed call and return the exception to raise"""
+        self.breaker.record_failure()
+        if timed_out:
+            self.timeouts += 1
+            return UpstreamTimeout(f"No upstream response within {budget:.3g}s")
+        self.failures += 1
+        return error
+
+    def record_request(self, fell_back):
+        """Count a request that needed the upstream and whether it was served from the fallback"""
+        self.requests += 1
+        if fell_back:
+            self.fallbacks += 1
+
+    def stats(self):
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_times_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "short_circuits": self.short_circuits,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_budget": self.budget,
+            "hedge_threshold": round(self.hedge_threshold(), 3) if self.hedge else None,
+            "requests": self.requests,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": round(self.fallbacks / self.requests, 4) if self.requests else 0.0,
+            "admission": self.gate.stats() if self.gate is not None else None,
+        }
+
+
+def upstream_from_env():
+    """Build a GuardedUpstream configured by the UPSTREAM_* and BREAKER_* settings"""
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get("BREAKER_FAILURES", 5)),
+        reset_timeout=float(os.environ.get("BREAKER_RESET", 30)),
+    )
+    max_calls = int(os.environ.get("UPSTREAM_MAX_CALLS", 16))
+    gate = ConcurrencyGate(
+        limit=max_calls,
+        max_queue=int(os.environ.get("UPSTREAM_QUEUE", 2 * max_calls)),
+        queue_timeout=float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", 2)),
+    )
+    return GuardedUpstream(
+        breaker,
+        budget=float(os.environ.get("UPSTREAM_BUDGET", 8)),
+        hedge=os.environ.get("UPSTREAM_HEDGE", "0").lower() in ("1", "true", "yes"),
+        hedge_after=float(os.environ.get("UPSTREAM_HEDGE_AFTER", 3)),
+        max_workers=max_calls,
+        gate=gate,
+    )
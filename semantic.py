@@ -0,0 +1,127 @@
+"""Offline semantic product matching against category exemplars, in NumPy.
+
+Text is embedded with the hashing trick: word unigrams plus character 3-5
+grams of each word are hashed into a fixed number of buckets, weighted by
+log term frequency and by an IDF learned from the exemplars, and L2
+normalized. Character n-grams let "brokerage" meet "broker", "meals" meet
+"meal" and "nutrition" meet "nutritional" without a vocabulary or a model
+download. Every exemplar is embedded once at import into one matrix; a
+description is matched with a single sparse matrix-vector product, and a
+category scores as its best-matching exemplar.
+"""
+import os
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+SEMANTIC_DIM = 1 << 13
+NGRAM_SIZES = (3, 4, 5)
+# Descriptions are embedded from their opening; long pitch documents are left to the keyword pass
+SEMANTIC_MAX_CHARS = 2000
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word):
+    """(bucket, sign) pairs for a word and its padded character n-grams"""
+    padded = f" {word} "
+    grams = [word] + [padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1)]
+    features = []
+    for gram in grams:
+        h = zlib.crc32(gram.encode("utf-8"))
+        # The top bit picks a sign so colliding features cancel out on average
+        features.append((h % SEMANTIC_DIM, 1.0 if h & 0x80000000 else -1.0))
+    return tuple(features)
+
+
+def term_features(text):
+    """Signed, log-scaled hashed feature counts of a text as (buckets, values), before IDF weighting"""
+    counts = {}
+    for word in _WORD.findall(text[:SEMANTIC_MAX_CHARS].lower()):
+        for bucket, sign in _word_features(word):
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+    buckets = np.fromiter(counts, dtype=np.intp, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return buckets, np.sign(values) * np.log1p(np.abs(values))
+
+
+def term_vector(text):
+    """term_features() as a dense vector"""
+    vector = np.zeros(SEMANTIC_DIM, dtype=np.float32)
+    buckets, values = term_features(text)
+    vector[buckets] = values
+    return vector
+
+
+class SemanticMatcher:
+    """Match text to the category of its most similar exemplar"""
+
+    def __init__(self, exemplars, threshold, margin=0.2):
+        self.threshold = threshold
+        self.margin = margin
+        self.categories = list(exemplars)
+        rows = [term_vector(text) for texts in exemplars.values() for text in texts]
+        terms = np.vstack(rows) if rows else np.zeros((0, SEMANTIC_DIM), dtype=np.float32)
+        document_frequency = np.count_nonzero(terms, axis=0)
+        self.idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+        # Stored bucket-major: a description touches a few hundred buckets, and
+        # gathering just those rows is far cheaper than a product over all of them
+        self.columns = np.ascontiguousarray(self._normalize(terms * self.idf).T)
+        # Exemplars are stored category by category, so each category's best is a reduceat over its rows
+        sizes = [len(texts) for texts in exemplars.values()]
+        self._starts = np.cumsum([0] + sizes[:-1])
+        self.matches = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def scores(self, text):
+        """Category -> cosine similarity of its closest exemplar"""
+        if not self.categories:
+            return {}
+        buckets, values = term_features(text)
+        similarities = self._normalize(values * self.idf[buckets]) @ self.columns[buckets]
+        best = np.maximum.reduceat(similarities, self._starts)
+        return dict(zip(self.categories, best.tolist()))
+
+    def match(self, text, incumbent=None):
+        """(category, score) of the best match, with category None below the threshold.
+
+        With an `incumbent` category (the keyword classifier's pick), a
+        different category is only returned if it also beats the
+        incumbent's own similarity by the margin.
+        """
+        scores = self.scores(text)
+        if not scores:
+            return None, 0.0
+        category = max(scores, key=scores.__getitem__)
+        score = scores[category]
+        if score < self.threshold or (incumbent is not None and category != incumbent
+                                      and score - scores.get(incumbent, 0.0) < self.margin):
+            self.misses += 1
+            return None, score
+        self.matches += 1
+        return category, score
+
+    def stats(self):
+        return {
+            "exemplars": self.columns.shape[1],
+            "threshold": self.threshold,
+            "margin": self.margin,
+            "matches": self.matches,
+            "below_threshold": self.misses,
+        }
+
+
+def matcher_from_env(prefix, exemplars):
+    """Build a SemanticMatcher with <prefix>_THRESHOLD and <prefix>_MARGIN, or None when <prefix> is 0"""
+    if os.environ.get(prefix, "1").lower() in ("0", "false", "no"):
+        return None
+    return SemanticMatcher(exemplars, float(os.environ.get(f"{prefix}_THRESHOLD", 0.2)),
+                           float(os.environ.get(f"{prefix}_MARGIN", 0.2)))
@@ -0,0 +1,74 @@
+"""Model-written focus group responses: prompts and concurrent fan-out under a shared deadline"""
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+# "canned" answers from templates keyed on each persona's role; "model" has the model write them
+SIMULATION_MODES = ("canned", "model")
+
+# Seconds all persona calls of one simulation share, and the insight call gets after them
+SIMULATION_PERSONA_BUDGET = float(os.environ.get("SIMULATION_PERSONA_BUDGET", 6))
+SIMULATION_INSIGHT_BUDGET = float(os.environ.get("SIMULATION_INSIGHT_BUDGET", 4))
+SIMULATION_TEMPERATURE = 0.8
+RESPONSE_MAX_TOKENS = 220
+INSIGHT_MAX_TOKENS = 220
+
+# Persona calls in flight per worker across all simulations; each call holds one thread
+SIMULATION_WORKERS = int(os.environ.get("SIMULATION_WORKERS", 16))
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SIMULATION_WORKERS, thread_name_prefix="simulation")
+    return _executor
+
+
+def completed_within(calls, timeout):
+    """Start every call at once and yield (index, result) as each finishes, for at most `timeout` seconds.
+
+    A call that raised yields None; calls still running at the timeout yield
+    None after it, in order, and are left to finish on their own.
+    """
+    pending = {get_executor().submit(call): index for index, call in enumerate(calls)}
+    try:
+        for future in as_completed(list(pending), timeout=timeout):
+            index = pending.pop(future)
+            yield index, future.result() if future.exception() is None else None
+    except TimeoutError:
+        pass
+    for index in sorted(pending.values()):
+        yield index, None
+
+
+def fan_out(calls, timeout):
+    """Results of completed_within() as a list in call order"""
+    results = [None] * len(calls)
+    for index, result in completed_within(calls, timeout):
+        results[index] = result
+    return results
+
+
+def response_messages(product_description, persona, role):
+    """Chat messages asking one persona for their reaction to the product"""
+    system = (
+        f"You are {persona['name']}, a {persona['age']}-year-old {persona['occupation']}. "
+        f"Your personality and traits: {persona['traits']}. "
+        f"You are taking part in a product focus group, where you come across as {role}. "
+        "Stay in character and answer in the first person in 80-120 words. Be candid: say whether "
+        "you would use the product, what appeals to you and what would stop you. No lists or headings."
+    )
+    user = f"The product: {product_description}\n\nWhat is your honest reaction?"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def insight_messages(product_description, responses):
+    """Chat messages asking the moderator to synthesize the responses into a recommendation"""
+    transcript = "\n\n".join(f"{r['name']} ({r['role']}): {r['text']}" for r in responses)
+    system = (
+        "You are the moderator of a product focus group. Write one paragraph of about 80 words with "
+        "strategic recommendations for the product team: what to emphasize for each participant, the "
+        "main barrier to adoption, and a pricing or positioning suggestion. No lists or headings."
+    )
+    user = f"The product: {product_description}\n\nWhat the participants said:\n\n{transcript}"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
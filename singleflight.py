@@ -0,0 +1,259 @@
+"""Coalesce concurrent identical work onto one call, within a worker and across workers.
+
+Inside a process, the first caller for a key leads and later callers wait on
+it. Across processes on the same host, leaders additionally take an flock on
+<directory>/<key>.lock; a leader in another worker that finds the lock held
+waits for it and reads the result the holder wrote to <directory>/<key>.json.
+A caller whose leader fails or outlasts the timeout runs the work itself.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+_MISSING = object()
+
+# Result and lock files older than this are pruned every PRUNE_EVERY writes
+PRUNE_AGE = 600
+PRUNE_EVERY = 256
+
+
+class Flight:
+    """One caller's view of a coalesced call.
+
+    When ``shared`` is true, ``result`` came from another caller's work.
+    Otherwise the caller does the work and hands it to waiters via publish().
+    """
+
+    def __init__(self, result=None, shared=False):
+        self.result = result
+        self.shared = shared
+        self.published = shared
+
+    def publish(self, result):
+        self.result = result
+        self.published = True
+
+
+class _LocalFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.flight = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time per host; results must be JSON-serializable"""
+
+    def __init__(self, directory=None, timeout=30.0, poll_interval=0.02):
+        self.directory = directory
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.leads = 0
+        self.deduplicated = 0
+        self.shared_across_workers = 0
+        self.abandoned = 0
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        # The directory is created on first use, not at import
+        self._directory_made = False
+
+    @contextmanager
+    def acquire(self, key):
+        """Yield a Flight for `key`; blocks while an identical call is in flight"""
+        with self._lock:
+            local = self._flights.get(key)
+            leading = local is None
+            if leading:
+                local = self._flights[key] = _LocalFlight()
+        if not leading:
+            yield self._follow(local.done.wait(self.timeout) and local.flight)
+            return
+
+        lock_file = None
+        try:
+            steps = self._lock_steps(key)
+            try:
+                while True:
+                    next(steps)
+                    time.sleep(self.poll_interval)
+            except StopIteration as stop:
+                lock_file, flight = stop.value
+            local.flight = flight
+            yield flight
+            self._finish(key, flight, lock_file)
+        finally:
+            self._release(lock_file)
+            with self._lock:
+                del self._flights[key]
+            local.done.set()
+
+    @asynccontextmanager
+    async def aacquire(self, key):
+        """Async counterpart of acquire() that waits without blocking the event loop"""
+        waiting = self._async_flights.get(key)
+        if waiting is not None:
+            try:
+                flight = await asyncio.wait_for(asyncio.shield(waiting), self.timeout)
+            except asyncio.TimeoutError:
+                flight = None
+            yield self._follow(flight)
+            return
+
+        done = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        lock_file, flight = None, None
+        try:
+            steps = self._lock_steps(key)
+            try:
+                while True:
+                    next(steps)
+                    await asyncio.sleep(self.poll_interval)
+            except StopIteration as stop:
+                lock_file, flight = stop.value
+            yield flight
+            self._finish(key, flight, lock_file)
+        finally:
+            self._release(lock_file)
+            del self._async_flights[key]
+            done.set_result(flight)
+
+    def _follow(self, flight):
+        """Flight for a caller that waited on a leader in this process"""
+        if flight and flight.published:
+            self.deduplicated += 1
+            return Flight(flight.result, shared=True)
+        # The leader failed or is too slow: do the work alone
+        self.abandoned += 1
+        return Flight()
+
+    def _finish(self, key, flight, lock_file):
+        if flight.shared:
+            return
+        self.leads += 1
+        if flight.published and lock_file is not None:
+            try:
+                self._write_result(key, flight.result)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Single-flight write error: {e}")
+
+    def _lock_steps(self, key):
+        """Take the cross-worker lock, yielding between polls; returns (lock file or None, Flight)"""
+        if not self.directory:
+            return None, Flight()
+        if not self._directory_made:
+            os.makedirs(self.directory, exist_ok=True)
+            self._directory_made = True
+        lock_file = open(os.path.join(self.directory, f"{key}.lock"), "a")
+        locked, lock_file = self._try_lock(lock_file)
+        if locked:
+            return lock_file, Flight()
+
+        # Another worker is making this call: wait for it to finish, then take its result
+        waiting_since = time.time()
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            yield
+            locked, lock_file = self._try_lock(lock_file)
+            if not locked:
+                continue
+            result = self._read_result(key, waiting_since)
+            if result is _MISSING:
+                # The other worker produced nothing, so this caller leads now
+                return lock_file, Flight()
+            self._release(lock_file)
+            self.deduplicated += 1
+            self.shared_across_workers += 1
+            return None, Flight(result, shared=True)
+        lock_file.close()
+        self.abandoned += 1
+        return None, Flight()
+
+    @staticmethod
+    def _try_lock(lock_file):
+        """flock `lock_file` without blocking; returns (locked, the lock file to keep using).
+
+        _prune may unlink a lock file between another caller's open() and
+        flock(), and a lock on an unlinked file excludes no one, so then the
+        path is reopened and locked afresh.
+        """
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False, lock_file
+            try:
+                opened, current = os.fstat(lock_file.fileno()), os.stat(lock_file.name)
+                if (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino):
+                    return True, lock_file
+            except FileNotFoundError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            lock_file = open(lock_file.name, "a")
+
+    @staticmethod
+    def _release(lock_file):
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _read_result(self, key, newer_than):
+        """The result written for `key` after `newer_than`, or _MISSING"""
+        try:
+            with open(os.path.join(self.directory, f"{key}.json")) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        return data["result"] if data.get("finished_at", 0) >= newer_than else _MISSING
+
+    def _write_result(self, key, result):
+        path = os.path.join(self.directory, f"{key}.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"finished_at": time.time(), "result": result}, f)
+        os.replace(tmp_path, path)
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        cutoff = time.time() - PRUNE_AGE
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if not name.endswith(".lock"):
+                    os.remove(path)
+                    continue
+                # A lock file is only removed while this process holds it, never from under a leader
+                locked, lock_file = self._try_lock(open(path, "a"))
+                try:
+                    if locked:
+                        os.remove(path)
+                finally:
+                    lock_file.close()
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "leads": self.leads,
+            "deduplicated": self.deduplicated,
+            "shared_across_workers": self.shared_across_workers,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._flights) + len(self._async_flights),
+            "cross_worker": bool(self.directory),
+        }
+
+
+def singleflight_from_env(prefix, default_timeout):
+    """Build a SingleFlight configured by <prefix>_DIR and <prefix>_TIMEOUT"""
+    return SingleFlight(
+        directory=os.environ.get(f"{prefix}_DIR"),
+        timeout=float(os.environ.get(f"{prefix}_TIMEOUT", default_timeout)),
+    )
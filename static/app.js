@@ -0,0 +1,387 @@
+async function generatePersonas() {
+    const productDesc = document.getElementById('productDesc').value;
+    const targetMarket = document.getElementById('targetMarket').value;
+
+    if (!productDesc) {
+        alert('Please describe your product first');
+        document.getElementById('productDesc').focus();
+        return;
+    }
+
+    document.getElementById('loading').style.display = 'block';
+    let filled = 0;
+
+    try {
+        const response = await fetch('/generate-personas/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                product_description: productDesc,
+                target_market: targetMarket
+            })
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error('Persona stream unavailable');
+        }
+
+        // Fill each persona slot as soon as its event arrives
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (event.type === 'persona' && event.data.index < 3) {
+                    fillPersona(event.data.index, event.data.persona);
+                    if (filled++ === 0) {
+                        document.getElementById('personasCard').scrollIntoView({ behavior: 'smooth', block: 'start' });
+                    }
+                } else if (event.type === 'done') {
+                    console.log('Personas: first after ' + event.data.first_persona_ms + ' ms, total ' + event.data.total_ms + ' ms (' + event.data.source + ')');
+                }
+            }
+        }
+
+        if (filled < 3) {
+            alert('Error generating personas. Please try again or enter manually.');
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        alert('Connection error. Please check your internet and try again.');
+    } finally {
+        document.getElementById('loading').style.display = 'none';
+    }
+}
+
+function parseEvent(frame) {
+    const event = { type: 'message', data: '' };
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) event.type = line.slice(7);
+        else if (line.startsWith('data: ')) event.data += line.slice(6);
+    }
+    event.data = event.data ? JSON.parse(event.data) : null;
+    return event;
+}
+
+function fillPersona(index, p) {
+    const n = index + 1;
+    document.getElementById('name' + n).value = p.name || '';
+    document.getElementById('age' + n).value = p.age || '';
+    document.getElementById('job' + n).value = p.occupation || '';
+    document.getElementById('traits' + n).value = p.traits || '';
+    document.getElementById('badge' + n).style.display = 'inline-flex';
+}
+
+// Submit the form as a background job and poll it until the result is in,
+// updating the results card in place; falls back to the regular form post
+// (which re-renders the page) if the job API fails
+async function runSimulation(event) {
+    event.preventDefault();
+    const form = event.target;
+    const personas = [1, 2, 3].map(n => ({
+        name: document.getElementById('name' + n).value,
+        age: document.getElementById('age' + n).value,
+        occupation: document.getElementById('job' + n).value,
+        traits: document.getElementById('traits' + n).value
+    }));
+    const mode = document.getElementById('modelMode').checked ? 'model' : 'canned';
+    const button = form.querySelector('button[type="submit"]');
+    const label = button.textContent;
+    button.disabled = true;
+
+    // Only model-written answers with a backend are slow enough to queue as a
+    // job; canned answers come back at once from /api/simulate
+    const queued = mode === 'model' && 'modelJobs' in form.dataset;
+    try {
+        const response = await fetch(queued ? '/api/jobs' : '/api/simulate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                product_description: document.getElementById('productDesc').value,
+                personas: personas,
+                mode: mode
+            })
+        });
+        if (!response.ok) {
+            throw new Error((queued ? 'Job' : 'Simulation') + ' API returned ' + response.status);
+        }
+        if (!queued) {
+            showResults(await response.json());
+            return;
+        }
+        const job = await waitForJob(await response.json(), button);
+        if (job.status !== 'done') {
+            throw new Error('Simulation job ' + job.status + ': ' + (job.error || ''));
+        }
+        showResults(job.result);
+    } catch (error) {
+        console.error('Error:', error);
+        form.submit();
+    } finally {
+        button.disabled = false;
+        button.textContent = label;
+    }
+}
+
+// Poll a job's status URL, showing its place in the queue on the button,
+// until it is done or failed
+async function waitForJob(job, button) {
+    let delay = 250;
+    while (job.status === 'queued' || job.status === 'running') {
+        button.textContent = job.status === 'queued'
+            ? '\u23f3 Queued' + (job.position ? ' (' + job.position + ' ahead)' : '') + '\u2026'
+            : '\u23f3 Running your focus group\u2026';
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 2, 1000);
+        const response = await fetch(job.status_url);
+        if (!response.ok) {
+            throw new Error('Job status returned ' + response.status);
+        }
+        job = await response.json();
+    }
+    return job;
+}
+
+function element(tag, className, text) {
+    const node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text !== undefined) node.textContent = text;
+    return node;
+}
+
+function showResults(result) {
+    const card = element('div', 'card');
+    card.id = 'results';
+    card.appendChild(element('div', 'section-title', 'Focus Group Results'));
+    const product = element('p', null, 'Product tested: ' + result.product);
+    product.style.cssText = 'color: #64748b; margin-bottom: 24px; font-size: 15px;';
+    card.appendChild(product);
+
+    for (const r of result.responses) {
+        card.appendChild(responseBox(r));
+    }
+    card.appendChild(insightBox(result.insight));
+    if (result.permalink) {
+        card.appendChild(permalinkLine(result.permalink));
+    }
+    placeResults(card);
+}
+
+function responseBox(r) {
+    const box = element('div', 'response-box');
+    const round = r.round ? ' \u00b7 Round ' + r.round : '';
+    box.appendChild(element('div', 'message-author', r.name + ' \u2014 ' + r.role + round));
+    box.appendChild(element('div', 'message-text', r.text));
+    return box;
+}
+
+function insightBox(text) {
+    const insight = element('div', 'insight-box');
+    insight.appendChild(element('div', 'insight-title', 'Strategic Recommendation'));
+    const insightText = element('div', null, text);
+    insightText.style.cssText = 'color: #e2e8f0; font-size: 15px; line-height: 1.8;';
+    insight.appendChild(insightText);
+    return insight;
+}
+
+function permalinkLine(url) {
+    const permalink = element('p', null, 'Permalink: ');
+    permalink.style.cssText = 'color: #64748b; margin-top: 24px; font-size: 14px; text-align: center;';
+    const link = element('a', null, url);
+    link.href = url;
+    permalink.appendChild(link);
+    return permalink;
+}
+
+function placeResults(card) {
+    const existing = document.getElementById('results');
+    if (existing) {
+        existing.replaceWith(card);
+    } else {
+        document.getElementById('mainForm').after(card);
+    }
+    card.scrollIntoView({ behavior: 'smooth', block: 'start' });
+}
+
+// Moderated discussion: each turn is appended as its event arrives, with
+// the moderator's question before each round and its latency and tokens after
+async function runDiscussion() {
+    const productDesc = document.getElementById('productDesc').value;
+    if (!productDesc) {
+        alert('Please describe your product first');
+        document.getElementById('productDesc').focus();
+        return;
+    }
+    const personas = [1, 2, 3].map(n => ({
+        name: document.getElementById('name' + n).value,
+        age: document.getElementById('age' + n).value,
+        occupation: document.getElementById('job' + n).value,
+        traits: document.getElementById('traits' + n).value
+    }));
+
+    const card = element('div', 'card');
+    card.id = 'results';
+    card.appendChild(element('div', 'section-title', 'Focus Group Discussion'));
+    placeResults(card);
+    const note = 'color: #64748b; margin: 16px 0 8px; font-size: 14px;';
+
+    try {
+        const response = await fetch('/api/discussion/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ product_description: productDesc, personas: personas, rounds: 3 })
+        });
+        if (!response.ok || !response.body) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.error || 'Discussion API returned ' + response.status);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (event.type === 'moderator') {
+                    const question = element('p', null, 'Round ' + event.data.round + ' \u2014 Moderator: ' + event.data.question);
+                    question.style.cssText = 'color: #cbd5e1; margin: 24px 0 12px; font-weight: 500;';
+                    card.appendChild(question);
+                } else if (event.type === 'turn') {
+                    card.appendChild(responseBox(event.data));
+                } else if (event.type === 'round') {
+                    const stats = event.data;
+                    const line = element('p', null, (stats.ms / 1000).toFixed(1) + ' s \u00b7 ' +
+                        (stats.prompt_tokens + stats.completion_tokens) + ' tokens \u00b7 ' +
+                        stats.model_turns + ' model turns');
+                    line.style.cssText = note;
+                    card.appendChild(line);
+                } else if (event.type === 'insight') {
+                    card.appendChild(insightBox(event.data.text));
+                } else if (event.type === 'done') {
+                    if (event.data.permalink) {
+                        card.appendChild(permalinkLine(event.data.permalink));
+                    }
+                    console.log('Discussion: ' + event.data.rounds + ' rounds in ' + event.data.total_ms + ' ms, ' +
+                        event.data.prompt_tokens + ' prompt + ' + event.data.completion_tokens + ' completion tokens');
+                }
+            }
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        const message = element('p', null, 'The discussion could not be completed: ' + error.message);
+        message.style.cssText = note;
+        card.appendChild(message);
+    }
+}
+
+document.getElementById('mainForm').addEventListener('submit', runSimulation);
+
+// Aggregate statistics for a large synthetic panel sampled around the
+// personas in the form (or the product's archetypes if they are incomplete)
+async function runPanel() {
+    const productDesc = document.getElementById('productDesc').value;
+    if (!productDesc) {
+        alert('Please describe your product first');
+        document.getElementById('productDesc').focus();
+        return;
+    }
+    const personas = [1, 2, 3].map(n => ({
+        name: document.getElementById('name' + n).value,
+        age: document.getElementById('age' + n).value,
+        occupation: document.getElementById('job' + n).value,
+        traits: document.getElementById('traits' + n).value
+    })).filter(p => p.name && p.age && p.occupation && p.traits);
+
+    try {
+        const response = await fetch('/api/panel', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                product_description: productDesc,
+                personas: personas.length ? personas : undefined,
+                size: 1000
+            })
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error || 'Panel API returned ' + response.status);
+        }
+        showPanel(result);
+    } catch (error) {
+        console.error('Error:', error);
+        alert('Error simulating the panel. Please try again.');
+    }
+}
+
+function percent(share) {
+    return Math.round(share * 100) + '%';
+}
+
+function shareList(title, shares) {
+    const box = element('div', 'response-box');
+    box.appendChild(element('div', 'message-author', title));
+    const text = Object.entries(shares).map(([label, share]) => label + ': ' + percent(share)).join(' \u2022 ');
+    box.appendChild(element('div', 'message-text', text || 'None'));
+    return box;
+}
+
+function showPanel(result) {
+    const card = element('div', 'card');
+    card.id = 'results';
+    card.appendChild(element('div', 'section-title', 'Panel Results'));
+    const summary = element('p', null, result.size.toLocaleString() + ' synthetic participants, mean age ' +
+        result.age.mean + ' (' + result.elapsed_ms + ' ms)');
+    summary.style.cssText = 'color: #64748b; margin-bottom: 24px; font-size: 15px;';
+    card.appendChild(summary);
+
+    card.appendChild(shareList('Role mix', result.role_mix));
+    card.appendChild(shareList('Objections raised', result.objections));
+    for (const [band, stats] of Object.entries(result.age_bands)) {
+        if (stats.share > 0) {
+            card.appendChild(shareList('Ages ' + band + ' (' + percent(stats.share) + ' of panel)', stats.role_mix));
+        }
+    }
+
+    const existing = document.getElementById('results');
+    if (existing) {
+        existing.replaceWith(card);
+    } else {
+        document.getElementById('mainForm').after(card);
+    }
+    card.scrollIntoView({ behavior: 'smooth', block: 'start' });
+}
+
+function fillExample() {
+    document.getElementById('productDesc').value = "An AI recipe app that suggests meals based on ingredients you already have in your kitchen. Reduces food waste and saves money. $9.99/month with a 14-day free trial. Includes meal planning and grocery list features.";
+    document.getElementById('targetMarket').value = "Home cooks aged 25-45 who want to reduce food waste and save time on meal planning";
+
+    document.getElementById('name1').value = "Marco Rossi";
+    document.getElementById('age1').value = "38";
+    document.getElementById('job1').value = "Professional Chef";
+    document.getElementById('traits1').value = "Perfectionist, values technique, skeptical of shortcuts, judges apps by recipe authenticity";
+
+    document.getElementById('name2').value = "Jennifer Walsh";
+    document.getElementById('age2').value = "34";
+    document.getElementById('job2').value = "Working Mother of Two";
+    document.getElementById('traits2').value = "Time-starved, needs family-friendly meals, values convenience but wants healthy options";
+
+    document.getElementById('name3').value = "David Chen";
+    document.getElementById('age3').value = "28";
+    document.getElementById('job3').value = "Food Blogger";
+    document.getElementById('traits3').value = "Trend-focused, loves experimenting, visual presentation matters, shares on social media";
+
+    document.getElementById('badge1').style.display = 'inline-flex';
+    document.getElementById('badge2').style.display = 'inline-flex';
+    document.getElementById('badge3').style.display = 'inline-flex';
+}
@@ -0,0 +1,178 @@
+"""Persistent simulation store: permalinks and keyset-paginated history in SQLite"""
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from cache import normalize_text
+
+HISTORY_DEFAULT_LIMIT = 20
+HISTORY_MAX_LIMIT = 100
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS simulations ("
+    " id TEXT PRIMARY KEY, created_at REAL NOT NULL, product_hash TEXT NOT NULL,"
+    " product_description TEXT NOT NULL, product TEXT NOT NULL, personas TEXT NOT NULL,"
+    " responses TEXT NOT NULL, insight TEXT NOT NULL, timings TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS simulations_created_at ON simulations (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS simulations_product ON simulations (product_hash, created_at, id)",
+)
+
+COLUMNS = "id, created_at, product_description, product, personas, responses, insight, timings"
+
+
+def product_hash(product_description):
+    """Hash of the normalized product description, so history can be filtered by product"""
+    return hashlib.sha256(normalize_text(product_description).encode("utf-8")).hexdigest()
+
+
+def encode_cursor(created_at, simulation_id):
+    return f"{created_at!r}_{simulation_id}"
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of the last row of the previous page, or raise ValueError"""
+    created_at, sep, simulation_id = cursor.partition("_")
+    try:
+        if not sep or not simulation_id:
+            raise ValueError
+        return float(created_at), simulation_id
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+
+
+def simulation_from_row(row):
+    """Decode a row selected with COLUMNS"""
+    return {
+        "id": row[0],
+        "created_at": row[1],
+        "product_description": row[2],
+        "product": row[3],
+        "personas": json.loads(row[4]),
+        "responses": json.loads(row[5]),
+        "insight": row[6],
+        "timings": json.loads(row[7]),
+    }
+
+
+class SimulationStore:
+    """Simulations in a SQLite file in WAL mode, shared by every worker on the host.
+
+    Rows are immutable once saved, so a permalink is served straight from the
+    row without recomputing anything. History pages are read newest first and
+    continue from a (created_at, id) cursor, so every page is an index range
+    scan no matter how deep it is.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.saved = 0
+        self.errors = 0
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread and per process; the schema is created on first use
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def save(self, product_description, personas, result, timings):
+        """Persist one simulation; returns its id, or None if the write failed"""
+        simulation_id = secrets.token_urlsafe(9)
+        row = (
+            simulation_id,
+            time.time(),
+            product_hash(product_description),
+            product_description,
+            result['product'],
+            json.dumps(personas, separators=(",", ":")),
+            json.dumps(result['responses'], separators=(",", ":")),
+            result['insight'],
+            json.dumps(timings, separators=(",", ":")),
+        )
+        try:
+            self._connect().execute("INSERT INTO simulations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Simulation store write error: {e}")
+            return None
+        self.saved += 1
+        return simulation_id
+
+    def get(self, simulation_id):
+        """The stored simulation as a dict, or None if there is no such id"""
+        row = self._connect().execute(
+            f"SELECT {COLUMNS} FROM simulations WHERE id = ?", (simulation_id,)
+        ).fetchone()
+        return simulation_from_row(row) if row is not None else None
+
+    def history(self, limit=HISTORY_DEFAULT_LIMIT, cursor=None, product=None):
+        """One page of simulation summaries, newest first; returns (items, next_cursor or None)"""
+        clauses, params = [], []
+        if product:
+            clauses.append("product_hash = ?")
+            params.append(product_hash(product))
+        if cursor:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT id, created_at, product, json_array_length(personas) FROM simulations{where}"
+            " ORDER BY created_at DESC, id DESC LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+        items = [{"id": r[0], "created_at": r[1], "product": r[2], "personas": r[3]} for r in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return items, next_cursor
+
+    def iter_simulations(self, since=None, until=None, keyword=None, batch_size=500):
+        """Yield stored simulations oldest first, filtered by creation time and product keyword.
+
+        Rows are read in keyset batches, so memory stays constant and no read
+        transaction is held open while the caller consumes them.
+        """
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if keyword:
+            escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("product_description LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        after = None
+        while True:
+            where = list(clauses)
+            if after is not None:
+                where.append("(created_at, id) > (?, ?)")
+            sql = f"SELECT {COLUMNS} FROM simulations"
+            if where:
+                sql += f" WHERE {' AND '.join(where)}"
+            rows = self._connect().execute(
+                sql + " ORDER BY created_at, id LIMIT ?", (*params, *(after or ()), batch_size)
+            ).fetchall()
+            for row in rows:
+                yield simulation_from_row(row)
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    def stats(self):
+        return {"path": self.path, "saved": self.saved, "errors": self.errors}
+
+
+def store_from_env(prefix):
+    """Build a SimulationStore at <prefix>_DB (default simulations.db), or None when it is set empty"""
+    path = os.environ.get(f"{prefix}_DB", "simulations.db")
+    return SimulationStore(path) if path else None